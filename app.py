@@ -9,8 +9,6 @@ Kunlun Sentinel Lab Monitor - 主应用文件
 import os
 import random
 import psycopg2
-from psycopg2.extensions import connection as PsyConnection
-from psycopg2 import pool as pg_pool
 # 优先尝试 openGauss 兼容驱动（如已安装），否则回退到 psycopg2
 OG_AVAILABLE = False
 OG_DBAPI = None
@@ -23,14 +21,36 @@ except Exception:
     OG_AVAILABLE = False
 import cv2
 import numpy as np
-from datetime import datetime
+from datetime import datetime, timezone
 import threading
 import time
 from flask import Flask, render_template, jsonify, request, Response
 import json
 from queue import Queue
+from collections import deque
 import glob
-import zlib
+import sys
+import asyncio
+import struct
+import csv
+import io
+
+# 与 UDP 中转共用的模块（帧解码等）位于 relay/ 目录
+RELAY_CODE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'relay')
+if RELAY_CODE_DIR not in sys.path:
+    sys.path.insert(0, RELAY_CODE_DIR)
+from frame_codec import ChecksumError, FrameError, decode_frame, decode_raw
+from capture_service import CaptureService
+from dedup import DedupIndex
+from image_index import ImageIndex
+from fragments import is_fragment
+from prepared import STATEMENTS
+from db_pool import ConnectionPool
+from dead_letter import DeadLetterLog, is_data_error
+import atexit
+import image_profiles
+import shutil
+from functools import lru_cache
 
 # ==================== 配置 ====================
 BASE_DIR = os.environ.get('LAB_DIR', "/home/openEuler/lab_monitor")
@@ -69,10 +89,60 @@ DB_CONFIG = {
     'sslmode': 'disable'
 }
 
-PG_POOL = None
+# 连接池：导入时创建（WSGI 服务器同样生效），连接在首次借出时建立；两种驱动的连接都经池复用
+DB_POOL_ENABLED = os.getenv("DB_POOL", "1") == "1"
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))  # 秒，0 为不限
+DB_POOL_VALIDATE_IDLE_SEC = float(os.getenv("DB_POOL_VALIDATE_IDLE_SEC", "30"))  # 空闲超过该秒数借出前 SELECT 1
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))  # 连接耗尽时的等待秒数
+DB_POOL = None  # ConnectionPool 实例，在 open_db_connection 定义后创建
 
 DS18B20_PATH_PATTERN = "/sys/bus/w1/devices/28-*/w1_slave"
-CAMERA_DEVICE = "/dev/video0"
+CAMERA_DEVICE = os.getenv("CAMERA_DEVICE", "/dev/video0")
+# 中转 0 号进程常驻持有摄像头并周期发布最新帧；足够新时直接复制，无需打开设备
+CAMERA_LATEST_PATH = os.path.join(RUNTIME_DIR, "camera_latest.jpg")
+CAMERA_SHARED_MAX_AGE = float(os.getenv("CAMERA_SHARED_MAX_AGE", "5"))
+CAMERA_MAX_AGE = float(os.getenv("CAMERA_MAX_AGE", "5"))
+# 本进程采集只在中转未发布帧时临时使用：最后一次抓拍后空闲该秒数即释放设备，交还给中转
+CAMERA_IDLE_SEC = float(os.getenv("CAMERA_IDLE_SEC", "30"))
+CAMERA = None  # 本进程的 CaptureService，中转未发布帧时首次抓拍才启动
+CAMERA_LOCK = threading.Lock()
+# /api/ingest 重复抑制：(device_id, timestamp_ms) 在窗口内重复时不再转换图像与入库
+INGEST_DEDUP_WINDOW_SEC = float(os.getenv("INGEST_DEDUP_WINDOW_SEC", "300"))
+INGEST_DEDUP = DedupIndex(INGEST_DEDUP_WINDOW_SEC, int(os.getenv("INGEST_DEDUP_MAX", "100000"))) if INGEST_DEDUP_WINDOW_SEC > 0 else None
+# 图像存储配置与中转共用 relay/config.json 的 image_storage；读取时缩放由 /api/image/<文件名> 完成
+RELAY_CFG_DIR = os.path.join(BASE_DIR, "relay")
+IMAGE_SCALE_MAX = int(os.getenv("IMAGE_SCALE_MAX", "20"))
+IMAGE_SCALE_CACHE = int(os.getenv("IMAGE_SCALE_CACHE", "64"))
+
+
+def load_image_storage():
+    """读取中转配置中的 image_storage（优先 udp_config.json，与中转一致），缺失时使用内置缺省"""
+    for name in ("udp_config.json", "config.json"):
+        path = os.path.join(RELAY_CFG_DIR, name)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f).get("image_storage") or {}
+        except FileNotFoundError:
+            continue
+        except Exception as e:
+            print(f"[CONFIG] 读取 {path} 失败: {e}")
+            return {}
+    return {}
+
+
+IMAGE_STORAGE = load_image_storage()
+# 内嵌接收模式：在本进程后台事件循环中直接接收 UDP 数据包并复用中转的 handle_packet，
+# 更新缓存与广播不再经过 HTTP 通知；入库仍由中转的批量写入器在后台线程完成。此时不应再单独运行中转
+EMBEDDED_RELAY = os.getenv("EMBEDDED_RELAY", "0") == "1"
+EMBEDDED_RELAY_HOST = os.getenv("RELAY_HOST", "0.0.0.0")
+EMBEDDED_RELAY_PORT = int(os.getenv("RELAY_PORT", "9999"))
+EMBEDDED = None  # EmbeddedRelay 实例
+# 图片目录内存索引（inotify 跟踪，缺失时定期扫描）：查询路径不再 stat，也不再因图片缺失而同步抓拍
+IMAGE_INDEX_RESCAN_SEC = float(os.getenv("IMAGE_INDEX_RESCAN_SEC", "30"))
+IMAGE_INDEX = None
+IMAGE_INDEX_LOCK = threading.Lock()
 
 # ==================== 初始化 ====================
 app = Flask(__name__, static_folder=STATIC_DIR)
@@ -106,25 +176,29 @@ def broadcast(data):
             pass
 
 def build_status():
+    """传感器心跳与数据库状态；数据库状态取自后台探测的缓存结果，不在请求路径上连库"""
     now_ts = int(time.time())
-    db_conn = get_db_connection()
-    db_ok = bool(db_conn)
-    if db_conn:
-        try:
-            close_db_connection(db_conn)
-        except Exception:
-            pass
+    db = get_db_health().status()
     return {
         "ds18b20": "online" if (now_ts - HEARTBEAT['temp'] < HB_TIMEOUT) else "offline",
         "light": "online" if (now_ts - HEARTBEAT['light'] < HB_TIMEOUT) else "offline",
         "camera": "online" if (now_ts - HEARTBEAT['image'] < HB_TIMEOUT) else "offline",
-        "db": "online" if db_ok else "offline"
+        "db": db["db"],
+        "db_latency_ms": db["latency_ms"],
+        "db_checked_at": db["checked_at"],
     }
 
 
 # ==================== 数据库函数 ====================
 def get_db_connection():
-    """获取数据库连接（失败返回 None）。
+    """从连接池借出数据库连接（失败或等待超时返回 None），用毕调用 close_db_connection 归还"""
+    if DB_POOL is not None:
+        return DB_POOL.getconn()
+    return open_db_connection()
+
+
+def open_db_connection():
+    """建立新的数据库连接（失败返回 None）。
     逻辑：
     1) 若 py-opengauss 驱动可用，优先使用其 DB-API 连接以适配 openGauss 握手。
     2) 否则按当前 DB_CONFIG 使用 psycopg2 连接。
@@ -141,8 +215,6 @@ def get_db_connection():
             print(f"[DB] py-opengauss 连接失败，回退到 psycopg2: {e}")
 
     try:
-        if PG_POOL is not None:
-            return PG_POOL.getconn()
         return psycopg2.connect(**{k: v for k, v in DB_CONFIG.items() if v is not None})
     except Exception as e:
         print(f"[DB] 首次连接失败: {e}")
@@ -253,18 +325,139 @@ def init_database():
             close_db_connection(conn)
 
 def close_db_connection(conn):
+    """归还连接到连接池（未启用连接池时关闭）"""
     try:
-        if PG_POOL is not None and isinstance(conn, PsyConnection):
-            try:
-                PG_POOL.putconn(conn)
-                return
-            except Exception:
-                pass
+        if DB_POOL is not None:
+            DB_POOL.putconn(conn)
+            return
         conn.close()
     except Exception:
         pass
 
 
+class DbHealthProbe:
+    """后台数据库健康探测：独立连接上每 interval 秒执行一次 SELECT 1，缓存结果与往返耗时
+
+    探测卡住（如数据库主机不可达、连接阻塞）时，超过 3 个周期未更新的结果按离线处理
+    """
+
+    def __init__(self, interval=5.0):
+        self.interval = max(0.5, float(interval))
+        self._conn = None
+        self._lock = threading.Lock()
+        self._first = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._ok = False
+        self._checked_at = 0.0
+        self._latency_ms = None
+        self._error = None
+        self.stats = {"probes": 0, "failures": 0, "consecutive_failures": 0, "connects": 0}
+
+    def start(self, wait=1.0):
+        self._thread = threading.Thread(target=self._run, name="db-health", daemon=True)
+        self._thread.start()
+        # 等待首次结果，避免启动后第一个请求报告离线
+        self._first.wait(wait)
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(2.0)
+        self._drop()
+
+    def status(self):
+        with self._lock:
+            ok, checked_at, latency = self._ok, self._checked_at, self._latency_ms
+        fresh = time.time() - checked_at <= self.interval * 3
+        return {
+            "db": "online" if ok and fresh else "offline",
+            "latency_ms": latency if ok and fresh else None,
+            "checked_at": datetime.fromtimestamp(checked_at).strftime("%Y-%m-%d %H:%M:%S") if checked_at else None,
+        }
+
+    def snapshot(self):
+        with self._lock:
+            out = dict(self.stats)
+            out["error"] = self._error
+        out.update(self.status())
+        out["interval_sec"] = self.interval
+        return out
+
+    def probe(self):
+        ok, latency, error = False, None, None
+        try:
+            if self._conn is None or getattr(self._conn, "closed", False):
+                self._conn = open_db_connection()
+                with self._lock:
+                    self.stats["connects"] += 1
+            if self._conn is None:
+                error = "connect failed"
+            else:
+                t0 = time.perf_counter()
+                cur = self._conn.cursor()
+                try:
+                    cur.execute("SELECT 1")
+                    cur.fetchone()
+                finally:
+                    cur.close()
+                self._conn.rollback()
+                latency = round((time.perf_counter() - t0) * 1000, 2)
+                ok = True
+        except Exception as e:
+            error = str(e).strip() or e.__class__.__name__
+            self._drop()
+        with self._lock:
+            self._ok = ok
+            self._checked_at = time.time()
+            self._latency_ms = latency
+            self._error = error
+            self.stats["probes"] += 1
+            if ok:
+                self.stats["consecutive_failures"] = 0
+            else:
+                self.stats["failures"] += 1
+                self.stats["consecutive_failures"] += 1
+        self._first.set()
+        return ok
+
+    def _drop(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self.probe()
+            self._stopping.wait(self.interval)
+
+
+DB_HEALTH_SEC = float(os.getenv("DB_HEALTH_SEC", "5"))
+DB_HEALTH = None  # DbHealthProbe 实例，首次查询状态时启动
+DB_HEALTH_LOCK = threading.Lock()
+
+
+def get_db_health():
+    """获取（必要时创建并启动）本进程的数据库健康探测"""
+    global DB_HEALTH
+    with DB_HEALTH_LOCK:
+        if DB_HEALTH is None:
+            DB_HEALTH = DbHealthProbe(DB_HEALTH_SEC).start()
+            atexit.register(DB_HEALTH.stop)
+        return DB_HEALTH
+
+
+if DB_POOL_ENABLED:
+    DB_POOL = ConnectionPool(
+        open_db_connection, minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX, max_lifetime=DB_POOL_MAX_LIFETIME,
+        validate_idle_sec=DB_POOL_VALIDATE_IDLE_SEC, timeout=DB_POOL_TIMEOUT,
+    )
+
+
 # ==================== 传感器函数 ====================
 def read_temperature():
     """读取 DS18B20 温度"""
@@ -291,24 +484,67 @@ def read_temperature():
         return {"error": "ds18b20 offline"}
 
 
+def get_camera():
+    """获取（必要时创建并启动）本进程的采集服务；空闲 CAMERA_IDLE_SEC 秒后释放设备，再次调用时重新打开"""
+    global CAMERA
+    with CAMERA_LOCK:
+        if CAMERA is None:
+            CAMERA = CaptureService(CAMERA_DEVICE, idle_sec=CAMERA_IDLE_SEC)
+            atexit.register(CAMERA.stop)
+        return CAMERA.start()
+
+
+def get_image_index():
+    """获取（必要时创建并启动）本进程的图片目录索引"""
+    global IMAGE_INDEX
+    with IMAGE_INDEX_LOCK:
+        if IMAGE_INDEX is None:
+            IMAGE_INDEX = ImageIndex(IMAGES_DIR, rescan_sec=IMAGE_INDEX_RESCAN_SEC).start()
+        return IMAGE_INDEX
+
+
+def register_image(filename):
+    """本进程写入图片后登记到索引（索引尚未启动时由其首次扫描覆盖）"""
+    if IMAGE_INDEX is not None:
+        IMAGE_INDEX.add(filename)
+
+
 def capture_image():
-    """采集 USB 摄像头图像"""
+    """采集 USB 摄像头图像：优先复用中转发布的最新帧，其次取本进程采集服务的缓存帧（空闲后释放设备）
+    落盘格式按 image_storage 中 "camera" 的配置（缺省 jpeg-q95）"""
     try:
-        cap = cv2.VideoCapture(0)
-        if not cap.isOpened():
-            return {"error": "camera offline"}
-        
-        ret, frame = cap.read()
-        cap.release()
-        
-        if not ret:
-            return {"error": "camera capture failed"}
-        
-        # 保存图像
+        _name, profile = image_profiles.resolve(IMAGE_STORAGE, "camera", fallback="jpeg-q95")
         ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"capture_{ts}.jpg"
+        filename = f"capture_{ts}{profile['ext']}"
         filepath = os.path.join(IMAGES_DIR, filename)
-        cv2.imwrite(filepath, frame)
+        try:
+            if time.time() - os.path.getmtime(CAMERA_LATEST_PATH) <= CAMERA_SHARED_MAX_AGE:
+                if profile['ext'] == ".jpg" and profile['scale'] == 1:
+                    # 共享帧已是 JPEG，直接复制
+                    shutil.copyfile(CAMERA_LATEST_PATH, filepath)
+                    register_image(filename)
+                    return {"image_path": f"/static/images/{filename}"}
+                frame = cv2.imread(CAMERA_LATEST_PATH)
+                if frame is not None:
+                    with open(filepath, 'wb') as f:
+                        f.write(image_profiles.encode_bgr(frame, profile))
+                    register_image(filename)
+                    return {"image_path": f"/static/images/{filename}"}
+        except OSError:
+            pass
+        
+        cam = get_camera()
+        # 首次启动需等待设备打开与预热；之后缓存帧始终可用
+        deadline = time.time() + 3.0
+        item = cam.latest(CAMERA_MAX_AGE)
+        while item is None:
+            if time.time() >= deadline:
+                return {"error": "camera offline" if not cam.is_open() else "camera capture failed"}
+            time.sleep(0.05)
+            item = cam.latest(CAMERA_MAX_AGE)
+        with open(filepath, 'wb') as f:
+            f.write(image_profiles.encode_bgr(item[1], profile))
+        register_image(filename)
         
         return {"image_path": f"/static/images/{filename}"}
     except Exception as e:
@@ -318,49 +554,105 @@ def capture_image():
 
 
 
-def image_from_pixels(frame_obj):
-    """将前端/外部发送的像素矩阵(frame.width/height/pixels)转换并保存为图像。
+def image_from_pixels(frame_obj, device_id=None):
+    """将前端/外部发送的帧转换并保存为图像。
+    支持像素矩阵 frame{width,height,pixels} 与紧凑编码 frame{encoding,width,height,data}
+    （rgb24-base64 / jpeg-base64 / png-base64，校验和基于解码后的原始字节）。
+    像素帧按 device_id 对应的存储配置编码；已压缩的 JPEG/PNG 原样落盘。
     返回 {image_path, checksum_frame_calc} 或 {error}
     """
     try:
-        width = int(frame_obj.get("width", 0))
-        height = int(frame_obj.get("height", 0))
-        pixels = frame_obj.get("pixels")
-        if width <= 0 or height <= 0 or not isinstance(pixels, list):
-            return {"error": "frame invalid"}
-
-        # 组装为 numpy 图像
-        arr = np.zeros((height, width, 3), dtype=np.uint8)
-        flat_bytes = bytearray()
-        for y in range(height):
-            row = pixels[y]
-            if not isinstance(row, list) or len(row) != width:
-                return {"error": "frame row invalid"}
-            for x in range(width):
-                pix = row[x]
-                r = int(pix.get("r", 0)) & 0xFF
-                g = int(pix.get("g", 0)) & 0xFF
-                b = int(pix.get("b", 0)) & 0xFF
-                arr[y, x, 0] = r
-                arr[y, x, 1] = g
-                arr[y, x, 2] = b
-                flat_bytes.extend([r, g, b])
-
-        # 计算 CRC32 校验（与C端一致）
-        checksum_calc = zlib.crc32(flat_bytes) & 0xFFFFFFFF
-        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"ingest_{ts}.png"
-        filepath = os.path.join(IMAGES_DIR, filename)
-        # OpenCV 期望 BGR 顺序；当前 arr 是 RGB → 转换
-        arr_bgr = cv2.cvtColor(arr, cv2.COLOR_RGB2BGR)
-        cv2.imwrite(filepath, arr_bgr)
-        return {"image_path": f"/static/images/{filename}", "checksum_frame_calc": f"{checksum_calc:08x}"}
+        # 一次性解码为连续缓冲，并在同一缓冲上计算 CRC32（与C端一致）
+        try:
+            decoded = decode_frame(frame_obj, strict=True)
+        except FrameError as e:
+            return {"error": str(e)}
+        return save_decoded_frame(decoded, device_id)
+    except Exception as e:
+        print(f"[FRAME] 转换异常: {e}")
+        return {"error": "frame convert failed"}
+
+
+def image_from_buffer(buf, frame_meta, checksum=None, device_id=None):
+    """将二进制请求体中的原始帧字节保存为图像。
+    frame_meta 为 {encoding: rgb24|jpeg|png, width, height}；CRC32 在接收缓冲上先行校验，
+    不符时不做任何解码；rgb24 直接映射为数组后按存储配置编码，JPEG/PNG 原样落盘。
+    返回 {image_path, checksum_frame_calc} 或 {error}
+    """
+    meta = frame_meta if isinstance(frame_meta, dict) else {}
+    try:
+        try:
+            decoded = decode_raw(buf, meta.get("encoding"), meta.get("width"), meta.get("height"), checksum)
+        except ChecksumError as e:
+            return {"error": "checksum mismatch", "calc": e.calc, "sent": e.sent}
+        except (FrameError, TypeError, ValueError) as e:
+            return {"error": str(e) or "frame invalid"}
+        return save_decoded_frame(decoded, device_id)
     except Exception as e:
         print(f"[FRAME] 转换异常: {e}")
         return {"error": "frame convert failed"}
 
 
+def save_decoded_frame(decoded, device_id=None):
+    """按存储配置落盘已解码的帧，返回 {image_path, checksum_frame_calc}"""
+    # 文件名精确到毫秒：按摄像头帧率接入时同一秒内有多帧
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
+    if decoded.encoded is not None:
+        # JPEG/PNG 原样落盘
+        filename = f"ingest_{ts}{decoded.ext}"
+        with open(os.path.join(IMAGES_DIR, filename), 'wb') as f:
+            f.write(decoded.encoded)
+    else:
+        _name, profile = image_profiles.resolve(IMAGE_STORAGE, device_id)
+        filename = f"ingest_{ts}{profile['ext']}"
+        filepath = os.path.join(IMAGES_DIR, filename)
+        # OpenCV 期望 BGR 顺序；当前 arr 是 RGB → 转换
+        arr_bgr = cv2.cvtColor(decoded.rgb, cv2.COLOR_RGB2BGR)
+        with open(filepath, 'wb') as f:
+            f.write(image_profiles.encode_bgr(arr_bgr, profile))
+    register_image(filename)
+    return {"image_path": f"/static/images/{filename}", "checksum_frame_calc": decoded.crc}
+
+
 # ==================== 数据存取 ====================
+# 热点语句：连接池中的每个 psycopg2 连接首次执行时 PREPARE，之后只发 EXECUTE；
+# py-opengauss 连接或 DB_PREPARED=0 时执行 %s 版本
+STATEMENTS.register(
+    "app_save_sensor", ("real", "text"),
+    "INSERT INTO sensor_data (temperature, image_path) VALUES ($1, $2)",
+    "INSERT INTO sensor_data (temperature, image_path) VALUES (%s, %s)",
+)
+STATEMENTS.register(
+    "app_save_sensor_light", ("real", "text", "integer"),
+    "INSERT INTO sensor_data (temperature, image_path, light) VALUES ($1, $2, $3)",
+    "INSERT INTO sensor_data (temperature, image_path, light) VALUES (%s, %s, %s)",
+)
+_LATEST_SQL = """
+            SELECT temperature, image_path, light, timestamp
+            FROM sensor_data 
+            WHERE (bubble_count IS NULL OR bubble_count = 0)
+            ORDER BY timestamp DESC LIMIT 1
+        """
+STATEMENTS.register("app_latest", (), _LATEST_SQL, _LATEST_SQL)
+STATEMENTS.register(
+    "app_history", ("integer",),
+    """
+            SELECT timestamp, value
+            FROM temperature_data
+            WHERE timestamp > NOW() - $1 * INTERVAL '1 hour'
+              AND value > -40 AND value < 125
+            ORDER BY timestamp ASC
+        """,
+    """
+            SELECT timestamp, value
+            FROM temperature_data
+            WHERE timestamp > NOW() - INTERVAL '%s hours'
+              AND value > -40 AND value < 125
+            ORDER BY timestamp ASC
+        """,
+)
+
+
 def save_sensor_data(temp, image_path, light=None):
     """保存到 openGauss.sensor_data 表"""
     conn = get_db_connection()
@@ -368,15 +660,9 @@ def save_sensor_data(temp, image_path, light=None):
     try:
         cursor = conn.cursor()
         if light is None:
-            cursor.execute(
-                "INSERT INTO sensor_data (temperature, image_path) VALUES (%s, %s)",
-                (temp, image_path)
-            )
+            STATEMENTS.execute(cursor, "app_save_sensor", (temp, image_path))
         else:
-            cursor.execute(
-                "INSERT INTO sensor_data (temperature, image_path, light) VALUES (%s, %s, %s)",
-                (temp, image_path, int(light))
-            )
+            STATEMENTS.execute(cursor, "app_save_sensor_light", (temp, image_path, int(light)))
         conn.commit()
         return True
     except Exception as e:
@@ -389,21 +675,314 @@ def save_sensor_data(temp, image_path, light=None):
         if conn:
             close_db_connection(conn)
 
-def save_sensor_data_bulk(rows):
+# 写入缓冲（write-behind）：/api/ingest 与 /api/capture 的 sensor_data 行先入内存队列，
+# 由后台线程按行数或等待时间攒批提交，请求线程不再等待数据库往返；?sync=1 时等待所在批次提交后再响应
+# 被数据库拒收的行（数据错误）与重试次数用尽的行记入 runtime/app_deadletter.jsonl，不阻塞后续行
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "1") == "1"
+WRITE_BEHIND_ROWS = int(os.getenv("WRITE_BEHIND_ROWS", "200"))
+WRITE_BEHIND_MS = int(os.getenv("WRITE_BEHIND_MS", "100"))
+WRITE_BEHIND_MAX = int(os.getenv("WRITE_BEHIND_MAX", "10000"))  # 队列上限，满时退回同步写入
+WRITE_BEHIND_SYNC_TIMEOUT = float(os.getenv("WRITE_BEHIND_SYNC_TIMEOUT", "10"))
+WRITE_BEHIND_RETRIES = int(os.getenv("WRITE_BEHIND_RETRIES", "8"))  # 每行最多提交尝试次数（退避 0.5→10 秒）
+WRITER = None  # SensorWriteBehind 实例，首次写入时创建
+WRITER_LOCK = threading.Lock()
+SENSOR_DEAD_LETTER = DeadLetterLog(os.path.join(RUNTIME_DIR, "app_deadletter.jsonl"), source="flask")
+# light 列为 integer（int4），超出范围的值入库时会被数据库拒收
+INT4_MIN, INT4_MAX = -2 ** 31, 2 ** 31 - 1
+STATEMENTS.register(
+    "app_sensor_batch", ("real[]", "text[]", "integer[]"),
+    "INSERT INTO sensor_data (temperature, image_path, light) SELECT unnest($1), unnest($2), unnest($3)",
+)
+
+
+def _insert_sensor_rows(cursor, rows, prepared):
+    if prepared:
+        STATEMENTS.execute(cursor, "app_sensor_batch", [list(c) for c in zip(*rows)])
+    else:
+        cursor.executemany("INSERT INTO sensor_data (temperature, image_path, light) VALUES (%s, %s, %s)", rows)
+
+
+def save_sensor_rows(rows):
+    """一个事务写入多行 sensor_data：[(温度, 图片路径, 光照或 None), ...]
+    整批被拒（数据错误，SQLSTATE 22/23）时逐行重试（每行一个保存点），拒收的行记入 dead letter，其余行提交
+
+    :return: (是否提交, {拒收行下标: 错误})
+    """
     conn = get_db_connection()
+    if not conn:
+        return False, {}
     cursor = None
+    rejected = {}
     try:
         cursor = conn.cursor()
-        cursor.executemany(
-            "INSERT INTO sensor_data (temperature, image_path, light) VALUES (%s, %s, %s)",
-            [(float(t), str(p), (None if l is None else int(l))) for (t, p, l) in rows]
-        )
+        prepared = STATEMENTS.usable(conn)
+        try:
+            _insert_sensor_rows(cursor, rows, prepared)
+        except Exception as e:
+            if not is_data_error(e):
+                raise
+            print(f"[SAVE] 批量被拒({len(rows)} 行)，逐行重试: {str(e).strip()}")
+            conn.rollback()
+            for i, row in enumerate(rows):
+                cursor.execute("SAVEPOINT sensor_row")
+                try:
+                    _insert_sensor_rows(cursor, [row], prepared)
+                except Exception as row_err:
+                    if not is_data_error(row_err):
+                        raise
+                    cursor.execute("ROLLBACK TO SAVEPOINT sensor_row")
+                    rejected[i] = row_err
+                    continue
+                cursor.execute("RELEASE SAVEPOINT sensor_row")
         conn.commit()
-        return True
+        for i, err in rejected.items():
+            print(f"[SAVE] sensor_data 拒收 1 行: {str(err).strip()}")
+            SENSOR_DEAD_LETTER.record("sensor_data", rows[i], err)
+        return True, rejected
     except Exception as e:
         print(f"[SAVE] 批量失败: {e}")
-        conn.rollback()
-        return False
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        return False, {}
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            close_db_connection(conn)
+
+
+class SensorWriteBehind:
+    """sensor_data 写入缓冲：有界内存队列 + 后台攒批提交
+
+    数据库拒收的行（数据错误）在提交时逐行隔离并记入 dead letter，其余行照常提交；
+    连接等错误导致的失败批次放回队首，退避后重试，每行最多尝试 max_retries 次，用尽后记入 dead letter；
+    队列满时 submit 返回 None，由调用方同步写入
+    """
+
+    def __init__(self, max_rows=200, max_delay_ms=100, max_queue=10000, max_retries=8):
+        self.max_rows = max(1, int(max_rows))
+        self.max_delay = max(1, int(max_delay_ms)) / 1000.0
+        self.max_queue = max(1, int(max_queue))
+        self.max_retries = max(1, int(max_retries))
+        self._rows = deque()  # [入队 monotonic 时间, 行, 等待确认的 Event 或 None, 提交结果, 已尝试次数]
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread = None
+        self.stats = {"queued": 0, "written": 0, "batches": 0, "errors": 0, "overflow": 0, "invalid": 0,
+                      "rejected": 0, "expired": 0, "sync_waits": 0, "sync_timeouts": 0,
+                      "flush_ms": 0.0, "flush_ms_max": 0.0}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sensor-write-behind", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def submit(self, temp, image_path, light=None, wait=False):
+        """入队一行；wait=True 时等待提交结果
+
+        :return: 异步时 True；同步时提交成功与否；队列已满时 None；值无法转换时 False
+        """
+        done = threading.Event() if wait else None
+        try:
+            row = (float(temp), str(image_path), None if light is None else int(light))
+        except (TypeError, ValueError, OverflowError):
+            with self._cond:
+                self.stats["invalid"] += 1
+            return False
+        with self._cond:
+            if len(self._rows) >= self.max_queue:
+                self.stats["overflow"] += 1
+                return None
+            item = [time.monotonic(), row, done, False, 0]
+            self._rows.append(item)
+            self.stats["queued"] += 1
+            # 首行到达时唤醒以开始计时；攒满或有同步等待时立即提交
+            if len(self._rows) in (1, self.max_rows) or done is not None:
+                self._cond.notify()
+        if done is None:
+            return True
+        self.stats["sync_waits"] += 1
+        if not done.wait(WRITE_BEHIND_SYNC_TIMEOUT):
+            self.stats["sync_timeouts"] += 1
+            return False
+        return item[3]
+
+    def depth(self):
+        with self._cond:
+            return len(self._rows)
+
+    def snapshot(self):
+        with self._cond:
+            out = dict(self.stats)
+            out["depth"] = len(self._rows)
+            out["oldest_ms"] = int((time.monotonic() - self._rows[0][0]) * 1000) if self._rows else 0
+        out["max_queue"] = self.max_queue
+        return out
+
+    def _take(self):
+        # 持锁调用：攒够行数、最早一行等待超时、有同步等待或停止时取出一批
+        while True:
+            if self._rows:
+                age = time.monotonic() - self._rows[0][0]
+                if (self._stopping or len(self._rows) >= self.max_rows or age >= self.max_delay
+                        or any(it[2] is not None for it in self._rows)):
+                    return [self._rows.popleft() for _ in range(min(self.max_rows, len(self._rows)))]
+                self._cond.wait(self.max_delay - age)
+            elif self._stopping:
+                return None
+            else:
+                self._cond.wait()
+
+    def _run(self):
+        backoff = 0.5
+        while True:
+            with self._cond:
+                batch = self._take()
+            if batch is None:
+                return
+            t0 = time.perf_counter()
+            ok, rejected = save_sensor_rows([it[1] for it in batch])
+            dt = (time.perf_counter() - t0) * 1000
+            expired = []
+            with self._cond:
+                self.stats["flush_ms"] = round(dt, 2)
+                self.stats["flush_ms_max"] = round(max(self.stats["flush_ms_max"], dt), 2)
+                if ok:
+                    self.stats["written"] += len(batch) - len(rejected)
+                    self.stats["rejected"] += len(rejected)
+                    self.stats["batches"] += 1
+                else:
+                    self.stats["errors"] += 1
+                    # 同步等待者得到失败结果；其余行放回队首稍后重试，尝试次数用尽的行不再放回
+                    retry = []
+                    for it in batch:
+                        if it[2] is not None:
+                            continue
+                        it[4] += 1
+                        (retry if it[4] < self.max_retries else expired).append(it)
+                    self._rows.extendleft(reversed(retry))
+                    self.stats["expired"] += len(expired)
+            for it in expired:
+                SENSOR_DEAD_LETTER.record("sensor_data", it[1], f"write failed after {it[4]} attempts")
+            if expired:
+                print(f"[WRITE_BEHIND] {len(expired)} 行重试 {self.max_retries} 次仍失败，已记入 dead letter")
+            for i, it in enumerate(batch):
+                if it[2] is not None:
+                    it[3] = ok and i not in rejected
+                    it[2].set()
+            if ok:
+                backoff = 0.5
+            else:
+                with self._cond:
+                    if self._stopping:
+                        return
+                    self._cond.wait(backoff)
+                backoff = min(backoff * 2, 10.0)
+
+
+def get_write_behind():
+    """获取（必要时创建并启动）写入缓冲，WRITE_BEHIND=0 时返回 None"""
+    global WRITER
+    if not WRITE_BEHIND:
+        return None
+    with WRITER_LOCK:
+        if WRITER is None:
+            WRITER = SensorWriteBehind(WRITE_BEHIND_ROWS, WRITE_BEHIND_MS, WRITE_BEHIND_MAX, WRITE_BEHIND_RETRIES).start()
+            atexit.register(WRITER.stop)
+        return WRITER
+
+
+def queue_sensor_data(temp, image_path, light=None, sync=False):
+    """经写入缓冲保存一行 sensor_data；缓冲关闭或已满时同步写入
+
+    :param sync: 等待所在批次提交（需要持久化确认的调用方）
+    :return: True/False 表示成功与否（异步入队即视为成功）
+    """
+    writer = get_write_behind()
+    if writer is not None:
+        ok = writer.submit(temp, image_path, light, wait=sync)
+        if ok is not None:
+            return ok
+    return save_sensor_data(temp, image_path, light=light)
+
+
+# 批量写入的分表列（值, 设备, 时间戳）；时间戳为带时区的 ISO 字符串
+BULK_TABLES = {
+    "temperature_data": "value, device_id, timestamp",
+    "light_data": "value, device_id, timestamp",
+}
+# 分表列的取值上限（见 db_init.sql）：device_id VARCHAR(50)、温度 REAL；light 为 integer（INT4_MIN..INT4_MAX）
+DEVICE_ID_MAX = 50
+REAL_MAX = 3.4028234663852886e38
+
+
+def _copy_csv(rows):
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="\n").writerows(rows)
+    buf.seek(0)
+    return buf
+
+
+def save_sensor_data_bulk(rows_by_table):
+    """批量写入分表：{表名: [(值, 设备, 时间戳), ...]}，所有表在同一事务内提交。
+    psycopg2 连接用 COPY FROM STDIN（CSV），一次往返写入整表；其他驱动退回 executemany。
+    整批被拒（数据错误，SQLSTATE 22/23，如启用唯一索引后的重复键）时逐行重试（每行一个保存点），
+    只有被拒收的行不入库
+
+    :return: (是否提交, {(表名, 行下标): 错误})
+    """
+    conn = get_db_connection()
+    if not conn:
+        return False, {}
+    cursor = None
+    rejected = {}
+    try:
+        cursor = conn.cursor()
+        try:
+            for table, rows in rows_by_table.items():
+                if not rows:
+                    continue
+                cols = BULK_TABLES[table]
+                if hasattr(cursor, "copy_expert"):
+                    cursor.copy_expert(f"COPY {table} ({cols}) FROM STDIN WITH CSV", _copy_csv(rows))
+                else:
+                    cursor.executemany(f"INSERT INTO {table} ({cols}) VALUES (%s, %s, %s)", rows)
+        except Exception as e:
+            if not is_data_error(e):
+                raise
+            print(f"[SAVE] 批量被拒，逐行重试: {str(e).strip()}")
+            conn.rollback()
+            for table, rows in rows_by_table.items():
+                sql = f"INSERT INTO {table} ({BULK_TABLES[table]}) VALUES (%s, %s, %s)"
+                for j, row in enumerate(rows):
+                    cursor.execute("SAVEPOINT bulk_row")
+                    try:
+                        cursor.execute(sql, row)
+                    except Exception as row_err:
+                        if not is_data_error(row_err):
+                            raise
+                        cursor.execute("ROLLBACK TO SAVEPOINT bulk_row")
+                        rejected[(table, j)] = row_err
+                        continue
+                    cursor.execute("RELEASE SAVEPOINT bulk_row")
+        conn.commit()
+        return True, rejected
+    except Exception as e:
+        print(f"[SAVE] 批量失败: {e}")
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        return False, {}
     finally:
         if cursor:
             cursor.close()
@@ -417,22 +996,16 @@ def get_latest_data():
     cursor = None
     try:
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT temperature, image_path, light, timestamp
-            FROM sensor_data 
-            WHERE (bubble_count IS NULL OR bubble_count = 0)
-            ORDER BY timestamp DESC LIMIT 1
-        """)
+        STATEMENTS.execute(cursor, "app_latest")
         row = cursor.fetchone()
         if not row:
             return None
         img = row[1]
         if isinstance(img, str) and img.startswith("/static/images/"):
-            fname = os.path.basename(img)
-            fpath = os.path.join(IMAGES_DIR, fname)
-            if not os.path.exists(fpath):
-                cap = capture_image()
-                img = cap.get("image_path") if isinstance(cap, dict) else None
+            # 内存索引判断存在性；已被清理时回退为目录中最新的图片，不在查询路径中抓拍
+            index = get_image_index()
+            if not index.contains(img):
+                img = index.latest()
         return {
             "temperature": row[0],
             "image_path": img,
@@ -455,13 +1028,7 @@ def get_history_data(hours=24):
     cursor = None
     try:
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT timestamp, value
-            FROM temperature_data
-            WHERE timestamp > NOW() - INTERVAL '%s hours'
-              AND value > -40 AND value < 125
-            ORDER BY timestamp ASC
-        """, (hours,))
+        STATEMENTS.execute(cursor, "app_history", (int(hours),))
         rows = cursor.fetchall()
         
         t_data = []
@@ -686,19 +1253,7 @@ def api_db_table():
 @app.route('/api/latest')
 def api_latest():
     latest = LATEST_CACHE or get_latest_data()
-    now_ts = int(time.time())
-    db_conn = get_db_connection()
-    if db_conn:
-        try:
-            close_db_connection(db_conn)
-        except Exception:
-            pass
-    status = {
-        "ds18b20": "online" if (now_ts - HEARTBEAT['temp'] < HB_TIMEOUT) else "offline",
-        "light": "online" if (now_ts - HEARTBEAT['light'] < HB_TIMEOUT) else "offline",
-        "camera": "online" if (now_ts - HEARTBEAT['image'] < HB_TIMEOUT) else "offline",
-        "db": "online" if db_conn else "offline"
-    }
+    status = build_status()
 
     if latest:
         latest["sensor_status"] = status
@@ -739,10 +1294,9 @@ def api_events():
                 pass
     return Response(gen(), mimetype='text/event-stream')
 
-@app.route('/api/relay_notify', methods=['POST'])
-def api_relay_notify():
+def apply_relay_update(data):
+    """将一条中转通知合并进 HEARTBEAT 与 LATEST_CACHE（不广播），返回更新后的缓存"""
     global LATEST_CACHE
-    data = request.get_json(silent=True) or {}
     try:
         log_message(f"[relay] ts={data.get('timestamp')} ts_ms={data.get('timestamp_ms')}")
     except Exception:
@@ -778,13 +1332,164 @@ def api_relay_notify():
         cur['timestamp'] = datetime.fromtimestamp(ts_ms/1000.0).strftime("%Y-%m-%d %H:%M:%S")
     else:
         cur['timestamp'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    cur['sensor_status'] = build_status()
     LATEST_CACHE = cur
+    return cur
+
+@app.route('/api/relay_notify', methods=['POST'])
+def api_relay_notify():
+    # 中转会把突发通知合并为 {"batch": [...]}：逐条合并后只计算一次状态、广播一次
+    data = request.get_json(silent=True) or {}
+    items = data.get('batch') if isinstance(data, dict) and isinstance(data.get('batch'), list) else [data]
+    cur = None
+    for item in items:
+        if isinstance(item, dict):
+            cur = apply_relay_update(item)
+    if cur is None:
+        return jsonify({ 'status': 'ok', 'count': 0 })
+    cur['sensor_status'] = build_status()
     try:
         broadcast(cur)
     except Exception:
         pass
-    return jsonify({ 'status': 'ok' })
+    return jsonify({ 'status': 'ok', 'count': len(items) })
+
+class EmbeddedRelayProtocol(asyncio.DatagramProtocol):
+    """内嵌接收：事件循环线程中解析数据包，通知项交给 EmbeddedRelay 合并广播"""
+
+    def __init__(self, owner):
+        self.owner = owner
+
+    def datagram_received(self, data, addr):
+        self.owner.handle(data, addr)
+
+    def error_received(self, exc):
+        print(f"[EMBED] UDP 接收异常: {exc}")
+
+
+class EmbeddedRelay:
+    """在 Flask 进程内运行中转的数据包处理（后台线程中的 asyncio 事件循环）"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.loop = None
+        self.transport = None
+        self.core = None  # relay/udp_relay.py 模块
+        self.config = None
+        self._thread = None
+        self._pending = []  # 待合并广播的通知项（仅在事件循环线程中访问）
+        self._flushing = False
+        self.stats = {"received": 0, "errors": 0, "broadcasts": 0, "models": 0}
+
+    def start(self):
+        # 延迟导入：仅内嵌模式才加载中转模块及其依赖
+        import udp_relay
+        self.core = udp_relay
+        self.config = udp_relay.load_config()
+        udp_relay.start_handlers(self.config)
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(ready,), name="embedded-relay", daemon=True)
+        self._thread.start()
+        ready.wait(5.0)
+        return self
+
+    def stop(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self._thread is not None:
+            self._thread.join(5.0)
+        if self.core is not None:
+            self.core.stop_handlers()
+
+    def _run(self, ready):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.transport, _ = self.loop.run_until_complete(self.loop.create_datagram_endpoint(
+                lambda: EmbeddedRelayProtocol(self), local_addr=(self.host, self.port)))
+            print(f"[EMBED] 内嵌接收已启动 udp://{self.host}:{self.port}")
+        except Exception as e:
+            print(f"[EMBED] 绑定 UDP 端口失败: {e}")
+            ready.set()
+            return
+        ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.transport.close()
+            self.loop.close()
+
+    def handle(self, data, addr):
+        self.stats["received"] += 1
+        core = self.core
+        try:
+            if core.REASSEMBLER is not None and is_fragment(data):
+                data = core.REASSEMBLER.feed(data, addr)
+                if data is None:
+                    return
+            items = core.handle_packet(data, self.config) or ()
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"[EMBED] 数据包处理失败: {e}")
+            return
+        if not items:
+            return
+        self._pending.extend(items)
+        if not self._flushing:
+            # 同一轮事件循环内到达的数据包合并为一次广播；状态计算可能访问数据库，放到线程池中执行
+            self._flushing = True
+            self.loop.call_soon(self._flush)
+
+    def _flush(self):
+        items, self._pending = self._pending, []
+        fut = self.loop.run_in_executor(None, self._publish, items)
+        fut.add_done_callback(lambda f: self.loop.call_soon_threadsafe(self._flushed))
+
+    def _flushed(self):
+        if self._pending:
+            self._flush()
+        else:
+            self._flushing = False
+
+    def _publish(self, items):
+        cur = None
+        for kind, payload in items:
+            try:
+                if kind == "model":
+                    name, output = payload
+                    broadcast({'model_output': {'name': str(name or ''), 'output': output}})
+                    self.stats["models"] += 1
+                else:
+                    cur = apply_relay_update(payload)
+            except Exception as e:
+                print(f"[EMBED] 通知处理失败: {e}")
+        if cur is not None:
+            cur['sensor_status'] = build_status()
+            try:
+                broadcast(cur)
+                self.stats["broadcasts"] += 1
+            except Exception:
+                pass
+
+    def snapshot(self):
+        out = dict(self.stats)
+        try:
+            out["relay"] = self.core.worker_stats()
+        except Exception:
+            pass
+        return out
+
+
+def start_embedded_relay():
+    """启动内嵌接收（EMBEDDED_RELAY=1 时在 __main__ 中调用）"""
+    global EMBEDDED
+    try:
+        EMBEDDED = EmbeddedRelay(EMBEDDED_RELAY_HOST, EMBEDDED_RELAY_PORT).start()
+        # 退出时刷写批量写入器中尚未提交的行
+        atexit.register(EMBEDDED.stop)
+    except Exception as e:
+        EMBEDDED = None
+        print(f"[EMBED] 内嵌接收启动失败: {e}")
 
 @app.route('/api/tags', methods=['GET', 'POST'])
 def api_tags():
@@ -1238,6 +1943,48 @@ def api_models_download(name):
         return jsonify({'error':'download failed'}), 500
 
 
+@lru_cache(maxsize=IMAGE_SCALE_CACHE)
+def _scaled_image(path, mtime, scale, width):
+    # mtime 参与缓存键：文件被覆盖后自动失效
+    with open(path, 'rb') as f:
+        data = f.read()
+    return image_profiles.scale_encoded(data, os.path.splitext(path)[1], scale=scale, width=width)
+
+
+@app.route('/api/image/<path:name>')
+def api_image(name):
+    """读取时缩放：/api/image/<文件名>?scale=N 或 ?width=W，最近邻放大低分辨率帧"""
+    try:
+        safe = os.path.basename(name)
+        if safe != name or safe.startswith('.'):
+            return jsonify({'error': 'bad name'}), 400
+        ext = os.path.splitext(safe)[1].lower()
+        mime = {'.png': 'image/png', '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.webp': 'image/webp'}.get(ext)
+        path = os.path.join(IMAGES_DIR, safe)
+        if mime is None or not os.path.isfile(path):
+            return jsonify({'error': 'not found'}), 404
+        try:
+            scale = int(request.args.get('scale', 1))
+            width = int(request.args['width']) if request.args.get('width') else None
+        except ValueError:
+            return jsonify({'error': 'bad scale'}), 400
+        if scale < 1 or scale > IMAGE_SCALE_MAX or (width is not None and width < 1):
+            return jsonify({'error': 'bad scale'}), 400
+        if scale == 1 and width is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+        else:
+            data = _scaled_image(path, os.path.getmtime(path), scale, width)
+        resp = Response(data, mimetype=mime)
+        resp.headers['Cache-Control'] = 'public, max-age=3600'
+        return resp
+    except ValueError:
+        return jsonify({'error': 'scale out of range'}), 400
+    except Exception as e:
+        print(f"[IMAGE] 缩放失败 {name}: {e}")
+        return jsonify({'error': 'image read failed'}), 500
+
+
 @app.route('/api/scripts/logs')
 def api_script_logs():
     sid = request.args.get('script_id', type=int)
@@ -1337,10 +2084,11 @@ def api_capture():
     if "error" in img_res:
         return jsonify(img_res), 503
     
-    # 存库
-    if not save_sensor_data(
+    # 存库（经写入缓冲；?sync=1 时等待提交）
+    if not queue_sensor_data(
         temp_res["temp"],
-        img_res["image_path"]
+        img_res["image_path"],
+        sync=request.args.get('sync') == '1'
     ):
         return jsonify({"error": "database save failed"}), 500
     
@@ -1351,22 +2099,94 @@ def api_capture():
     })
 
 
+@app.route('/api/ingest/stats')
+def api_ingest_stats():
+    """接入路径统计（重复抑制命中率等）"""
+    return jsonify({
+        "dedup": INGEST_DEDUP.snapshot() if INGEST_DEDUP is not None else None,
+        "image_index": IMAGE_INDEX.snapshot() if IMAGE_INDEX is not None else None,
+        "embedded_relay": EMBEDDED.snapshot() if EMBEDDED is not None else None,
+        "prepared": STATEMENTS.snapshot(),
+        "write_behind": WRITER.snapshot() if WRITER is not None else None,
+        "db_pool": DB_POOL.snapshot() if DB_POOL is not None else None,
+        "db_health": DB_HEALTH.snapshot() if DB_HEALTH is not None else None,
+    })
+
+
+# 二进制请求体：4 字节大端头部长度 + JSON 头部 + 原始帧字节
+INGEST_BODY_HEADER = struct.Struct("!I")
+INGEST_HEADER_MAX = 64 * 1024
+
+
+def read_ingest_body():
+    """按 Content-Type 拆分 /api/ingest 请求体。
+    application/octet-stream：4 字节大端头部长度 + JSON 头部 + 原始帧字节
+    multipart/form-data：meta 字段（JSON 文本或文件）+ frame 文件
+    其余按 JSON 解析（兼容 force=True 的旧行为）
+    返回 (头部字典, 原始帧字节或 None)；请求体不合法时头部为 None
+    """
+    mimetype = request.mimetype
+    if mimetype == 'application/octet-stream':
+        body = memoryview(request.get_data(cache=False))
+        if len(body) < INGEST_BODY_HEADER.size:
+            return None, None
+        (n,) = INGEST_BODY_HEADER.unpack_from(body)
+        end = INGEST_BODY_HEADER.size + n
+        if n > INGEST_HEADER_MAX or end > len(body):
+            return None, None
+        try:
+            meta = json.loads(bytes(body[INGEST_BODY_HEADER.size:end]))
+        except Exception:
+            return None, None
+        # 帧字节保持为请求缓冲上的切片，CRC 与落盘都不再复制
+        raw = body[end:] if end < len(body) else None
+        return (meta if isinstance(meta, dict) else None), raw
+    if mimetype == 'multipart/form-data':
+        meta = request.form.get('meta')
+        if meta is None and 'meta' in request.files:
+            meta = request.files['meta'].read()
+        try:
+            meta = json.loads(meta) if meta else None
+        except Exception:
+            return None, None
+        f = request.files.get('frame')
+        raw = f.read() if f is not None else None
+        return (meta if isinstance(meta, dict) else None), (raw or None)
+    return request.get_json(silent=True, force=True), None
+
+
+def ingest_error(device_id, ts_ms, body, code):
+    """/api/ingest 的错误响应：撤销 (device_id, timestamp_ms) 的判重登记，发送方修正后重发仍可入库"""
+    if INGEST_DEDUP is not None:
+        INGEST_DEDUP.forget(device_id, ts_ms)
+    return jsonify(body), code
+
+
 @app.route('/api/ingest', methods=['POST'])
 def api_ingest():
     global LATEST_CACHE
     """接收外部模拟器发送的JSON数据并入库。
     支持部分字段：device_id, timestamp_ms, temperature_c?, light?, frame{width,height,pixels}?, checksum_frame?
+    (device_id, timestamp_ms) 在去重窗口内重复时返回 status=duplicate，不再入库
+    frame 也可为紧凑编码 {encoding: rgb24-base64|jpeg-base64|png-base64, width, height, data}
+    二进制请求体（octet-stream / multipart，见 read_ingest_body）时上述字段放在 JSON 头部，
+    frame 只含 {encoding: rgb24|jpeg|png, width, height}，CRC 在接收缓冲上先行校验
     """
-    data = request.get_json(silent=True, force=True)
+    data, raw = read_ingest_body()
     if not data:
         return jsonify({"error": "invalid json"}), 400
 
     device_id = str(data.get("device_id", "unknown"))
+    ts_ms = data.get("timestamp_ms")
+    # 重发或同一时间戳的重复数据：在帧转换与入库之前直接确认
+    # 此后的校验或写入失败经 ingest_error 返回，撤销登记以免修正后的重发被当作重复
+    if INGEST_DEDUP is not None and INGEST_DEDUP.seen(device_id, ts_ms):
+        return jsonify({"status": "duplicate", "device_id": device_id, "timestamp_ms": ts_ms})
     has_temp = ("temperature_c" in data)
     has_light = ("light" in data)
     has_frame = ("frame" in data)
     temp_c = data.get("temperature_c") if has_temp else None
-    light_val = data.get("light") if has_light else None
+    light_raw = data.get("light") if has_light else None
     frame_obj = data.get("frame") if has_frame else None
     checksum_sent = str(data.get("checksum_frame", "")).lower()
 
@@ -1376,23 +2196,39 @@ def api_ingest():
         try:
             temp_val = round(float(temp_c), 1)
         except Exception:
-            return jsonify({"error": "temperature invalid"}), 400
+            return ingest_error(device_id, ts_ms, {"error": "temperature invalid"}, 400)
+
+    # 光照校验：light 列为 integer，非数值或越界的值在入库前拒绝
+    light_val = None
+    if light_raw is not None:
+        try:
+            light_val = int(light_raw)
+        except Exception:
+            return ingest_error(device_id, ts_ms, {"error": "light invalid"}, 400)
+        if not INT4_MIN <= light_val <= INT4_MAX:
+            return ingest_error(device_id, ts_ms, {"error": "light invalid"}, 400)
 
     # 帧转换与校验
     img_path = None
-    if isinstance(frame_obj, dict):
-        img_res = image_from_pixels(frame_obj)
+    if raw is not None:
+        img_res = image_from_buffer(raw, frame_obj, checksum_sent, device_id)
+        if "error" in img_res:
+            return ingest_error(device_id, ts_ms, img_res, 400)
+        img_path = img_res["image_path"]
+    elif isinstance(frame_obj, dict):
+        img_res = image_from_pixels(frame_obj, device_id)
         if "error" in img_res:
-            return jsonify(img_res), 400
+            return ingest_error(device_id, ts_ms, img_res, 400)
         if checksum_sent and img_res.get("checksum_frame_calc") and (checksum_sent != img_res["checksum_frame_calc"]):
-            return jsonify({"error": "checksum mismatch", "calc": img_res["checksum_frame_calc"], "sent": checksum_sent}), 400
+            return ingest_error(device_id, ts_ms, {"error": "checksum mismatch", "calc": img_res["checksum_frame_calc"],
+                                                  "sent": checksum_sent}, 400)
         img_path = img_res["image_path"]
 
     # 入库
     if img_path is not None and temp_val is not None:
-        ok = save_sensor_data(temp_val, img_path, light=light_val)
+        ok = queue_sensor_data(temp_val, img_path, light=light_val, sync=request.args.get('sync') == '1')
         if not ok:
-            return jsonify({"error": "database save failed"}), 500
+            return ingest_error(device_id, ts_ms, {"error": "database save failed"}, 500)
     
     ts = int(time.time())
     if temp_val is not None:
@@ -1427,6 +2263,174 @@ def api_ingest():
     })
 
 
+# 批量接入：单次请求的读数上限；NDJSON 的 Content-Type
+INGEST_BATCH_MAX = int(os.getenv("INGEST_BATCH_MAX", "10000"))
+NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl', 'application/x-jsonlines')
+
+
+def read_batch_body():
+    """解析 /api/ingest/batch 请求体：JSON 数组、{"readings": [...]} 或 NDJSON（每行一个对象）。
+    返回读数列表，无法解析的 NDJSON 行为 None（对应行状态为 error）；整体不合法时返回 None
+    """
+    raw = request.get_data(cache=False)
+    if request.mimetype not in NDJSON_TYPES:
+        try:
+            doc = json.loads(raw)
+        except Exception:
+            doc = None
+        if isinstance(doc, dict) and isinstance(doc.get("readings"), list):
+            doc = doc["readings"]
+        if isinstance(doc, list):
+            return doc
+    rows = []
+    for line in raw.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            rows.append(json.loads(line))
+        except Exception:
+            rows.append(None)
+    return rows or None
+
+
+@app.route('/api/ingest/batch', methods=['POST'])
+def api_ingest_batch():
+    """批量接入多设备读数（边缘网关断网恢复后上传积压数据）。
+    每条读数：device_id, timestamp_ms?, temperature_c?, light?；经 COPY 写入 temperature_data / light_data，
+    整批一个事务。返回每行状态 ok / duplicate / error；HEARTBEAT 与 LATEST_CACHE 每批更新一次、只广播一次，
+    积压的旧读数（早于 HB_TIMEOUT）入库但不刷新在线状态与最新值
+    """
+    global LATEST_CACHE
+    readings = read_batch_body()
+    if readings is None:
+        return jsonify({"error": "invalid body"}), 400
+    if len(readings) > INGEST_BATCH_MAX:
+        return jsonify({"error": "batch too large", "max": INGEST_BATCH_MAX}), 413
+
+    now_ms = int(time.time() * 1000)
+    live_ms = now_ms - HB_TIMEOUT * 1000
+    tables = {t: [] for t in BULK_TABLES}
+    origin = {t: [] for t in BULK_TABLES}  # 与 tables 逐行对应：(读数下标, ts_ms)
+    rows = []
+    keyed = []  # 已登记判重的键，写入失败时撤销以便网关重试
+    for i, r in enumerate(readings):
+        if not isinstance(r, dict):
+            rows.append({"index": i, "status": "error", "error": "invalid json"})
+            continue
+        device_id = str(r.get("device_id", "unknown"))
+        ts_ms = r.get("timestamp_ms")
+        try:
+            temp = round(float(r["temperature_c"]), 1) if r.get("temperature_c") is not None else None
+            light = int(r["light"]) if r.get("light") is not None else None
+            ts = int(ts_ms) if ts_ms is not None else now_ms
+            stamp = datetime.fromtimestamp(ts / 1000.0, timezone.utc).isoformat()
+        except (TypeError, ValueError, OverflowError, OSError):
+            rows.append({"index": i, "status": "error", "error": "value invalid"})
+            continue
+        # 按表结构检查，避免单行越界使整批 COPY 失败
+        if len(device_id) > DEVICE_ID_MAX:
+            rows.append({"index": i, "status": "error", "error": "device_id too long", "max": DEVICE_ID_MAX})
+            continue
+        if (temp is not None and not abs(temp) <= REAL_MAX) or (light is not None and not INT4_MIN <= light <= INT4_MAX):
+            rows.append({"index": i, "status": "error", "error": "value out of range"})
+            continue
+        if "frame" in r:
+            rows.append({"index": i, "status": "error", "error": "frame not supported, use /api/ingest"})
+            continue
+        if temp is None and light is None:
+            rows.append({"index": i, "status": "error", "error": "no readings"})
+            continue
+        if INGEST_DEDUP is not None and INGEST_DEDUP.seen(device_id, ts_ms):
+            rows.append({"index": i, "status": "duplicate"})
+            continue
+        if ts_ms is not None:
+            keyed.append((device_id, ts_ms))
+        for table, value in (("temperature_data", temp), ("light_data", light)):
+            if value is None:
+                continue
+            tables[table].append((value, device_id, stamp))
+            origin[table].append((len(rows), ts))
+        rows.append({"index": i, "status": "ok"})
+
+    accepted = sum(1 for r in rows if r["status"] == "ok")
+    summary = {
+        "accepted": accepted,
+        "duplicates": sum(1 for r in rows if r["status"] == "duplicate"),
+        "rejected": sum(1 for r in rows if r["status"] == "error"),
+    }
+    rejected = {}
+    if accepted:
+        ok, rejected = save_sensor_data_bulk(tables)
+        if not ok:
+            if INGEST_DEDUP is not None:
+                for device_id, ts_ms in keyed:
+                    INGEST_DEDUP.forget(device_id, ts_ms)
+            for r in rows:
+                if r["status"] == "ok":
+                    r["status"] = "error"
+                    r["error"] = "database save failed"
+            summary["rejected"] += accepted
+            summary["accepted"] = 0
+            return jsonify(dict(summary, status="error", rows=rows)), 500
+    # 数据库逐行拒收的读数单独报错（同一读数的另一张表的值已入库，判重登记保留）
+    for (table, j), err in rejected.items():
+        r = rows[origin[table][j][0]]
+        if r["status"] == "ok":
+            summary["accepted"] -= 1
+            summary["rejected"] += 1
+        r["status"] = "error"
+        r["error"] = f"database rejected: {str(err).strip().splitlines()[0]}"
+
+    # temperature/light -> (ts_ms, 值)，只取已入库且仍在心跳窗口内的读数
+    latest = {}
+    for key, table in (("temperature", "temperature_data"), ("light", "light_data")):
+        for j, (pos, ts) in enumerate(origin[table]):
+            if (table, j) in rejected or ts < live_ms or ts < latest.get(key, (0, None))[0]:
+                continue
+            latest[key] = (ts, tables[table][j][0])
+
+    if summary["accepted"]:
+        ts = int(time.time())
+        cur = LATEST_CACHE or {}
+        if "temperature" in latest:
+            HEARTBEAT['temp'] = ts
+            cur['temperature'] = latest["temperature"][1]
+        if "light" in latest:
+            HEARTBEAT['light'] = ts
+            cur['light'] = latest["light"][1]
+        cur['timestamp'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        cur['sensor_status'] = build_status()
+        LATEST_CACHE = cur
+        try:
+            broadcast(cur)
+        except Exception:
+            pass
+
+    # 重复读数视为已确认，不算失败
+    if not summary["rejected"]:
+        status = "success"
+    else:
+        status = "partial" if summary["rejected"] < len(rows) else "rejected"
+    return jsonify(dict(summary, status=status, rows=rows))
+
+@app.route('/api/model_output', methods=['POST'])
+def api_model_output():
+    data = request.get_json(silent=True) or {}
+    # 兼容中转的合并批量格式 {"batch": [{"name":..., "output":...}, ...]}
+    items = data.get('batch') if isinstance(data, dict) and isinstance(data.get('batch'), list) else [data]
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        name = str(item.get('name') or '')
+        output = item.get('output')
+        try:
+            broadcast({'model_output': {'name': name, 'output': output}})
+        except Exception as e:
+            print(f"[MODEL] 推送模型输出失败({name}): {e}")
+    return jsonify({'ok': True})
+
+
 # ==================== 启动 ====================
 if __name__ == '__main__':
     print("=" * 50)
@@ -1444,19 +2448,10 @@ if __name__ == '__main__':
     except Exception as e:
         print(f"⚠️ 数据库初始化异常: {e}，继续启动应用")
 
-    def init_connection_pool():
-        global PG_POOL
-        try:
-            PG_POOL = pg_pool.SimpleConnectionPool(1, 10, **{k: v for k, v in DB_CONFIG.items() if v is not None})
-            print("[DB] 连接池启用")
-        except Exception as e:
-            PG_POOL = None
-            print(f"[DB] 连接池启用失败: {e}")
-
-    try:
-        init_connection_pool()
-    except Exception as e:
-        print(f"[DB] 连接池初始化失败: {e}")
+    # 预热连接池（WSGI 部署时在首次借出时建立）
+    if DB_POOL is not None:
+        DB_POOL.fill()
+        print(f"[DB] 连接池启用: {DB_POOL.snapshot()}")
 
     # 启动
     try:
@@ -1472,19 +2467,17 @@ if __name__ == '__main__':
                 time.sleep(1)
         th = threading.Thread(target=updater, daemon=True)
         th.start()
+        if EMBEDDED_RELAY:
+            start_embedded_relay()
         print("[APP] 正在启动Flask应用...")
+        # 使用 HTTP/1.1 以便中转通知器复用 keep-alive 连接（默认 HTTP/1.0 每个请求后断开）
+        try:
+            from werkzeug.serving import WSGIRequestHandler
+            WSGIRequestHandler.protocol_version = "HTTP/1.1"
+        except Exception:
+            pass
         app.run(host='0.0.0.0', port=ENV_FLASK_PORT, debug=False, threaded=True)
     except Exception as e:
         print(f"[APP] Flask启动失败: {e}")
         import traceback
         traceback.print_exc()
-@app.route('/api/model_output', methods=['POST'])
-def api_model_output():
-    data = request.get_json(silent=True) or {}
-    name = str(data.get('name') or '')
-    output = data.get('output')
-    try:
-        broadcast({'model_output': {'name': name, 'output': output}})
-    except Exception:
-        pass
-    return jsonify({'ok': True})
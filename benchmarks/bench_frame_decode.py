@@ -0,0 +1,77 @@
+# benchmarks/bench_frame_decode.py
+#
+# 对比帧解码的旧实现（逐像素循环 + 逐字节拼接 CRC 输入）与 relay/frame_codec.py 的一次性展开
+# 用法：python3 benchmarks/bench_frame_decode.py [width] [height] [repeat]
+
+import os
+import sys
+import time
+import zlib
+import random
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "relay"))
+from frame_codec import pixels_to_array, frame_crc32
+
+
+def legacy_decode(frame):
+    """
+    与 app.py:image_from_pixels 原实现一致的逐像素循环
+    """
+    width = int(frame.get("width", 0))
+    height = int(frame.get("height", 0))
+    pixels = frame.get("pixels")
+    arr = np.zeros((height, width, 3), dtype=np.uint8)
+    flat_bytes = bytearray()
+    for y in range(height):
+        row = pixels[y]
+        for x in range(width):
+            pix = row[x]
+            r = int(pix.get("r", 0)) & 0xFF
+            g = int(pix.get("g", 0)) & 0xFF
+            b = int(pix.get("b", 0)) & 0xFF
+            arr[y, x, 0] = r
+            arr[y, x, 1] = g
+            arr[y, x, 2] = b
+            flat_bytes.extend([r, g, b])
+    return arr, f"{zlib.crc32(flat_bytes) & 0xFFFFFFFF:08x}"
+
+
+def codec_decode(frame):
+    arr = pixels_to_array(frame, strict=True)
+    return arr, frame_crc32(arr)
+
+
+def make_frame(w, h):
+    rnd = random.Random(0)
+    pixels = [[{"r": rnd.randrange(256), "g": rnd.randrange(256), "b": rnd.randrange(256)}
+               for _ in range(w)] for _ in range(h)]
+    return {"width": w, "height": h, "pixels": pixels}
+
+
+def bench(fn, frame, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(frame)
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best, out
+
+
+def main():
+    w = int(sys.argv[1]) if len(sys.argv) > 1 else 640
+    h = int(sys.argv[2]) if len(sys.argv) > 2 else 480
+    repeat = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+    frame = make_frame(w, h)
+    t_old, (arr_old, crc_old) = bench(legacy_decode, frame, repeat)
+    t_new, (arr_new, crc_new) = bench(codec_decode, frame, repeat)
+    assert np.array_equal(arr_old, arr_new) and crc_old == crc_new
+    print(f"[BENCH] frame {w}x{h} crc={crc_new}")
+    print(f"[BENCH] legacy loop : {t_old * 1000:9.1f} ms")
+    print(f"[BENCH] frame_codec : {t_new * 1000:9.1f} ms  ({t_old / t_new:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# benchmarks/bench_image_profiles.py
+#
+# 对比 relay/image_profiles.py 各内置存储配置的编码耗时与写入字节数
+# 图像为低分辨率像素帧（采集器回退帧）与摄像头分辨率的平滑渐变图
+# 用法：python3 benchmarks/bench_image_profiles.py [repeat]
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "relay"))
+from image_profiles import BUILTIN_PROFILES, encode_bgr, normalize
+
+
+def make_image(w, h):
+    """
+    与 simulators/sim_image.py 相同的正弦渐变，外加少量噪声接近真实画面
+    """
+    x = np.linspace(0, 2 * np.pi, w)
+    y = np.linspace(0, 2 * np.pi, h)
+    xv, yv = np.meshgrid(x, y)
+    r = ((0.5 + 0.5 * np.sin(xv)) * 255.0).astype(np.uint8)
+    g = ((0.5 + 0.5 * np.cos(yv)) * 255.0).astype(np.uint8)
+    b = ((r.astype(np.uint16) + g.astype(np.uint16)) // 2).astype(np.uint8)
+    img = np.stack([b, g, r], axis=2)
+    noise = np.random.default_rng(0).integers(0, 8, img.shape, dtype=np.uint8)
+    return img + noise
+
+
+def bench(img, profile, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        data = encode_bgr(img, profile)
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best, len(data)
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for w, h in ((32, 24), (64, 64), (160, 120), (640, 480)):
+        img = make_image(w, h)
+        print(f"[BENCH] image {w}x{h}")
+        for name, spec in BUILTIN_PROFILES.items():
+            dt, size = bench(img, normalize(spec), repeat)
+            print(f"[BENCH]   {name:<9}: {dt * 1000:8.2f} ms  {size:>9,} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# benchmarks/bench_ingest_body.py
+#
+# 对比 /api/ingest 三种请求体的单帧处理耗时（Flask 测试客户端，含请求解析、CRC 校验与落盘）：
+#   json-pixels  frame{width,height,pixels} 像素矩阵
+#   json-base64  frame{encoding: rgb24-base64, data}
+#   octet-stream 4 字节头部长度 + JSON 头部 + 原始 rgb24 字节
+# 入库（写入缓冲 queue_sensor_data，不启动后台写入线程）与状态查询替换为空操作，只测接入路径本身；图片写入临时目录
+# 用法：python3 benchmarks/bench_ingest_body.py [width] [height] [frames]
+
+import base64
+import json
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import zlib
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+import app  # noqa: E402
+
+
+def body_pixels(rgb, w, h, meta):
+    arr = np.frombuffer(rgb, dtype=np.uint8).reshape(h, w, 3)
+    pixels = [[{"r": int(p[0]), "g": int(p[1]), "b": int(p[2])} for p in row] for row in arr]
+    frame = {"width": w, "height": h, "pixels": pixels}
+    return json.dumps(dict(meta, frame=frame)).encode("utf-8"), "application/json"
+
+
+def body_base64(rgb, w, h, meta):
+    frame = {"encoding": "rgb24-base64", "width": w, "height": h, "data": base64.b64encode(rgb).decode("ascii")}
+    return json.dumps(dict(meta, frame=frame)).encode("utf-8"), "application/json"
+
+
+def body_octet(rgb, w, h, meta):
+    head = json.dumps(dict(meta, frame={"encoding": "rgb24", "width": w, "height": h})).encode("utf-8")
+    return struct.pack("!I", len(head)) + head + rgb, "application/octet-stream"
+
+
+def run(client, body, ctype, frames):
+    t0 = time.perf_counter()
+    for _ in range(frames):
+        r = client.post("/api/ingest", data=body, content_type=ctype)
+        if r.status_code != 200:
+            raise SystemExit(f"[BENCH] 请求失败: {r.status_code} {r.get_json()}")
+    return (time.perf_counter() - t0) / frames
+
+
+def main():
+    w = int(sys.argv[1]) if len(sys.argv) > 1 else 320
+    h = int(sys.argv[2]) if len(sys.argv) > 2 else 240
+    frames = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+
+    app.WRITE_BEHIND = False
+    app.queue_sensor_data = lambda *a, **k: True
+    app.build_status = lambda: {}
+    app.INGEST_DEDUP = None
+    app.IMAGES_DIR = tempfile.mkdtemp(prefix="bench_ingest_")
+    client = app.app.test_client()
+
+    rgb = np.random.default_rng(7).integers(0, 256, size=w * h * 3, dtype=np.uint8).tobytes()
+    meta = {"device_id": "bench", "timestamp_ms": 1, "temperature_c": 24.0, "checksum_frame": f"{zlib.crc32(rgb):08x}"}
+
+    print(f"[BENCH] frame={w}x{h} frames={frames}")
+    try:
+        for name, build in (("json-pixels", body_pixels), ("json-base64", body_base64), ("octet-stream", body_octet)):
+            body, ctype = build(rgb, w, h, meta)
+            dt = run(client, body, ctype, frames)
+            print(f"[BENCH] {name:<12}: {dt * 1000:8.2f} ms/frame  {1 / dt:7.1f} fps  {len(body):>10,} bytes")
+    finally:
+        shutil.rmtree(app.IMAGES_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# benchmarks/bench_prepared_insert.py
+#
+# 对比普通参数化语句与 relay/prepared.py 预编译语句的单行 INSERT 延迟（udp_relay.insert_*_db 的写法），
+# 以及 BatchWriter 的 execute_values 与预编译 unnest 批量 INSERT 的每行耗时
+# 写入同名临时表（LIKE 正式表），不影响正式数据；需要可连接的数据库：
+#   BENCH_DSN="host=127.0.0.1 port=7654 dbname=lab_monitor user=labuser password=..."（默认按 DB_* 环境变量拼接）
+# 用法：python3 benchmarks/bench_prepared_insert.py [rows] [batch] [repeat]
+
+import os
+import sys
+import time
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "relay"))
+from batch_writer import TABLES, register_statements
+from prepared import STATEMENTS
+
+PLAIN_SQL = "INSERT INTO temperature_data (value, device_id, timestamp) VALUES (%s, %s, to_timestamp(%s/1000.0) AT TIME ZONE 'Asia/Shanghai')"
+PREPARED_BODY = "INSERT INTO temperature_data (value, device_id, timestamp) VALUES ($1, $2, to_timestamp($3/1000.0) AT TIME ZONE 'Asia/Shanghai')"
+
+
+def dsn():
+    if os.getenv("BENCH_DSN"):
+        return os.getenv("BENCH_DSN")
+    return "host={} port={} dbname={} user={} password={}".format(
+        os.getenv("DB_HOST", "127.0.0.1"), os.getenv("DB_PORT", "7654"), os.getenv("DB_NAME", "lab_monitor"),
+        os.getenv("DB_USER", "labuser"), os.getenv("DB_PASSWORD", "LabUser@12345"),
+    )
+
+
+def connect():
+    conn = psycopg2.connect(dsn())
+    with conn.cursor() as cur:
+        cur.execute("SET TIME ZONE 'Asia/Shanghai'")
+        # 同名临时表遮蔽正式表，语句文本与线上一致
+        cur.execute("CREATE TEMP TABLE temperature_data (LIKE public.temperature_data INCLUDING DEFAULTS)")
+    conn.commit()
+    return conn
+
+
+def single_plain(conn, rows):
+    cur = conn.cursor()
+    for r in rows:
+        cur.execute(PLAIN_SQL, r)
+    conn.rollback()
+
+
+def single_prepared(conn, rows, registry):
+    cur = conn.cursor()
+    for r in rows:
+        registry.execute(cur, "bench_temperature", r)
+    conn.rollback()
+
+
+def batch_plain(conn, rows, batch):
+    _cols, _tpl, ts_cols, ts_tpl = TABLES["temperature_data"]
+    cur = conn.cursor()
+    for i in range(0, len(rows), batch):
+        execute_values(cur, f"INSERT INTO temperature_data ({ts_cols}) VALUES %s", rows[i:i + batch],
+                       template=ts_tpl, page_size=batch)
+    conn.rollback()
+
+
+def batch_prepared(conn, rows, batch, registry, name):
+    cur = conn.cursor()
+    for i in range(0, len(rows), batch):
+        registry.execute(cur, name, [list(c) for c in zip(*rows[i:i + batch])])
+    conn.rollback()
+
+
+def bench(fn, *args, repeat=5):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(*args)
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    batch = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    repeat = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    base = 1792200000000
+    rows = [(24.0 + (i % 50) / 10.0, "aht10-i2c-7", base + i) for i in range(n)]
+
+    # 基准始终走预编译路径，不受 DB_PREPARED 影响
+    registry = STATEMENTS
+    registry.enabled = True
+    registry.register("bench_temperature", ("real", "varchar", "bigint"), PREPARED_BODY, PLAIN_SQL)
+    conn = connect()
+    try:
+        t_plain = bench(single_plain, conn, rows, repeat=repeat)
+        t_prep = bench(single_prepared, conn, rows, registry, repeat=repeat)
+        name = register_statements("")[("temperature_data", True)]
+        t_bplain = bench(batch_plain, conn, rows, batch, repeat=repeat)
+        t_bprep = bench(batch_prepared, conn, rows, batch, registry, name, repeat=repeat)
+    finally:
+        conn.close()
+
+    us = 1e6 / n
+    print(f"[BENCH] rows={n} batch={batch}")
+    print(f"[BENCH] single plain    : {t_plain * us:8.1f} us/row")
+    print(f"[BENCH] single prepared : {t_prep * us:8.1f} us/row  ({t_plain / t_prep:.2f}x)")
+    print(f"[BENCH] batch  values   : {t_bplain * us:8.1f} us/row")
+    print(f"[BENCH] batch  prepared : {t_bprep * us:8.1f} us/row  ({t_bplain / t_bprep:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# benchmarks/bench_telemetry_parse.py
+#
+# 对比每个读数一个 JSON 数据包（json.loads + valid_keys 过滤 + sensor_fields 映射，与 udp_relay.handle_packet 一致）
+# 与 relay/telemetry.py 的二进制批量数据包的解析耗时、数据报个数与字节数
+# 用法：python3 benchmarks/bench_telemetry_parse.py [samples] [batch] [repeat]
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "relay"))
+from telemetry import decode, encode
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "relay", "config.json")
+
+
+def parse_json(packets, config):
+    valid = config.get("valid_keys", {}).get("sensor", [])
+    fields = config.get("sensor_fields", {})
+    n = 0
+    for data in packets:
+        j = json.loads(data.decode("utf-8"))
+        j = {k: v for k, v in j.items() if k in valid}
+        parsed = {name: j.get(key) for name, key in fields.items()}
+        if parsed.get("temperature") is not None:
+            n += 1
+    return n
+
+
+def parse_binary(packets):
+    n = 0
+    for data in packets:
+        _dev, samples = decode(data)
+        n += len(samples)
+    return n
+
+
+def bench(fn, *args, repeat=5):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(*args)
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best
+
+
+def main():
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    batch = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    repeat = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+        config = json.load(f)
+
+    base = 1792200000000
+    readings = [(base + i, 24.0 + (i % 50) / 10.0) for i in range(samples)]
+    json_packets = [
+        json.dumps({"device_id": "aht10-i2c-7", "timestamp_ms": ts, "temperature_c": v, "humidity": 55.0}).encode("utf-8")
+        for ts, v in readings
+    ]
+    bin_packets = [
+        encode("aht10-i2c-7", [(ts, "temperature", v) for ts, v in readings[i:i + batch]])
+        for i in range(0, samples, batch)
+    ]
+
+    t_json = bench(parse_json, json_packets, config, repeat=repeat)
+    t_bin = bench(parse_binary, bin_packets, repeat=repeat)
+    print(f"[BENCH] samples={samples} batch={batch}")
+    print(f"[BENCH] json  : {t_json * 1000:8.1f} ms  {len(json_packets):>7} datagrams  {sum(map(len, json_packets)):>10,} bytes")
+    print(f"[BENCH] binary: {t_bin * 1000:8.1f} ms  {len(bin_packets):>7} datagrams  {sum(map(len, bin_packets)):>10,} bytes")
+    print(f"[BENCH] speedup: {t_json / t_bin:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
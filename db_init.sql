@@ -164,6 +164,15 @@ BEGIN
     
 END $$;
 
+-- ==========================================
+-- 可选：(device_id, timestamp) 唯一索引，库端兜底去重
+-- 中转以 RELAY_DB_UNIQUE=1 启动时按数据包中的 device_id 入库并追加冲突子句（RELAY_DB_CONFLICT），
+-- 重复行被数据库忽略；需要时手动执行以下语句（已有重复数据时需先清理）
+-- ==========================================
+-- CREATE UNIQUE INDEX IF NOT EXISTS uq_temp_device_ts ON temperature_data(device_id, timestamp);
+-- CREATE UNIQUE INDEX IF NOT EXISTS uq_image_device_ts ON image_data(device_id, timestamp);
+-- CREATE UNIQUE INDEX IF NOT EXISTS uq_light_device_ts ON light_data(device_id, timestamp);
+
 -- ==========================================
 -- 添加表注释（如果不存在）
 -- ==========================================
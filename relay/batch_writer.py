@@ -0,0 +1,463 @@
+# relay/batch_writer.py
+#
+# 分表批量写入器（group commit）：
+# - 接收循环只负责把行追加到内存缓冲，不再逐条 INSERT + commit
+# - 后台线程按表聚合，达到行数阈值（RELAY_BATCH_ROWS）或时间阈值（RELAY_BATCH_MS）时
+#   以一条多行 INSERT 写入并一次提交，提交延迟不再落在接收路径上
+# - 配置 spool（spool.DiskSpool）时，连不上数据库或写入失败的批次转存到磁盘而非丢弃；
+#   数据库恢复后按 replay_rows（行/秒）的速率上限分块回放
+# - 写入失败时区分两类错误：连接错误（断线、超时等）整批转存并按 1→30 秒指数退避重连；
+#   数据错误（SQLSTATE 22/23，如数值越界、字符串超长）重试无用，改为按表、再逐行重试（各用一个保存点），
+#   被拒收的行记入 dead letter 文件（dead_letter.DeadLetterLog）并计数，其余行提交（回放时游标照常推进），
+#   一行坏数据不再拖累同批其他表与其他行
+# - psycopg2 连接上每表的批量 INSERT 为预编译语句（prepared.STATEMENTS）：各列以数组参数传入、
+#   unnest 展开为多行，任意批量大小共用同一条语句与执行计划；其他连接仍用 execute_values
+
+import threading
+import time
+
+from psycopg2.extras import execute_values
+
+from dead_letter import is_data_error
+from prepared import STATEMENTS
+
+# 表名 -> (无时间戳列, 无时间戳模板, 带时间戳列, 带时间戳模板)
+TS_EXPR = "to_timestamp(%s/1000.0) AT TIME ZONE 'Asia/Shanghai'"
+TABLES = {
+    "temperature_data": (
+        "value, device_id", "(%s, %s)",
+        "value, device_id, timestamp", "(%s, %s, " + TS_EXPR + ")",
+    ),
+    "light_data": (
+        "value, device_id", "(%s, %s)",
+        "value, device_id, timestamp", "(%s, %s, " + TS_EXPR + ")",
+    ),
+    "image_data": (
+        "image_path, device_id, bubble", "(%s, %s, %s)",
+        "image_path, device_id, bubble, timestamp", "(%s, %s, %s, " + TS_EXPR + ")",
+    ),
+    "model_outputs": (
+        "name, output", "(%s, %s)",
+        None, None,
+    ),
+}
+
+
+# 表名 -> 各列数组参数类型（不含时间戳；时间戳列为 bigint[] 毫秒数）
+ARRAY_TYPES = {
+    "temperature_data": ("real[]", "varchar[]"),
+    "light_data": ("integer[]", "varchar[]"),
+    "image_data": ("text[]", "varchar[]", "boolean[]"),
+    "model_outputs": ("text[]", "text[]"),
+}
+TS_UNNEST = "to_timestamp(unnest(${n})/1000.0) AT TIME ZONE 'Asia/Shanghai'"
+
+
+def register_statements(conflict=""):
+    """
+    登记各表的批量 INSERT 预编译语句
+
+    :param conflict: 冲突子句（已带前导空格），仅用于带时间戳列的传感器分表
+    :return: {(表名, 是否带时间戳): 语句名}
+    """
+    tag = "_c" if conflict else ""
+    names = {}
+    for table, (cols, _tpl, ts_cols, _ts_tpl) in TABLES.items():
+        types = ARRAY_TYPES[table]
+        args = [f"unnest(${i + 1})" for i in range(len(types))]
+        suffix = conflict if ts_cols else ""
+        name = f"bw_{table}{tag}"
+        STATEMENTS.register(name, types, f"INSERT INTO {table} ({cols}) SELECT {', '.join(args)}{suffix}")
+        names[(table, False)] = name
+        if ts_cols:
+            name = f"bw_{table}_ts{tag}"
+            ts_arg = TS_UNNEST.format(n=len(types) + 1)
+            STATEMENTS.register(name, types + ("bigint[]",),
+                                f"INSERT INTO {table} ({ts_cols}) SELECT {', '.join(args + [ts_arg])}{suffix}")
+            names[(table, True)] = name
+    return names
+
+
+class BatchWriter:
+    """
+    按表缓存待写入的行，并由单个后台线程批量提交
+
+    :param connect: 无参可调用对象，返回新的数据库连接（如 db_connect）
+    :param max_rows: 所有表缓存行数之和达到该值时立即刷写
+    :param max_delay_ms: 最早一行入缓冲后最多等待的毫秒数
+    :param spool: DiskSpool 实例，为 None 时写库失败的行直接丢弃
+    :param replay_rows: 暂存回放速率上限（行/秒）
+    :param on_flush: on_flush(各表行数, 耗时秒数, 是否成功)，每次提交尝试后回调
+    :param conflict: 传感器分表 INSERT 的冲突子句（如 "ON DUPLICATE KEY UPDATE NOTHING"），
+                     配合 (device_id, timestamp) 唯一索引在库端兜底去重；为 None 时不追加
+    :param dead_letter: DeadLetterLog 实例，记录被数据库拒收的行；为 None 时只计数
+    """
+
+    REPLAY_TICK = 0.25  # 回放节拍（秒），每拍最多回放 replay_rows * REPLAY_TICK 行
+
+    def __init__(self, connect, max_rows=500, max_delay_ms=200, spool=None, replay_rows=2000, on_flush=None, conflict=None,
+                 dead_letter=None):
+        self._connect = connect
+        self._conn = None
+        self._retry_at = 0.0
+        self.max_rows = max(1, int(max_rows))
+        self.max_delay = max(0.001, max_delay_ms / 1000.0)
+        self._cond = threading.Condition()
+        self._buffers = {name: [] for name in TABLES}
+        self._pending = 0
+        self._oldest = None
+        self._stopping = False
+        self._thread = None
+        self._backoff = 1.0
+        self.spool = spool
+        self.replay_chunk = max(1, int(replay_rows * self.REPLAY_TICK))
+        self._replay_at = 0.0
+        self.on_flush = on_flush
+        self.conflict = f" {conflict.strip()}" if conflict else ""
+        self._statements = register_statements(self.conflict)
+        self.dead_letter = dead_letter
+        self.stats = {"rows": 0, "flushes": 0, "errors": 0, "dropped": 0, "spooled": 0, "replayed": 0, "rejected": 0}
+
+    # ---------- 生产者接口（接收循环调用，只做内存追加） ----------
+
+    def add(self, table, row, ts_ms=None):
+        """
+        追加一行到指定表的缓冲
+
+        :param table: 表名，需在 TABLES 中
+        :param row: 不含时间戳的列值元组
+        :param ts_ms: 时间戳（毫秒），为 None 时使用表默认值 NOW()
+        """
+        if ts_ms is not None:
+            row = tuple(row) + (int(ts_ms),)
+        with self._cond:
+            self._buffers[table].append((ts_ms is not None, row))
+            self._pending += 1
+            if self._oldest is None:
+                # 首行入缓冲：唤醒后台线程开始计时 max_delay
+                self._oldest = time.monotonic()
+                self._cond.notify()
+            elif self._pending >= self.max_rows:
+                self._cond.notify()
+        return True
+
+    def add_temperature(self, temp_value, device_id='temp_main', ts_ms=None):
+        try:
+            row = (float(temp_value) if temp_value is not None else 0.0, str(device_id))
+            return self.add("temperature_data", row, ts_ms)
+        except Exception:
+            return False
+
+    def add_light(self, light_value, device_id='light_main', ts_ms=None):
+        try:
+            row = (int(light_value) if light_value is not None else 0, str(device_id))
+            return self.add("light_data", row, ts_ms)
+        except Exception:
+            return False
+
+    def add_image(self, image_path, device_id='camera_main', bubble=False, ts_ms=None):
+        try:
+            row = (str(image_path), str(device_id), bool(bubble))
+            return self.add("image_data", row, ts_ms)
+        except Exception:
+            return False
+
+    def add_model(self, name, output_text):
+        try:
+            return self.add("model_outputs", (str(name), str(output_text)))
+        except Exception:
+            return False
+
+    def pending(self):
+        with self._cond:
+            return self._pending
+
+    # ---------- 生命周期 ----------
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="batch-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def flush(self):
+        """
+        立即刷写当前缓冲（在调用线程中执行）
+        """
+        self._write(self._take())
+
+    def stop(self, timeout=5.0):
+        """
+        停止后台线程并刷写剩余数据
+        """
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        else:
+            self.flush()
+        try:
+            if self._conn is not None:
+                self._conn.close()
+        except Exception:
+            pass
+        self._conn = None
+        if self.spool is not None:
+            self.spool.close()
+
+    # ---------- 后台线程 ----------
+
+    def _take(self):
+        with self._cond:
+            batches = self._buffers
+            self._buffers = {name: [] for name in TABLES}
+            self._pending = 0
+            self._oldest = None
+        return batches
+
+    def _replay_due(self):
+        """
+        下一次回放的时间点（monotonic），无暂存或未配置时返回 None
+        """
+        if self.spool is None or not self.spool.has_backlog():
+            return None
+        return max(self._replay_at, self._retry_at)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    if self._pending >= self.max_rows:
+                        break
+                    now = time.monotonic()
+                    timeout = None
+                    if self._oldest is not None:
+                        timeout = self._oldest + self.max_delay - now
+                        if timeout <= 0:
+                            break
+                    due = self._replay_due()
+                    if due is not None:
+                        if due <= now:
+                            break
+                        timeout = due - now if timeout is None else min(timeout, due - now)
+                    self._cond.wait(timeout)
+                stopping = self._stopping
+            try:
+                self._write(self._take())
+            except Exception as e:
+                print(f"[BATCH] 刷写异常: {e}")
+            if stopping:
+                return
+            try:
+                if self._replay_due() is not None and self._replay_due() <= time.monotonic():
+                    self._replay()
+            except Exception as e:
+                print(f"[BATCH] 暂存回放异常: {e}")
+
+    def _replay(self):
+        """
+        从磁盘暂存回放一块（不超过 replay_chunk 行），写入成功后推进游标；
+        块内有被拒收的行时逐行隔离，拒收行记入 dead letter 后同样推进游标，不阻塞后续暂存
+        """
+        self._replay_at = time.monotonic() + self.REPLAY_TICK
+        rows, cursor = self.spool.read(self.replay_chunk)
+        if not rows:
+            self.spool.commit(cursor)
+            return
+        batches = {name: [] for name in TABLES}
+        for table, has_ts, row in rows:
+            if table in batches:
+                batches[table].append((has_ts, row))
+        if self._insert(batches, len(rows)):
+            self.spool.commit(cursor, len(rows))
+            self.stats["replayed"] += len(rows)
+
+    def _ensure_conn(self):
+        if self._conn is not None:
+            return self._conn
+        now = time.monotonic()
+        if now < self._retry_at:
+            return None
+        try:
+            self._conn = self._connect()
+        except Exception as e:
+            print(f"[BATCH] 数据库连接失败: {e}")
+            self._conn = None
+            self._defer()
+        return self._conn
+
+    def _defer(self):
+        # 指数退避重连（上限 30 秒），数据库宕机期间批次直接转存，不再每批阻塞在连接超时上
+        self._retry_at = time.monotonic() + self._backoff
+        self._backoff = min(self._backoff * 2, 30.0)
+
+    def _reject(self, table, row, error):
+        self.stats["rejected"] += 1
+        print(f"[BATCH] {table} 拒收 1 行: {str(error).strip()}")
+        if self.dead_letter is not None:
+            self.dead_letter.record(table, row, error)
+
+    def _spill(self, batches, total):
+        """
+        写库失败的批次转存到磁盘；无时间戳的行补上当前时间，回放时保持原始时间
+        """
+        if self.spool is None:
+            self.stats["dropped"] += total
+            return
+        now_ms = int(time.time() * 1000)
+        rows = []
+        for table, items in batches.items():
+            has_ts_cols = TABLES[table][2] is not None
+            for has_ts, row in items:
+                if not has_ts and has_ts_cols:
+                    has_ts, row = True, tuple(row) + (now_ms,)
+                rows.append((table, has_ts, row))
+        try:
+            self.spool.append(rows)
+            self.stats["spooled"] += total
+        except Exception as e:
+            print(f"[BATCH] 写入暂存失败({total} 行): {e}")
+            self.stats["dropped"] += total
+
+    def _write(self, batches):
+        total = sum(len(rows) for rows in batches.values())
+        if total == 0:
+            return
+        if not self._insert(batches, total):
+            self._spill(batches, total)
+
+    def _execute(self, cur, table, rows, prepared):
+        """
+        写入一张表的若干行（不提交）
+        """
+        if not rows:
+            return
+        cols, tpl, ts_cols, ts_tpl = TABLES[table]
+        plain = [r for has_ts, r in rows if not has_ts]
+        timed = [r for has_ts, r in rows if has_ts]
+        if prepared:
+            # 行转列：每列一个数组参数
+            for has_ts, part in ((False, plain), (True, timed)):
+                if part:
+                    STATEMENTS.execute(cur, self._statements[(table, has_ts)], [list(c) for c in zip(*part)])
+            return
+        suffix = self.conflict if ts_cols else ""
+        if plain:
+            execute_values(cur, f"INSERT INTO {table} ({cols}) VALUES %s{suffix}", plain,
+                           template=tpl, page_size=len(plain))
+        if timed:
+            execute_values(cur, f"INSERT INTO {table} ({ts_cols}) VALUES %s{suffix}", timed,
+                           template=ts_tpl, page_size=len(timed))
+
+    def _insert_rows(self, conn, cur, batches, prepared):
+        """
+        隔离被拒收的行：每张表先整表写入（一个保存点），失败的表再逐行写入（每行一个保存点），
+        被拒收的行回滚到保存点并记入 dead letter，其余行一次提交。
+        延迟约束改为逐条检查，使提交时才报告的错误也落在对应行上；提交仍被拒时整批记入 dead letter
+
+        :return: 拒收行数
+        """
+        rejected = 0
+        kept = []  # 未被拒收的 (表名, 行)，提交仍被拒时记入 dead letter
+        cur.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        for table, rows in batches.items():
+            if not rows:
+                continue
+            cur.execute("SAVEPOINT bw_table")
+            try:
+                self._execute(cur, table, rows, prepared)
+            except Exception as e:
+                if not is_data_error(e):
+                    raise
+                cur.execute("ROLLBACK TO SAVEPOINT bw_table")
+            else:
+                cur.execute("RELEASE SAVEPOINT bw_table")
+                kept.extend((table, row) for _has_ts, row in rows)
+                continue
+            for item in rows:
+                cur.execute("SAVEPOINT bw_row")
+                try:
+                    self._execute(cur, table, [item], prepared)
+                except Exception as e:
+                    if not is_data_error(e):
+                        raise
+                    cur.execute("ROLLBACK TO SAVEPOINT bw_row")
+                    self._reject(table, item[1], e)
+                    rejected += 1
+                    continue
+                cur.execute("RELEASE SAVEPOINT bw_row")
+                kept.append((table, item[1]))
+        try:
+            conn.commit()
+        except Exception as e:
+            if not is_data_error(e):
+                raise
+            conn.rollback()
+            print(f"[BATCH] 隔离后提交仍被拒，其余 {len(kept)} 行记入 dead letter: {str(e).strip()}")
+            for table, row in kept:
+                self.stats["rejected"] += 1
+                if self.dead_letter is not None:
+                    self.dead_letter.record(table, row, e)
+            return rejected + len(kept)
+        return rejected
+
+    def _insert(self, batches, total):
+        """
+        以多行 INSERT 写入并一次提交；数据错误时隔离被拒收的行（_insert_rows），其余行照常提交
+
+        :return: 是否写入成功（含隔离拒收行后的提交），连接错误返回 False
+        """
+        conn = self._ensure_conn()
+        if conn is None:
+            return False
+        t0 = time.perf_counter()
+        ok = False
+        written = total
+        cur = conn.cursor()
+        prepared = STATEMENTS.usable(conn)
+        try:
+            try:
+                for table, rows in batches.items():
+                    self._execute(cur, table, rows, prepared)
+                conn.commit()
+            except Exception as e:
+                if not is_data_error(e):
+                    raise
+                print(f"[BATCH] 批量写入被拒({total} 行)，按表/逐行隔离: {str(e).strip()}")
+                conn.rollback()
+                written = total - self._insert_rows(conn, cur, batches, prepared)
+            self.stats["rows"] += written
+            self.stats["flushes"] += 1
+            self._backoff = 1.0
+            ok = True
+            return True
+        except Exception as e:
+            print(f"[BATCH] 批量写入失败({total} 行): {str(e).strip()}")
+            self.stats["errors"] += 1
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            if is_data_error(e):
+                # 隔离过程之外的数据错误：连接仍可用，回滚即可
+                return False
+            # 连接可能已失效：关闭后按退避时间重建，期间的批次直接转存
+            try:
+                conn.close()
+            except Exception:
+                pass
+            self._conn = None
+            self._defer()
+            return False
+        finally:
+            try:
+                cur.close()
+            except Exception:
+                pass
+            if self.on_flush is not None:
+                try:
+                    self.on_flush({t: len(r) for t, r in batches.items() if r}, time.perf_counter() - t0, ok)
+                except Exception:
+                    pass
@@ -0,0 +1,193 @@
+# relay/capture_service.py
+#
+# 常驻摄像头采集服务（中转与 Flask 共用）：
+# - 设备只打开一次并保持打开，后台线程按 fps 持续读取，最新若干帧保存在环形缓冲中
+# - 打开后先丢弃若干预热帧，避免首帧曝光不足
+# - 可选地按 publish_sec 周期把最新帧原子写出（tmp + os.replace）到 publish_path，
+#   供其他进程（如 Flask 的 /api/capture）直接复制，无需再次打开设备
+# - 读帧失败时释放设备并按退避间隔重新打开
+# - 可选 idle_sec：超过该秒数没有 start() 调用时释放设备并结束线程，下次 start() 重新打开
+#   （Flask 的临时采集用，避免与中转 0 号进程的常驻采集长期争用同一设备）
+
+import os
+import threading
+import time
+from collections import deque
+
+import cv2
+
+
+def camera_index(dev):
+    """
+    将 /dev/videoN 或数字字符串解析为 OpenCV 设备序号
+    """
+    try:
+        if str(dev).startswith("/dev/video"):
+            return int(str(dev).replace("/dev/video", ""))
+        return int(str(dev))
+    except Exception:
+        return 0
+
+
+class CaptureService:
+    """
+    保持摄像头打开并持续缓存最新帧
+
+    :param device: 设备路径或序号（如 /dev/video0）
+    :param ring_size: 环形缓冲保留的帧数
+    :param fps: 读取帧率上限
+    :param warmup_frames: 每次打开设备后丢弃的帧数
+    :param publish_path: 最新帧共享文件路径（JPEG），为 None 时不写出
+    :param publish_sec: 共享文件刷新间隔（秒）
+    :param idle_sec: 空闲释放时间（秒），0 为常驻不释放
+    """
+
+    def __init__(self, device, ring_size=4, fps=5.0, warmup_frames=5, publish_path=None, publish_sec=1.0,
+                 idle_sec=0.0):
+        self.device = device
+        self.index = camera_index(device)
+        self.frames = deque(maxlen=max(1, int(ring_size)))
+        self.interval = 1.0 / fps if fps and fps > 0 else 0.0
+        self.warmup_frames = max(0, int(warmup_frames))
+        self.publish_path = publish_path
+        self.publish_sec = publish_sec
+        self.idle_sec = float(idle_sec or 0)
+        self._used_at = time.time()
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._cap = None
+        self._published_at = 0.0
+        self.stats = {"opens": 0, "frames": 0, "read_errors": 0, "published": 0, "idle_releases": 0}
+
+    # ---------- 查询接口 ----------
+
+    def is_open(self):
+        return self._cap is not None
+
+    def latest(self, max_age=None):
+        """
+        返回最新帧 (时间戳, BGR 图像)，无帧或超过 max_age 秒时返回 None
+        """
+        with self._lock:
+            if not self.frames:
+                return None
+            ts, frame = self.frames[-1]
+        if max_age is not None and time.time() - ts > max_age:
+            return None
+        return ts, frame
+
+    def save_latest(self, path, max_age=5.0, params=None):
+        """
+        将最新帧写入 path，成功返回 True
+        """
+        item = self.latest(max_age)
+        if item is None:
+            return False
+        try:
+            return bool(cv2.imwrite(path, item[1], params or []))
+        except Exception:
+            return False
+
+    # ---------- 生命周期 ----------
+
+    def start(self):
+        """
+        启动采集线程（已因空闲退出时重新启动），并刷新空闲计时
+        """
+        with self._lock:
+            self._used_at = time.time()
+            if self._thread is None:
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name="capture-service", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._release()
+
+    # ---------- 后台线程 ----------
+
+    def _open(self):
+        cap = cv2.VideoCapture(self.index, apiPreference=getattr(cv2, 'CAP_V4L2', 200))
+        if not cap.isOpened():
+            cap = cv2.VideoCapture(self.index)
+            if not cap.isOpened():
+                return None
+        try:
+            # 驱动只保留一帧缓冲，读到的总是最新画面
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        except Exception:
+            pass
+        for _ in range(self.warmup_frames):
+            cap.read()
+        self.stats["opens"] += 1
+        return cap
+
+    def _release(self):
+        cap, self._cap = self._cap, None
+        if cap is not None:
+            try:
+                cap.release()
+            except Exception:
+                pass
+
+    def _idle_exit(self):
+        # 空闲超时：持锁释放设备并清除线程引用，与 start() 的重新启动互斥
+        if self.idle_sec <= 0:
+            return False
+        with self._lock:
+            if time.time() - self._used_at < self.idle_sec:
+                return False
+            self._thread = None
+            self._release()
+            self.frames.clear()
+        self.stats["idle_releases"] += 1
+        print(f"[CAM] 空闲 {self.idle_sec:g} 秒，释放摄像头 {self.device}")
+        return True
+
+    def _run(self):
+        backoff = 1.0
+        while not self._stopping.is_set():
+            if self._idle_exit():
+                return
+            if self._cap is None:
+                self._cap = self._open()
+                if self._cap is None:
+                    self._stopping.wait(backoff)
+                    backoff = min(backoff * 2, 30.0)
+                    continue
+                backoff = 1.0
+                print(f"[CAM] 摄像头已打开 {self.device}")
+            t0 = time.time()
+            try:
+                ret, frame = self._cap.read()
+            except Exception:
+                ret, frame = False, None
+            if not ret or frame is None:
+                self.stats["read_errors"] += 1
+                print(f"[CAM] 读帧失败，重新打开 {self.device}")
+                self._release()
+                continue
+            with self._lock:
+                self.frames.append((t0, frame))
+            self.stats["frames"] += 1
+            self._publish(t0, frame)
+            if self.interval > 0:
+                self._stopping.wait(max(0.0, self.interval - (time.time() - t0)))
+
+    def _publish(self, ts, frame):
+        if not self.publish_path or ts - self._published_at < self.publish_sec:
+            return
+        self._published_at = ts
+        try:
+            tmp = self.publish_path + '.tmp.jpg'
+            if cv2.imwrite(tmp, frame):
+                os.replace(tmp, self.publish_path)
+                self.stats["published"] += 1
+        except Exception:
+            pass
@@ -0,0 +1,216 @@
+# relay/db_pool.py
+#
+# 线程安全的数据库连接池（Flask 使用；与驱动无关，连接由传入的 connect 函数创建）：
+# - minconn / maxconn：空闲连接至少保留 minconn 个；借出数达到 maxconn 时等待归还，超过 timeout 返回 None
+# - 借出时校验：空闲超过 validate_idle_sec 的连接先执行 SELECT 1，失败则丢弃重建
+# - max_lifetime：创建超过该时长的连接在借出或归还时关闭重建，避免长连接积累服务端状态
+# - 归还时回滚未结束的事务；已关闭或回滚失败的连接直接丢弃
+# 连接在首次借出时才创建（导入时不连库），预派生多进程的 WSGI 服务器各进程持有各自的连接。
+
+import threading
+import time
+from collections import deque
+
+
+class ConnectionPool:
+    """
+    数据库连接池
+
+    :param connect: 创建新连接的函数，失败时返回 None 或抛出异常
+    :param minconn: 保留的最少连接数
+    :param maxconn: 同时借出的最多连接数
+    :param max_lifetime: 连接最长存活秒数，0 为不限
+    :param validate_idle_sec: 空闲超过该秒数的连接借出前校验，0 为每次都校验
+    :param timeout: 连接耗尽时的最长等待秒数
+    """
+
+    def __init__(self, connect, minconn=1, maxconn=10, max_lifetime=1800.0, validate_idle_sec=30.0, timeout=5.0):
+        self.connect = connect
+        self.minconn = max(0, int(minconn))
+        self.maxconn = max(1, int(maxconn))
+        self.max_lifetime = float(max_lifetime)
+        self.validate_idle_sec = float(validate_idle_sec)
+        self.timeout = float(timeout)
+        self._idle = deque()  # (连接, 创建时间, 归还时间)，右端为最近归还
+        self._born = {}  # id(连接) -> 创建时间（借出中的连接）
+        self._in_use = 0
+        self._opening = 0
+        self._cond = threading.Condition()
+        self.stats = {
+            "checkouts": 0, "created": 0, "closed": 0, "recycled": 0, "invalid": 0, "connect_errors": 0,
+            "waits": 0, "timeouts": 0, "wait_ms_max": 0.0, "wait_ms_total": 0.0,
+        }
+
+    # ---------- 借出 / 归还 ----------
+
+    def getconn(self):
+        """
+        借出连接；连接耗尽且等待超时或无法建立连接时返回 None
+        """
+        t0 = time.monotonic()
+        waited = False
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, born, returned = self._idle.pop()
+                    self._in_use += 1
+                    break
+                if self._in_use + self._opening < self.maxconn:
+                    conn = None
+                    self._opening += 1
+                    break
+                left = self.timeout - (time.monotonic() - t0)
+                if left <= 0:
+                    self.stats["timeouts"] += 1
+                    self._record_wait(t0)
+                    return None
+                waited = True
+                self._cond.wait(left)
+            if waited:
+                self.stats["waits"] += 1
+                self._record_wait(t0)
+            self.stats["checkouts"] += 1
+        if conn is None:
+            return self._open_checked_out()
+        now = time.time()
+        if self.max_lifetime > 0 and now - born > self.max_lifetime:
+            self._close(conn, "recycled")
+            return self._reopen()
+        if now - returned >= self.validate_idle_sec and not self._validate(conn):
+            self._close(conn, "invalid")
+            return self._reopen()
+        with self._cond:
+            self._born[id(conn)] = born
+        return conn
+
+    def putconn(self, conn):
+        """
+        归还连接（回滚未结束的事务；已失效或超过存活时长的连接关闭）
+        """
+        if conn is None:
+            return
+        with self._cond:
+            born = self._born.pop(id(conn), None)
+        if born is None:
+            # 不是从本池借出的连接
+            self._close(conn, "closed")
+            return
+        keep = not getattr(conn, "closed", False)
+        if keep:
+            try:
+                conn.rollback()
+            except Exception:
+                keep = False
+        if keep and self.max_lifetime > 0 and time.time() - born > self.max_lifetime:
+            self._close(conn, "recycled")
+            keep = False
+        elif not keep:
+            self._close(conn, "invalid")
+        with self._cond:
+            self._in_use -= 1
+            if keep:
+                self._idle.append((conn, born, time.time()))
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+        for conn, _born, _ret in idle:
+            self._close(conn, "closed")
+
+    def fill(self):
+        """
+        补足 minconn 个空闲连接（可在启动时调用以预热）
+        """
+        while True:
+            with self._cond:
+                if len(self._idle) + self._in_use + self._opening >= max(self.minconn, 0) or \
+                        self._in_use + self._opening >= self.maxconn:
+                    return
+                self._opening += 1
+            conn = self._create()
+            with self._cond:
+                self._opening -= 1
+                if conn is None:
+                    return
+                self._idle.append((conn, time.time(), time.time()))
+                self._cond.notify()
+
+    def snapshot(self):
+        with self._cond:
+            out = dict(self.stats)
+            out["in_use"] = self._in_use
+            out["idle"] = len(self._idle)
+            out["opening"] = self._opening
+            out["minconn"] = self.minconn
+            out["maxconn"] = self.maxconn
+        out["wait_ms_max"] = round(out["wait_ms_max"], 2)
+        out["wait_ms_total"] = round(out["wait_ms_total"], 2)
+        return out
+
+    # ---------- 内部 ----------
+
+    def _record_wait(self, t0):
+        # 持锁调用
+        ms = (time.monotonic() - t0) * 1000
+        self.stats["wait_ms_total"] += ms
+        self.stats["wait_ms_max"] = max(self.stats["wait_ms_max"], ms)
+
+    def _create(self):
+        try:
+            conn = self.connect()
+        except Exception as e:
+            print(f"[POOL] 建立连接失败: {e}")
+            conn = None
+        with self._cond:
+            self.stats["created" if conn is not None else "connect_errors"] += 1
+        return conn
+
+    def _open_checked_out(self):
+        # 已占用一个 opening 名额：建立连接后转为借出
+        conn = self._create()
+        with self._cond:
+            self._opening -= 1
+            if conn is None:
+                self._cond.notify()
+                return None
+            self._in_use += 1
+            self._born[id(conn)] = time.time()
+        return conn
+
+    def _reopen(self):
+        # 借出中的连接被丢弃：释放名额后重新建立
+        with self._cond:
+            self._in_use -= 1
+            self._opening += 1
+        return self._open_checked_out()
+
+    def _validate(self, conn):
+        if getattr(conn, "closed", False):
+            return False
+        cur = None
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.fetchone()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+        finally:
+            try:
+                if cur is not None:
+                    cur.close()
+            except Exception:
+                pass
+
+    def _close(self, conn, reason):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self.stats["closed"] += 1
+            if reason in ("recycled", "invalid"):
+                self.stats[reason] += 1
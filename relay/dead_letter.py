@@ -0,0 +1,72 @@
+# relay/dead_letter.py
+#
+# 拒收行记录（dead letter）：
+# - 数据库以数据错误（SQLSTATE 22 类数据异常 / 23 类约束冲突）拒收的行重试无用，
+#   写入方把这些行逐行隔离后追加到 JSONL 文件，其余行照常提交，不再整批卡住
+# - 每行一条：{"time", "source", "table", "row", "error"}，便于人工排查后补录
+# - 文件超过 max_bytes 时滚动为 <文件名>.1（只保留一份旧文件）
+# 中转（BatchWriter）与 Flask（SensorWriteBehind）共用。
+
+import json
+import os
+import threading
+from datetime import datetime
+
+DATA_ERROR_CLASSES = ("22", "23")
+
+
+def is_data_error(exc):
+    """
+    异常是否为数据错误（行本身不合法，重试无用）；其余异常视为连接/临时错误
+
+    :param exc: 数据库驱动抛出的异常（psycopg2 为 pgcode，py-opengauss 为 sqlstate）
+    """
+    code = getattr(exc, "pgcode", None) or getattr(exc, "sqlstate", None) or ""
+    return str(code)[:2] in DATA_ERROR_CLASSES
+
+
+class DeadLetterLog:
+    """
+    追加写入的拒收行文件
+
+    :param path: 文件路径，为 None 时只计数与打印日志
+    :param source: 写入方标识（如 relay、flask）
+    :param max_bytes: 滚动阈值（字节）
+    """
+
+    def __init__(self, path, source="", max_bytes=16 * 1024 * 1024):
+        self.path = path
+        self.source = source
+        self.max_bytes = max(1024, int(max_bytes))
+        self._lock = threading.Lock()
+        self.stats = {"rows": 0, "write_errors": 0}
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def record(self, table, row, error):
+        """
+        记录一行拒收数据
+
+        :param table: 表名
+        :param row: 行值（列表或元组）
+        :param error: 数据库返回的错误
+        """
+        line = json.dumps({
+            "time": datetime.now().isoformat(timespec="milliseconds"),
+            "source": self.source,
+            "table": table,
+            "row": list(row),
+            "error": str(error).strip(),
+        }, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            self.stats["rows"] += 1
+            if not self.path:
+                return
+            try:
+                if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                    os.replace(self.path, self.path + ".1")
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+            except Exception as e:
+                self.stats["write_errors"] += 1
+                print(f"[DEADLETTER] 写入拒收记录失败: {e}")
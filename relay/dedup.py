@@ -0,0 +1,82 @@
+# relay/dedup.py
+#
+# 重复数据包抑制（中转与 Flask /api/ingest 共用）：
+# 采集器在链路不稳时会重发，模拟器与 C 采集器也可能发出相同的 timestamp_ms。
+# 以 (device_id, timestamp_ms) 为键维护有界的时间窗口索引，在入库与落图之前判重：
+# - 超过 window_sec 的键过期，条目数超过 max_entries 时淘汰最早的键（LRU 顺序即到达顺序）
+# - 没有 timestamp_ms 的数据包无法判重，直接放行并单独计数
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class DedupIndex:
+    """
+    有界的 (设备, 时间戳) 去重索引
+
+    :param window_sec: 键的保留时间（秒）
+    :param max_entries: 最多保留的键数
+    """
+
+    def __init__(self, window_sec=300.0, max_entries=100000):
+        self.window = float(window_sec)
+        self.max_entries = max(1, int(max_entries))
+        self._keys = OrderedDict()  # (device_id, ts_ms) -> 首次出现的 monotonic 时间
+        self._lock = threading.Lock()
+        self.stats = {"checked": 0, "hits": 0, "unkeyed": 0, "expired": 0, "evicted": 0}
+
+    def seen(self, device_id, ts_ms):
+        """
+        判断并登记一个数据包
+
+        :return: 窗口内已出现过时返回 True（应丢弃），否则登记并返回 False
+        """
+        if ts_ms is None:
+            with self._lock:
+                self.stats["unkeyed"] += 1
+            return False
+        try:
+            key = (str(device_id or "unknown"), int(ts_ms))
+        except (TypeError, ValueError):
+            with self._lock:
+                self.stats["unkeyed"] += 1
+            return False
+        now = time.monotonic()
+        with self._lock:
+            self.stats["checked"] += 1
+            self._expire(now)
+            if key in self._keys:
+                self.stats["hits"] += 1
+                return True
+            self._keys[key] = now
+            if len(self._keys) > self.max_entries:
+                self._keys.popitem(last=False)
+                self.stats["evicted"] += 1
+            return False
+
+    def forget(self, device_id, ts_ms):
+        """
+        撤销一个键的登记（写入失败时调用，发送方重试不被当作重复）
+        """
+        try:
+            key = (str(device_id or "unknown"), int(ts_ms))
+        except (TypeError, ValueError):
+            return
+        with self._lock:
+            self._keys.pop(key, None)
+
+    def snapshot(self):
+        with self._lock:
+            out = dict(self.stats, size=len(self._keys))
+        out["hit_rate"] = round(out["hits"] / out["checked"], 4) if out["checked"] else 0.0
+        return out
+
+    def _expire(self, now):
+        limit = now - self.window
+        while self._keys:
+            key, at = next(iter(self._keys.items()))
+            if at > limit:
+                break
+            del self._keys[key]
+            self.stats["expired"] += 1
@@ -0,0 +1,174 @@
+# relay/fragments.py
+#
+# 大数据包分片与重组（中转与采集器/模拟器共用）：
+# 超过单个 UDP 数据报上限的 JSON 数据包（如全分辨率 jpeg-base64 帧）按块切分，
+# 每块带 20 字节二进制头（网络字节序）：
+#
+#   偏移  长度  字段
+#   0     2     magic      b"KF"
+#   2     1     version    1
+#   3     1     flags      保留，填 0
+#   4     4     frame_id   发送端自增的帧序号
+#   8     2     index      块序号（0 起）
+#   10    2     count      块总数
+#   12    4     total_len  重组后的总字节数
+#   16    4     crc32      本块载荷的 CRC32
+#
+# 中转按 (发送地址, frame_id) 收集各块，全部到齐后拼接为原始数据包交给 handle_packet；
+# 超时未到齐的帧丢弃，在途总字节数受上限约束（超出时淘汰最旧的帧），各情形分别计数。
+# JSON 数据包以 "{" 开头，不会与 magic 冲突。
+
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+MAGIC = b"KF"
+VERSION = 1
+HEADER = struct.Struct("!2sBBIHHII")
+DEFAULT_CHUNK = 1400  # 默认块载荷大小，头部加载荷不超过常见 MTU
+
+
+def is_fragment(data):
+    return data[:2] == MAGIC
+
+
+def split_packet(payload, frame_id, chunk_size=DEFAULT_CHUNK):
+    """
+    将数据包切分为带头部的分片
+
+    :param payload: 原始数据包字节
+    :param frame_id: 帧序号（按 32 位取模）
+    :param chunk_size: 每块载荷字节数
+    :return: 分片字节列表
+    """
+    chunk_size = max(1, int(chunk_size))
+    total = len(payload)
+    count = max(1, (total + chunk_size - 1) // chunk_size)
+    if count > 0xFFFF:
+        raise ValueError("payload too large for fragmentation")
+    fid = frame_id & 0xFFFFFFFF
+    out = []
+    for i in range(count):
+        chunk = payload[i * chunk_size:(i + 1) * chunk_size]
+        out.append(HEADER.pack(MAGIC, VERSION, 0, fid, i, count, total, zlib.crc32(chunk) & 0xFFFFFFFF) + chunk)
+    return out
+
+
+class Reassembler:
+    """
+    分片重组缓冲（线程安全，可由多个处理线程共同调用）
+
+    :param timeout_sec: 首块到达后等待其余分片的秒数
+    :param max_bytes: 所有在途帧的字节数上限
+    :param max_frame_bytes: 单帧重组后的字节数上限
+    """
+
+    def __init__(self, timeout_sec=2.0, max_bytes=64 * 1024 * 1024, max_frame_bytes=16 * 1024 * 1024):
+        self.timeout = timeout_sec
+        self.max_bytes = int(max_bytes)
+        self.max_frame_bytes = int(max_frame_bytes)
+        self._frames = OrderedDict()  # (addr, frame_id) -> 在途帧，按首块到达顺序
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._swept_at = 0.0
+        self.stats = {
+            "fragments": 0,
+            "completed": 0,
+            "expired": 0,
+            "evicted": 0,
+            "crc_errors": 0,
+            "malformed": 0,
+            "duplicates": 0,
+            "oversize": 0,
+        }
+
+    def inflight(self):
+        """
+        :return: (在途帧数, 在途字节数)，顺带清理超时的帧
+        """
+        with self._lock:
+            self._sweep(time.monotonic())
+            return len(self._frames), self._bytes
+
+    def feed(self, data, addr=None):
+        """
+        接收一个分片
+
+        :return: 帧全部到齐时返回重组后的数据包字节，否则返回 None
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.stats["fragments"] += 1
+            if now - self._swept_at >= min(0.5, self.timeout):
+                self._sweep(now)
+            if len(data) < HEADER.size:
+                self.stats["malformed"] += 1
+                return None
+            magic, version, _flags, fid, index, count, total, crc = HEADER.unpack_from(data)
+            if magic != MAGIC or version != VERSION or count == 0 or index >= count:
+                self.stats["malformed"] += 1
+                return None
+            chunk = data[HEADER.size:]
+            if zlib.crc32(chunk) & 0xFFFFFFFF != crc:
+                self.stats["crc_errors"] += 1
+                return None
+            if total > self.max_frame_bytes:
+                self.stats["oversize"] += 1
+                return None
+            key = (addr, fid)
+            entry = self._frames.get(key)
+            if entry is None or entry["count"] != count or entry["total"] != total:
+                if entry is not None:
+                    # 同一 frame_id 的参数变化（发送端重启后序号回绕），旧帧作废
+                    self._drop(key)
+                    self.stats["malformed"] += 1
+                if not self._reserve(total):
+                    self.stats["evicted"] += 1
+                    return None
+                entry = {"count": count, "total": total, "chunks": [None] * count, "got": 0, "at": now}
+                self._frames[key] = entry
+            if entry["chunks"][index] is not None:
+                self.stats["duplicates"] += 1
+                return None
+            entry["chunks"][index] = chunk
+            entry["got"] += 1
+            if entry["got"] < count:
+                return None
+            self._drop(key)
+            payload = b"".join(entry["chunks"])
+            if len(payload) != total:
+                self.stats["malformed"] += 1
+                return None
+            self.stats["completed"] += 1
+            return payload
+
+    # ---------- 内部实现（调用方持有 _lock） ----------
+
+    def _reserve(self, total):
+        """
+        为新帧预留 total 字节，超出上限时按到达顺序淘汰最旧的在途帧
+        """
+        if total > self.max_bytes:
+            return False
+        while self._frames and self._bytes + total > self.max_bytes:
+            key = next(iter(self._frames))
+            self._drop(key)
+            self.stats["evicted"] += 1
+        self._bytes += total
+        return True
+
+    def _drop(self, key):
+        entry = self._frames.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry["total"]
+
+    def _sweep(self, now):
+        self._swept_at = now
+        while self._frames:
+            key, entry = next(iter(self._frames.items()))
+            if now - entry["at"] < self.timeout:
+                break
+            self._drop(key)
+            self.stats["expired"] += 1
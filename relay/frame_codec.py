@@ -0,0 +1,220 @@
+# relay/frame_codec.py
+#
+# 帧解码（中转与 Flask /api/ingest 共用）：
+# - 将 frame{width,height,pixels} 中的 [[{"r","g","b"}, ...], ...] 一次性展开为连续的 uint8 数组
+# - CRC32 直接在该连续缓冲上计算，与C端按 r,g,b 逐像素拼接的字节序一致
+# - 支持紧凑编码 frame{encoding,width,height,data}：
+#     rgb24-base64  data 为 base64(r,g,b 逐像素原始字节)，零拷贝映射为 numpy 数组
+#     jpeg-base64   data 为 base64(JPEG 文件字节)，可原样落盘
+#     png-base64    data 为 base64(PNG 文件字节)，可原样落盘
+#   checksum_frame 对应 base64 解码后的原始字节
+# - 二进制请求体中的原始帧字节（rgb24 / jpeg / png，不经 base64）：decode_raw 先在接收缓冲上校验 CRC32，
+#   通过后才映射为数组或交给落盘，校验失败的帧不做任何解码
+
+import base64
+import binascii
+import zlib
+from collections import namedtuple
+from itertools import chain
+from operator import itemgetter
+
+import numpy as np
+
+_RGB = itemgetter("r", "g", "b")
+
+
+class FrameError(ValueError):
+    """
+    帧结构不合法（尺寸、行数或行长度不符）
+    """
+
+
+class ChecksumError(FrameError):
+    """
+    帧 CRC32 与发送方的 checksum_frame 不符
+    """
+
+    def __init__(self, calc, sent):
+        super().__init__("checksum mismatch")
+        self.calc = calc
+        self.sent = sent
+
+
+ENCODED_EXT = {"jpeg-base64": ".jpg", "png-base64": ".png"}
+ENCODINGS = ("pixels", "rgb24-base64") + tuple(ENCODED_EXT)
+# 原始字节编码 -> 扩展名（rgb24 需按存储配置编码，无固定扩展名）
+RAW_EXT = {"rgb24": None, "jpeg": ".jpg", "png": ".png"}
+
+# rgb: (h,w,3) RGB uint8 数组，压缩编码时为 None（按需 decode_to_bgr）
+# encoded: 压缩编码的原始文件字节，可直接写盘；ext: 对应扩展名
+DecodedFrame = namedtuple("DecodedFrame", "encoding width height rgb encoded ext crc")
+
+
+def frame_size(frame):
+    """
+    读取并校验帧尺寸
+
+    :return: (width, height, pixels)，非法时抛出 FrameError
+    """
+    w = int(frame.get("width", 0))
+    h = int(frame.get("height", 0))
+    pixels = frame.get("pixels")
+    if w <= 0 or h <= 0 or not isinstance(pixels, list):
+        raise FrameError("frame invalid")
+    return w, h, pixels
+
+
+def _pixels_to_array_slow(pixels, w, h):
+    """
+    逐像素转换（兼容字符串等非数值分量），仅在快速路径失败时使用
+    """
+    arr = np.zeros((h, w, 3), dtype=np.uint8)
+    for y in range(h):
+        row = pixels[y]
+        for x in range(w):
+            p = row[x]
+            arr[y, x, 0] = int(p.get("r", 0)) & 0xFF
+            arr[y, x, 1] = int(p.get("g", 0)) & 0xFF
+            arr[y, x, 2] = int(p.get("b", 0)) & 0xFF
+    return arr
+
+
+def pixels_to_array(frame, strict=False):
+    """
+    将像素矩阵转换为 (height, width, 3) 的 RGB uint8 连续数组
+
+    :param frame: 包含 width/height/pixels 的字典
+    :param strict: 为 True 时要求每行都是长度恰为 width 的列表
+    :return: numpy 数组（RGB 顺序）
+    """
+    w, h, pixels = frame_size(frame)
+    if len(pixels) < h:
+        raise FrameError("frame rows missing")
+    rows = pixels[:h]
+    if strict:
+        for row in rows:
+            if not isinstance(row, list) or len(row) != w:
+                raise FrameError("frame row invalid")
+    count = w * h * 3
+    cells = chain.from_iterable(row[:w] for row in rows)
+    try:
+        # 单次展开为 r,g,b 交错的整数流，由 numpy 在 C 层直接填充目标缓冲；
+        # itemgetter + map 避免每个像素进入 Python 字节码
+        flat = np.fromiter(chain.from_iterable(map(_RGB, cells)), dtype=np.int64, count=count)
+    except KeyError:
+        # 分量缺省（按 0 处理）时退回 dict.get 展开
+        try:
+            flat = np.fromiter(
+                chain.from_iterable(
+                    (p.get("r", 0), p.get("g", 0), p.get("b", 0))
+                    for row in rows for p in row[:w]
+                ),
+                dtype=np.int64,
+                count=count,
+            )
+        except (TypeError, ValueError, AttributeError, OverflowError):
+            return _pixels_to_array_slow(pixels, w, h)
+    except (TypeError, ValueError, AttributeError, OverflowError):
+        return _pixels_to_array_slow(pixels, w, h)
+    return (flat & 0xFF).astype(np.uint8).reshape(h, w, 3)
+
+
+def frame_crc32(buf):
+    """
+    计算连续缓冲（numpy 数组或 bytes）的 CRC32
+
+    :return: 8位小写十六进制字符串
+    """
+    if isinstance(buf, np.ndarray):
+        buf = np.ascontiguousarray(buf)
+    return f"{zlib.crc32(buf) & 0xFFFFFFFF:08x}"
+
+
+def _b64(frame):
+    data = frame.get("data")
+    if not isinstance(data, (str, bytes)) or not data:
+        raise FrameError("frame data missing")
+    try:
+        return base64.b64decode(data, validate=True)
+    except (binascii.Error, ValueError):
+        raise FrameError("frame data invalid")
+
+
+def decode_frame(frame, strict=False):
+    """
+    按 frame.encoding 解码帧（缺省为 pixels 像素矩阵）
+
+    :param frame: 帧字典
+    :param strict: 透传给 pixels_to_array 的行校验开关
+    :return: DecodedFrame，crc 为原始字节上的 CRC32 十六进制串
+    """
+    if not isinstance(frame, dict):
+        raise FrameError("frame invalid")
+    encoding = str(frame.get("encoding") or "pixels").lower()
+    if encoding == "pixels":
+        arr = pixels_to_array(frame, strict=strict)
+        h, w = arr.shape[:2]
+        return DecodedFrame(encoding, w, h, arr, None, None, frame_crc32(arr))
+    if encoding == "rgb24-base64":
+        w = int(frame.get("width", 0))
+        h = int(frame.get("height", 0))
+        if w <= 0 or h <= 0:
+            raise FrameError("frame invalid")
+        raw = _b64(frame)
+        if len(raw) != w * h * 3:
+            raise FrameError("frame size mismatch")
+        # frombuffer 直接引用解码后的 bytes，不再逐像素复制
+        arr = np.frombuffer(raw, dtype=np.uint8).reshape(h, w, 3)
+        return DecodedFrame(encoding, w, h, arr, None, None, frame_crc32(raw))
+    if encoding in ENCODED_EXT:
+        raw = _b64(frame)
+        w = int(frame.get("width", 0) or 0)
+        h = int(frame.get("height", 0) or 0)
+        return DecodedFrame(encoding, w, h, None, raw, ENCODED_EXT[encoding], frame_crc32(raw))
+    raise FrameError("frame encoding unsupported")
+
+
+def decode_to_bgr(decoded):
+    """
+    获取 BGR 顺序的 numpy 图像（压缩编码时才真正解码）
+    """
+    import cv2
+    if decoded.rgb is not None:
+        return cv2.cvtColor(decoded.rgb, cv2.COLOR_RGB2BGR)
+    img = cv2.imdecode(np.frombuffer(decoded.encoded, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise FrameError("frame decode failed")
+    return img
+
+
+def decode_raw(buf, encoding, width=0, height=0, checksum=None):
+    """
+    解码二进制请求体中的原始帧字节
+
+    :param buf: bytes 或 memoryview（不复制，rgb24 直接映射为数组）
+    :param encoding: rgb24 | jpeg | png，也接受对应的 *-base64 写法
+    :param width: 宽度，rgb24 必填
+    :param height: 高度，rgb24 必填
+    :param checksum: 发送方的 checksum_frame（8位十六进制），为空时不校验
+    :return: DecodedFrame；CRC 不符时抛出 ChecksumError
+    """
+    encoding = str(encoding or "rgb24").lower()
+    if encoding.endswith("-base64"):
+        encoding = encoding[:-len("-base64")]
+    if encoding not in RAW_EXT:
+        raise FrameError("frame encoding unsupported")
+    if not len(buf):
+        raise FrameError("frame data missing")
+    w = int(width or 0)
+    h = int(height or 0)
+    if encoding == "rgb24" and (w <= 0 or h <= 0 or len(buf) != w * h * 3):
+        raise FrameError("frame size mismatch")
+    # 在接收缓冲上先校验，未通过的帧不做映射与解码
+    crc = frame_crc32(buf)
+    sent = str(checksum or "").lower()
+    if sent and sent != crc:
+        raise ChecksumError(crc, sent)
+    if encoding == "rgb24":
+        arr = np.frombuffer(buf, dtype=np.uint8).reshape(h, w, 3)
+        return DecodedFrame("rgb24", w, h, arr, None, None, crc)
+    return DecodedFrame(encoding, w, h, None, buf, RAW_EXT[encoding], crc)
@@ -0,0 +1,257 @@
+# relay/image_index.py
+#
+# 图片目录内存索引（中转与 Flask 各持一份）：
+# - 启动时扫描一次目录，之后由 inotify（Linux，经 ctypes 调用 libc，无额外依赖）跟踪创建/删除/改名
+# - 本进程的写入方与删除器直接登记（add/discard），不依赖事件到达的先后
+# - inotify 不可用或事件队列溢出时退回定期全量扫描
+# - contains() 为纯内存查询；verify=True 时未命中再 stat 一次（覆盖外部进程刚写入、事件尚未到达的情形）
+# 落盘池的临时文件（*.tmp）不进入索引。
+
+import ctypes
+import os
+import select
+import struct
+import threading
+import time
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+_WATCH_MASK = IN_CREATE | IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE | IN_DELETE_SELF
+_EVENT = struct.Struct("iIII")
+
+
+def _inotify_open(path):
+    """
+    打开 inotify 并监视目录，不支持时返回 None
+    """
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            return None
+        if libc.inotify_add_watch(fd, os.fsencode(path), _WATCH_MASK) < 0:
+            os.close(fd)
+            return None
+        return fd
+    except Exception:
+        return None
+
+
+class ImageIndex:
+    """
+    图片目录索引（线程安全）
+
+    :param images_dir: 图片目录
+    :param rescan_sec: 无 inotify 时的全量扫描间隔（秒）
+    :param use_inotify: 是否尝试使用 inotify
+    """
+
+    def __init__(self, images_dir, rescan_sec=30.0, use_inotify=True):
+        self.images_dir = images_dir
+        self.rescan_sec = max(1.0, float(rescan_sec))
+        self.use_inotify = use_inotify
+        self._names = {}  # 文件名 -> 修改时间
+        self._latest = None  # 最新图片文件名，删除后惰性重算
+        self._lock = threading.Lock()
+        self._fd = None
+        self._stopping = threading.Event()
+        self._thread = None
+        self.stats = {"hits": 0, "misses": 0, "verified": 0, "events": 0, "rescans": 0}
+
+    @property
+    def watching(self):
+        return self._fd is not None
+
+    @staticmethod
+    def _name(image_path):
+        try:
+            return os.path.basename(str(image_path or ""))
+        except Exception:
+            return ""
+
+    # ---------- 查询 ----------
+
+    def contains(self, image_path, verify=None):
+        """
+        图片是否存在
+
+        :param image_path: 文件名或 /static/images/xxx 路径
+        :param verify: 未命中时是否 stat 确认；为 None 时仅在没有 inotify 时确认
+        """
+        name = self._name(image_path)
+        if not name:
+            return False
+        with self._lock:
+            hit = name in self._names
+            self.stats["hits" if hit else "misses"] += 1
+        if hit:
+            return True
+        if verify is None:
+            verify = not self.watching
+        if not verify:
+            return False
+        try:
+            mtime = os.stat(os.path.join(self.images_dir, name)).st_mtime
+        except OSError:
+            return False
+        self.add(name, mtime)
+        with self._lock:
+            self.stats["verified"] += 1
+        return True
+
+    def latest(self):
+        """
+        最新图片的 /static/images/ 路径，目录为空时返回 None
+        """
+        with self._lock:
+            if self._latest is None and self._names:
+                self._latest = max(self._names, key=self._names.get)
+            name = self._latest
+        return f"/static/images/{name}" if name else None
+
+    def size(self):
+        with self._lock:
+            return len(self._names)
+
+    # ---------- 登记 ----------
+
+    def add(self, image_path, mtime=None):
+        name = self._name(image_path)
+        if not name or name.endswith(".tmp") or name.startswith("."):
+            return
+        mtime = time.time() if mtime is None else mtime
+        with self._lock:
+            self._names[name] = mtime
+            if self._latest is not None and mtime >= self._names.get(self._latest, 0):
+                self._latest = name
+
+    def discard(self, image_path):
+        name = self._name(image_path)
+        with self._lock:
+            self._names.pop(name, None)
+            if self._latest == name:
+                self._latest = None
+
+    def rescan(self):
+        """
+        全量扫描目录，替换索引内容
+        """
+        names = {}
+        try:
+            with os.scandir(self.images_dir) as it:
+                for e in it:
+                    if e.name.endswith(".tmp") or e.name.startswith("."):
+                        continue
+                    try:
+                        if e.is_file():
+                            names[e.name] = e.stat().st_mtime
+                    except OSError:
+                        continue
+        except OSError as e:
+            print(f"[INDEX] 扫描图片目录失败: {e}")
+            return
+        with self._lock:
+            self._names = names
+            self._latest = None
+            self.stats["rescans"] += 1
+
+    # ---------- 生命周期 ----------
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        if self.use_inotify:
+            self._fd = _inotify_open(self.images_dir)
+        # 先建立监视再扫描，扫描期间发生的变更由事件补上
+        self.rescan()
+        self._thread = threading.Thread(target=self._run, name="image-index", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._fd is not None:
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+            self._fd = None
+
+    def snapshot(self):
+        with self._lock:
+            out = dict(self.stats)
+            out["size"] = len(self._names)
+        out["inotify"] = self.watching
+        return out
+
+    # ---------- 后台线程 ----------
+
+    def _run(self):
+        while not self._stopping.is_set():
+            if self._fd is None:
+                self._stopping.wait(self.rescan_sec)
+                if not self._stopping.is_set():
+                    self.rescan()
+                continue
+            try:
+                ready, _, _ = select.select([self._fd], [], [], 1.0)
+                if not ready:
+                    continue
+                buf = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            except OSError as e:
+                print(f"[INDEX] inotify 读取失败，改为定期扫描: {e}")
+                try:
+                    os.close(self._fd)
+                except OSError:
+                    pass
+                self._fd = None
+                continue
+            self._apply(buf)
+
+    def _apply(self, buf):
+        off = 0
+        n = 0
+        overflow = False
+        gone = False
+        while off + _EVENT.size <= len(buf):
+            _wd, mask, _cookie, length = _EVENT.unpack_from(buf, off)
+            raw = buf[off + _EVENT.size:off + _EVENT.size + length]
+            off += _EVENT.size + length
+            n += 1
+            if mask & IN_DELETE_SELF:
+                gone = True
+                continue
+            if mask & IN_Q_OVERFLOW:
+                overflow = True
+                continue
+            if mask & IN_ISDIR or not length:
+                continue
+            name = os.fsdecode(raw.rstrip(b"\0"))
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                self.discard(name)
+            else:
+                self.add(name)
+        with self._lock:
+            self.stats["events"] += n
+        if gone:
+            # 目录被删除：监视已失效，改为定期扫描
+            print("[INDEX] 图片目录被删除，改为定期扫描")
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+            self._fd = None
+        if overflow or gone:
+            # 事件丢失：全量扫描对齐
+            self.rescan()
@@ -0,0 +1,117 @@
+# relay/image_pool.py
+#
+# 图像落盘池：
+# - 处理线程只解码帧并预留文件路径，颜色转换、缩放与 PNG/JPEG 压缩交给线程池或进程池
+# - 在途任务数有上限（queue_max），满时不等待，直接放弃该帧并计数，处理线程不会阻塞在压缩上
+# - 文件先写入同目录临时文件再 os.replace，读取方不会看到写了一半的图片
+# 线程模式依赖 OpenCV 在 cvtColor/resize/imencode 中释放 GIL；进程模式适合多核且帧较大的场景，
+# 像素数组经 pickle 传给子进程。
+
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import cv2
+
+from image_profiles import encode_bgr
+
+
+def _replace_into(fp, data):
+    # 临时文件名带进程与线程标识：同一毫秒预留的同名路径并发写入时互不干扰
+    tmp = f"{fp}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, fp)
+    return len(data)
+
+
+def write_bytes(fp, data):
+    """
+    原样写入已编码的文件字节（JPEG/PNG 帧）
+    """
+    return _replace_into(fp, data)
+
+
+def encode_rgb(fp, rgb, profile):
+    """
+    RGB 数组 → BGR，按存储配置（image_profiles）缩放、编码并写入
+
+    :return: 写入的字节数
+    """
+    bgr = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+    return _replace_into(fp, encode_bgr(bgr, profile))
+
+
+class ImagePool:
+    """
+    有界的图像落盘池
+
+    :param workers: 工作线程/进程数
+    :param queue_max: 在途（排队 + 执行中）任务上限
+    :param mode: "thread" 或 "process"
+    """
+
+    def __init__(self, workers=2, queue_max=64, mode="thread"):
+        self.workers = max(1, int(workers))
+        self.queue_max = max(1, int(queue_max))
+        self.mode = "process" if mode == "process" else "thread"
+        self._slots = threading.BoundedSemaphore(self.queue_max)
+        self._executor = None
+        self._lock = threading.Lock()
+        self.stats = {"submitted": 0, "written": 0, "bytes": 0, "rejected": 0, "errors": 0}
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def depth(self):
+        with self._lock:
+            return self.stats["submitted"] - self.stats["written"] - self.stats["errors"]
+
+    def start(self):
+        if self._executor is None:
+            if self.mode == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="image-pool")
+        return self
+
+    def submit(self, fn, fp, *args):
+        """
+        提交一个落盘任务（非阻塞）
+
+        :param fn: write_bytes 或 encode_rgb（进程模式下须为模块级函数）
+        :param fp: 预留的目标文件路径
+        :return: 是否已接受；为 False 时调用方应放弃该图片
+        """
+        if self._executor is None or not self._slots.acquire(blocking=False):
+            self._count("rejected")
+            return False
+        try:
+            fut = self._executor.submit(fn, fp, *args)
+        except Exception:
+            self._slots.release()
+            self._count("rejected")
+            return False
+        self._count("submitted")
+        fut.add_done_callback(lambda f, fp=fp: self._done(f, fp))
+        return True
+
+    def _done(self, fut, fp):
+        self._slots.release()
+        try:
+            n = fut.result()
+            with self._lock:
+                self.stats["written"] += 1
+                self.stats["bytes"] += int(n or 0)
+        except Exception as e:
+            self._count("errors")
+            print(f"[IMAGE] 图片写入失败 {os.path.basename(fp)}: {e}")
+
+    def stop(self):
+        """
+        等待在途任务写完后关闭
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
@@ -0,0 +1,121 @@
+# relay/image_profiles.py
+#
+# 图像存储配置（中转与 Flask 共用）：
+# 具名配置决定落盘格式、压缩参数与写入时缩放倍数，在 relay/config.json 的 image_storage 中选择：
+#   "image_storage": {
+#     "default": "raw-png",                     # 缺省配置
+#     "devices": {"c-image-1": "jpeg-q80"},     # 按 device_id 覆盖
+#     "profiles": {"my-webp": {"format": "webp", "quality": 60}}   # 自定义或覆盖内置配置
+#   }
+# 写入时默认不再放大，低分辨率帧的放大改在读取时由 Flask 的 /api/image/<文件名>?scale=N 完成。
+# 设备已压缩好的 JPEG/PNG 帧仍原样落盘，不受配置影响。
+
+import cv2
+import numpy as np
+
+EXT = {"png": ".png", "jpeg": ".jpg", "webp": ".webp"}
+
+BUILTIN_PROFILES = {
+    "raw-png": {"format": "png", "compression": 1},
+    "png": {"format": "png", "compression": 3},
+    "png-x10": {"format": "png", "compression": 3, "scale": 10},  # 旧版中转行为（写入时 10 倍最近邻放大）
+    "jpeg-q80": {"format": "jpeg", "quality": 80},
+    "jpeg-q95": {"format": "jpeg", "quality": 95},
+    "webp": {"format": "webp", "quality": 80},
+}
+DEFAULT_PROFILE = "raw-png"
+
+
+def normalize(profile):
+    """
+    补全配置字段：format / ext / scale / 压缩参数
+    """
+    fmt = str(profile.get("format", "png")).lower()
+    if fmt == "jpg":
+        fmt = "jpeg"
+    if fmt not in EXT:
+        fmt = "png"
+    out = dict(profile, format=fmt, ext=EXT[fmt])
+    out["scale"] = max(1, int(profile.get("scale", 1) or 1))
+    return out
+
+
+def resolve(storage, device_id=None, fallback=None):
+    """
+    按设备选择存储配置
+
+    :param storage: config.json 中的 image_storage 字典（可为 None）
+    :param device_id: 设备标识，命中 devices 时优先
+    :param fallback: 调用方的缺省配置名（如摄像头抓拍用 jpeg-q95），优先于 default
+    :return: (配置名, 规范化后的配置字典)
+    """
+    storage = storage or {}
+    profiles = dict(BUILTIN_PROFILES)
+    profiles.update(storage.get("profiles") or {})
+    name = None
+    if device_id is not None:
+        name = (storage.get("devices") or {}).get(str(device_id))
+    name = name or fallback or storage.get("default") or DEFAULT_PROFILE
+    if name not in profiles:
+        print(f"[IMAGE] 未知存储配置 {name}，使用 {DEFAULT_PROFILE}")
+        name = DEFAULT_PROFILE
+    return name, normalize(profiles[name])
+
+
+def imwrite_params(profile):
+    """
+    转换为 cv2.imwrite / cv2.imencode 的参数列表
+    """
+    fmt = profile.get("format")
+    if fmt == "jpeg":
+        return [cv2.IMWRITE_JPEG_QUALITY, int(profile.get("quality", 90))]
+    if fmt == "webp":
+        return [cv2.IMWRITE_WEBP_QUALITY, int(profile.get("quality", 80))]
+    return [cv2.IMWRITE_PNG_COMPRESSION, int(profile.get("compression", 3))]
+
+
+def encode_bgr(bgr, profile):
+    """
+    按配置缩放并编码 BGR 图像
+
+    :return: 编码后的文件字节
+    """
+    scale = profile.get("scale", 1)
+    if scale > 1:
+        h, w = bgr.shape[:2]
+        bgr = cv2.resize(bgr, (w * scale, h * scale), interpolation=cv2.INTER_NEAREST)
+    ok, buf = cv2.imencode(profile.get("ext", ".png"), bgr, imwrite_params(profile))
+    if not ok:
+        raise ValueError("image encode failed")
+    return buf.tobytes()
+
+
+def scale_encoded(data, ext, scale=1, width=None, max_pixels=4096 * 4096):
+    """
+    读取时缩放：解码已存储的图片，按倍数或目标宽度最近邻放大后以原格式重新编码
+
+    :param data: 图片文件字节
+    :param ext: 图片扩展名（决定输出格式）
+    :param scale: 放大倍数
+    :param width: 目标宽度（优先于 scale），高度按比例
+    :return: 编码后的字节（尺寸不变时返回原字节）
+    """
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+    if img is None:
+        raise ValueError("image decode failed")
+    h, w = img.shape[:2]
+    if width:
+        nw = int(width)
+        nh = max(1, round(h * nw / w))
+    else:
+        nw, nh = w * int(scale), h * int(scale)
+    if nw <= 0 or nh <= 0 or nw * nh > max_pixels:
+        raise ValueError("scale out of range")
+    if (nw, nh) == (w, h):
+        return data
+    interp = cv2.INTER_NEAREST if nw >= w else cv2.INTER_AREA
+    img = cv2.resize(img, (nw, nh), interpolation=interp)
+    ok, buf = cv2.imencode(ext, img)
+    if not ok:
+        raise ValueError("image encode failed")
+    return buf.tobytes()
@@ -0,0 +1,184 @@
+# relay/image_reaper.py
+#
+# 图片过期删除器：
+# - 单个后台线程维护 (到期时间, 文件名) 最小堆，替代“每张图片一个 sleep 线程”
+# - 待删列表定期以快照形式持久化（tmp + os.replace），重启后继续按原到期时间删除，
+#   重启期间已过期的文件在启动时立即删除
+# - on_backlog 回调在待删数量变化时调用，便于接入监控
+# - on_remove 回调在文件删除（或已不存在）后调用，供图片目录索引同步
+
+import heapq
+import json
+import os
+import threading
+import time
+
+
+class ImageReaper:
+    """
+    基于最小堆的图片定时删除
+
+    :param images_dir: 图片目录，只删除该目录下的文件
+    :param ttl_sec: 默认生存时间（秒）
+    :param state_path: 待删列表快照路径，为 None 时不持久化
+    :param persist_sec: 快照最短写入间隔（秒）
+    :param on_backlog: on_backlog(n)，待删数量变化时回调
+    :param on_remove: on_remove(文件名)，文件删除后回调
+    """
+
+    def __init__(self, images_dir, ttl_sec, state_path=None, persist_sec=5.0, on_backlog=None, on_remove=None):
+        self.images_dir = images_dir
+        self.ttl_sec = ttl_sec
+        self.state_path = state_path
+        self.persist_sec = persist_sec
+        self.on_backlog = on_backlog
+        self.on_remove = on_remove
+        self._heap = []
+        self._due = {}  # 文件名 -> 当前有效的到期时间（堆中旧条目惰性跳过）
+        self._cond = threading.Condition()
+        self._dirty = False
+        self._saved_at = 0.0
+        self._stopping = False
+        self._thread = None
+        self.stats = {"scheduled": 0, "deleted": 0, "missing": 0}
+
+    def backlog(self):
+        with self._cond:
+            return len(self._due)
+
+    def schedule(self, image_path, ttl_sec=None):
+        """
+        登记图片在 ttl 秒后删除；同名文件重复登记以最后一次为准
+
+        :param image_path: 图片路径（如 /static/images/xxx.png），仅取文件名
+        """
+        try:
+            name = os.path.basename(str(image_path or ""))
+        except Exception:
+            return
+        if not name:
+            return
+        due = time.time() + (self.ttl_sec if ttl_sec is None else ttl_sec)
+        with self._cond:
+            self._due[name] = due
+            heapq.heappush(self._heap, (due, name))
+            self._dirty = True
+            self.stats["scheduled"] += 1
+            # 新条目成为堆顶时唤醒线程重新计算等待时间
+            if self._heap[0][1] == name:
+                self._cond.notify()
+            n = len(self._due)
+        self._report(n)
+
+    # ---------- 生命周期 ----------
+
+    def start(self):
+        self._load()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="image-reaper", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._save(force=True)
+
+    # ---------- 内部实现 ----------
+
+    def _report(self, n):
+        if self.on_backlog is not None:
+            try:
+                self.on_backlog(n)
+            except Exception:
+                pass
+
+    def _run(self):
+        while True:
+            expired = []
+            with self._cond:
+                while not self._stopping:
+                    now = time.time()
+                    while self._heap and self._heap[0][0] <= now:
+                        due, name = heapq.heappop(self._heap)
+                        if self._due.get(name) == due:
+                            del self._due[name]
+                            expired.append(name)
+                    if expired:
+                        break
+                    timeout = None
+                    if self._dirty:
+                        # 有未保存的变更：到达快照间隔时退出等待去写快照
+                        timeout = self._saved_at + self.persist_sec - now
+                        if timeout <= 0:
+                            break
+                    if self._heap:
+                        wait = self._heap[0][0] - now
+                        timeout = wait if timeout is None else min(timeout, wait)
+                    self._cond.wait(timeout)
+                if expired:
+                    self._dirty = True
+                stopping = self._stopping
+                n = len(self._due)
+            for name in expired:
+                self._remove(name)
+            if expired:
+                self._report(n)
+            self._save()
+            if stopping:
+                return
+
+    def _remove(self, name):
+        try:
+            os.remove(os.path.join(self.images_dir, name))
+            self.stats["deleted"] += 1
+        except FileNotFoundError:
+            self.stats["missing"] += 1
+        except Exception:
+            return
+        if self.on_remove is not None:
+            try:
+                self.on_remove(name)
+            except Exception:
+                pass
+
+    def _save(self, force=False):
+        if not self.state_path:
+            return
+        now = time.time()
+        with self._cond:
+            if not self._dirty or (not force and now - self._saved_at < self.persist_sec):
+                return
+            snapshot = sorted((due, name) for name, due in self._due.items())
+            self._dirty = False
+            self._saved_at = now
+        try:
+            tmp = self.state_path + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f)
+            os.replace(tmp, self.state_path)
+        except Exception as e:
+            print(f"[REAPER] 待删列表保存失败: {e}")
+
+    def _load(self):
+        if not self.state_path or not os.path.isfile(self.state_path):
+            return
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                items = json.load(f)
+        except Exception as e:
+            print(f"[REAPER] 待删列表读取失败: {e}")
+            return
+        with self._cond:
+            for due, name in items if isinstance(items, list) else []:
+                name = os.path.basename(str(name))
+                if name and name not in self._due:
+                    self._due[name] = float(due)
+                    heapq.heappush(self._heap, (float(due), name))
+            n = len(self._due)
+        print(f"[REAPER] 恢复待删图片 {n} 张")
+        self._report(n)
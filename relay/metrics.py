@@ -0,0 +1,224 @@
+# relay/metrics.py
+#
+# 中转运行指标：
+# - 计数器（接收、解析、valid_keys 过滤、分表入库、通知失败等）与延迟直方图（解析、落图、入库、通知）
+# - 内核 UDP 丢包：读取 /proc/net/udp(6) 中本端口、且属于本进程（按 /proc/self/fd 的套接字 inode 匹配）
+#   的套接字的 drops 与接收队列长度；多进程 SO_REUSEPORT 时各进程只导出自己的套接字，跨进程求和不重复计数
+# - 输出为 Prometheus 文本格式：可由本地 HTTP 端点（/metrics，/metrics.json）提供，
+#   也可周期写出到文件（node_exporter textfile 方式）
+# 组件自带的 stats 字典通过 add_collector 注册的回调在导出时读取，不重复计数
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 直方图桶上界（秒），覆盖 0.1 ms ~ 5 s
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histogram:
+    """
+    固定桶的累积直方图（Prometheus 语义）
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个为 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        cum, out = 0, []
+        for le, n in zip(self.buckets + (float("inf"),), self.counts):
+            cum += n
+            out.append((le, cum))
+        return {"buckets": out, "sum": self.sum, "count": self.count}
+
+
+class Metrics:
+    """
+    进程内指标注册表
+
+    :param prefix: 指标名前缀
+    :param labels: 附加到每个指标上的常量标签（如 {"worker": "0"}）
+    """
+
+    def __init__(self, prefix="relay", labels=None):
+        self.prefix = prefix
+        self.labels = dict(labels or {})
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = []
+
+    # ---------- 记录接口 ----------
+
+    def inc(self, name, n=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def observe(self, name, seconds):
+        with self._lock:
+            hist = self._histograms.get(name)
+            if hist is None:
+                hist = self._histograms[name] = Histogram()
+            hist.observe(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        """
+        统计代码块耗时：with METRICS.timer("parse"): ...
+        """
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0)
+
+    def add_collector(self, fn):
+        """
+        注册导出时调用的回调，fn() 返回 {指标名: 数值}，作为 gauge 输出
+        """
+        self._collectors.append(fn)
+
+    # ---------- 导出 ----------
+
+    def _gauges(self):
+        out = {}
+        for fn in self._collectors:
+            try:
+                out.update(fn() or {})
+            except Exception:
+                pass
+        return out
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self._counters)
+            hists = {k: h.snapshot() for k, h in self._histograms.items()}
+        return {"counters": counters, "histograms": hists, "gauges": self._gauges()}
+
+    def render_prometheus(self):
+        snap = self.snapshot()
+        base = ",".join(f'{k}="{v}"' for k, v in self.labels.items())
+
+        def lbl(extra=""):
+            parts = [p for p in (base, extra) if p]
+            return "{" + ",".join(parts) + "}" if parts else ""
+
+        lines = []
+        for name, value in sorted(snap["counters"].items()):
+            metric = f"{self.prefix}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{lbl()} {value}")
+        for name, value in sorted(snap["gauges"].items()):
+            metric = f"{self.prefix}_{name}"
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric}{lbl()} {value}")
+        for name, h in sorted(snap["histograms"].items()):
+            metric = f"{self.prefix}_{name}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            for le, cum in h["buckets"]:
+                le_label = 'le="%s"' % ("+Inf" if le == float("inf") else repr(le))
+                lines.append(f"{metric}_bucket{lbl(le_label)} {cum}")
+            lines.append(f"{metric}_sum{lbl()} {h['sum']:.6f}")
+            lines.append(f"{metric}_count{lbl()} {h['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write_file(self, path):
+        """
+        原子写出 Prometheus 文本（tmp + os.replace）
+        """
+        try:
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(self.render_prometheus())
+            os.replace(tmp, path)
+        except Exception:
+            pass
+
+    # ---------- HTTP 端点 ----------
+
+    def serve(self, host, port):
+        """
+        在后台线程提供 GET /metrics（Prometheus 文本）与 /metrics.json
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith("/metrics.json"):
+                    body = json.dumps(metrics.snapshot(), ensure_ascii=False).encode("utf-8")
+                    ctype = "application/json"
+                elif self.path.startswith("/metrics"):
+                    body = metrics.render_prometheus().encode("utf-8")
+                    ctype = "text/plain; version=0.0.4"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, fmt, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        return server
+
+
+def own_socket_inodes():
+    """
+    本进程打开的套接字 inode 集合（读取 /proc/self/fd 的 socket:[inode] 链接）
+    """
+    inodes = set()
+    try:
+        names = os.listdir("/proc/self/fd")
+    except OSError:
+        return inodes
+    for name in names:
+        try:
+            target = os.readlink(os.path.join("/proc/self/fd", name))
+        except OSError:
+            continue
+        if target.startswith("socket:["):
+            inodes.add(target[8:-1])
+    return inodes
+
+
+def udp_socket_stats(port):
+    """
+    从 /proc/net/udp 与 /proc/net/udp6 读取本进程绑定在 port 上的套接字统计
+
+    :return: {"udp_kernel_drops": 丢包数, "udp_rx_queue_bytes": 接收队列字节数}（本进程多个套接字求和）
+    """
+    drops = rx_queue = 0
+    inodes = own_socket_inodes()
+    for path in ("/proc/net/udp", "/proc/net/udp6"):
+        try:
+            with open(path, "r") as f:
+                next(f, None)
+                for line in f:
+                    cols = line.split()
+                    if len(cols) < 13:
+                        continue
+                    if int(cols[1].rsplit(":", 1)[1], 16) != port or cols[9] not in inodes:
+                        continue
+                    rx_queue += int(cols[4].split(":")[1], 16)
+                    drops += int(cols[-1])
+        except (OSError, ValueError, IndexError):
+            continue
+    return {"udp_kernel_drops": drops, "udp_rx_queue_bytes": rx_queue}
@@ -0,0 +1,166 @@
+# relay/notifier.py
+#
+# 中转 → 后端通知通道：
+# - 单个后台线程持有到 Flask 的 HTTP/1.1 keep-alive 连接，不再每个数据包新建 TCP 连接
+# - 生产者只做非阻塞入队；后台线程在 linger 窗口内把突发通知合并为一个批量请求：
+#     POST /api/relay_notify  {"batch": [payload, ...]}
+#     POST /api/model_output  {"batch": [{"name":..., "output":...}, ...]}
+# - 后端变慢或不可用只影响通知队列（满则丢弃并计数），不影响接收与入库
+
+import http.client
+import json
+import queue
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+class BackendNotifier:
+    """
+    合并批量发送的后端通知器
+
+    :param notify_url: 传感器通知地址（/api/relay_notify）
+    :param model_url: 模型输出通知地址（/api/model_output）
+    :param queue_max: 通知队列容量
+    :param max_batch: 单个请求最多合并的通知数
+    :param linger_ms: 收到第一条通知后等待更多通知的毫秒数
+    :param timeout: HTTP 超时（秒）
+    :param on_send: on_send(通知数, 耗时秒数, 是否成功)，每个批量请求结束后回调
+    """
+
+    def __init__(self, notify_url, model_url, queue_max=1024, max_batch=100, linger_ms=20, timeout=5, on_send=None):
+        self.notify_url = notify_url
+        self.model_url = model_url
+        self.max_batch = max(1, int(max_batch))
+        self.linger = max(0.0, linger_ms / 1000.0)
+        self.timeout = timeout
+        self._queue = queue.Queue(maxsize=max(1, int(queue_max)))
+        self._conns = {}  # (scheme, host, port) -> HTTPConnection
+        self._stopping = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.on_send = on_send
+        self.stats = {"queued": 0, "sent": 0, "requests": 0, "dropped": 0, "errors": 0, "reconnects": 0}
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def depth(self):
+        return self._queue.qsize()
+
+    # ---------- 生产者接口（非阻塞） ----------
+
+    def submit(self, item):
+        """
+        入队一条通知
+
+        :param item: ("sensor", payload) 或 ("model", (name, output_obj))
+        :return: 是否入队成功
+        """
+        try:
+            self._queue.put_nowait(item)
+            self._count("queued")
+            return True
+        except queue.Full:
+            self._count("dropped")
+            return False
+
+    # ---------- 生命周期 ----------
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="backend-notifier", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        """
+        发送完队列中剩余通知后停止
+        """
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        for conn in self._conns.values():
+            try:
+                conn.close()
+            except Exception:
+                pass
+        self._conns = {}
+
+    # ---------- 后台线程 ----------
+
+    def _collect(self):
+        try:
+            first = self._queue.get(timeout=0.5)
+        except queue.Empty:
+            return []
+        items = [first]
+        deadline = time.monotonic() + self.linger
+        while len(items) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                items.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        while True:
+            items = self._collect()
+            if not items:
+                if self._stopping.is_set():
+                    return
+                continue
+            sensors = [body for kind, body in items if kind != "model"]
+            models = [{"name": body[0], "output": body[1]} for kind, body in items if kind == "model"]
+            if sensors:
+                self._send(self.notify_url, sensors)
+            if models:
+                self._send(self.model_url, models)
+
+    def _send(self, url, batch):
+        t0 = time.perf_counter()
+        ok = self._post(url, batch)
+        if self.on_send is not None:
+            try:
+                self.on_send(len(batch), time.perf_counter() - t0, ok)
+            except Exception:
+                pass
+
+    def _post(self, url, batch):
+        body = json.dumps({"batch": batch}, ensure_ascii=False).encode("utf-8")
+        parts = urlsplit(url)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        key = (parts.scheme, parts.hostname, parts.port)
+        # 服务端可能已关闭空闲连接：失败后重建连接重试一次
+        for attempt in range(2):
+            conn = self._conns.get(key)
+            if conn is None:
+                cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+                conn = cls(parts.hostname, parts.port, timeout=self.timeout)
+                self._conns[key] = conn
+            try:
+                conn.request("POST", path, body=body,
+                             headers={"Content-Type": "application/json", "Connection": "keep-alive"})
+                resp = conn.getresponse()
+                resp.read()
+                self._count("requests")
+                if 200 <= resp.status < 300:
+                    self._count("sent", len(batch))
+                    return True
+                self._count("errors", len(batch))
+                return False
+            except Exception:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+                self._conns.pop(key, None)
+                if attempt == 0:
+                    self._count("reconnects")
+        self._count("errors", len(batch))
+        return False
@@ -0,0 +1,207 @@
+# relay/pipeline.py
+#
+# 中转分级流水线：
+#   接收线程（只做 recvfrom） → 有界数据包队列 → 处理线程（解析/落图/入库缓冲）
+#   → 通知器（notifier.BackendNotifier，自带有界队列与发送线程）
+# 数据库或 Flask 变慢时只会让队列积压，接收线程持续清空内核缓冲；
+# 队列满时丢弃新包并计数，丢包从“内核静默丢弃”变为可观测。
+# 接收线程每次唤醒后以非阻塞读一次性取完内核缓冲中的全部数据报（上限 recv_batch），
+# 作为一个批次入队，处理线程按批次取用，减少每包一次的线程切换与队列操作。
+# 配置 reassembler（fragments.Reassembler）时，分片数据报在处理线程中按发送地址重组，
+# 整帧到齐后才交给 handle。
+# 配置 shedder（shedding.LoadShedder）时，处理线程按队列深度与批次排队时延决定降载级别，
+# 降载期间一次取出多个批次合并后先丢弃/降采样图像帧、再按设备合并标量读数；模型输出不丢弃。
+
+import queue
+import socket
+import threading
+import time
+
+from fragments import is_fragment
+
+
+class RelayPipeline:
+    """
+    UDP 接收与处理解耦的流水线
+
+    :param handle: handle(data) -> 通知项列表，在处理线程中调用
+    :param notify: notify(item) -> 是否入队成功，须为非阻塞调用（如 BackendNotifier.submit）
+    :param queue_max: 数据包队列容量（按数据报个数计）
+    :param workers: 处理线程数
+    :param recv_batch: 单次唤醒最多连续读取的数据报数
+    :param reassembler: 分片重组器，为 None 时分片数据报按普通数据包处理
+    :param shedder: 过载降载策略，为 None 时不降载
+    """
+
+    def __init__(self, handle, notify, queue_max=2048, workers=2, recv_batch=256, reassembler=None, shedder=None):
+        self._handle = handle
+        self._notify = notify
+        self.reassembler = reassembler
+        self.shedder = shedder
+        # 队列元素为 (接收时刻, [(数据报, 发送地址), ...])；容量按数据报个数在 _depth 中单独计量
+        self.packets = queue.Queue()
+        self.queue_max = max(1, int(queue_max))
+        self.recv_batch = max(1, int(recv_batch))
+        self._depth = 0
+        self.workers = max(1, int(workers))
+        self._stopping = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        self.counters = {
+            "received": 0,
+            "batches": 0,
+            "dropped": 0,
+            "processed": 0,
+            "errors": 0,
+            "notified": 0,
+            "notify_dropped": 0,
+            "shed": 0,
+        }
+        self.queue_peak = 0
+        self.batch_peak = 0
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.counters[key] += n
+
+    # ---------- 生命周期 ----------
+
+    def start(self, sock):
+        """
+        启动接收与处理线程
+        """
+        # 超时用于定期检查停止标志
+        sock.settimeout(0.5)
+        self._spawn(self._recv_loop, "relay-recv", sock)
+        for i in range(self.workers):
+            self._spawn(self._work_loop, f"relay-worker-{i}")
+        return self
+
+    def _spawn(self, target, name, *args):
+        th = threading.Thread(target=target, args=args, name=name, daemon=True)
+        th.start()
+        self._threads.append(th)
+
+    def stop(self, timeout=5.0):
+        """
+        停止接收，处理完已入队的数据包后返回
+        """
+        self._stopping.set()
+        deadline = time.monotonic() + timeout
+        for th in self._threads:
+            th.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
+
+    def stats(self):
+        with self._lock:
+            out = dict(self.counters)
+            out["queue_depth"] = self._depth
+        out["queue_max"] = self.queue_max
+        out["queue_peak"] = self.queue_peak
+        out["batch_peak"] = self.batch_peak
+        out["batch_avg"] = round(out["received"] / out["batches"], 2) if out["batches"] else 0.0
+        return out
+
+    # ---------- 各级线程 ----------
+
+    def _drain(self, sock, first):
+        """
+        在一次唤醒内以非阻塞读取完内核缓冲中已到达的数据报
+        """
+        batch = [first]
+        while len(batch) < self.recv_batch:
+            try:
+                item = sock.recvfrom(65507, socket.MSG_DONTWAIT)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                break
+            batch.append(item)
+        return batch
+
+    def _recv_loop(self, sock):
+        while not self._stopping.is_set():
+            try:
+                item = sock.recvfrom(65507)
+            except socket.timeout:
+                continue
+            except OSError:
+                if self._stopping.is_set():
+                    return
+                time.sleep(0.1)
+                continue
+            batch = self._drain(sock, item)
+            n = len(batch)
+            with self._lock:
+                self.counters["received"] += n
+                self.counters["batches"] += 1
+                room = self.queue_max - self._depth
+                if room < n:
+                    if self.shedder is not None:
+                        # 模型输出越过容量上限入队，只丢弃其余数据包
+                        batch = self.shedder.overflow(batch, room)
+                    else:
+                        batch = batch[:max(room, 0)]
+                    self.counters["dropped"] += n - len(batch)
+                self._depth += len(batch)
+                if self._depth > self.queue_peak:
+                    self.queue_peak = self._depth
+                if n > self.batch_peak:
+                    self.batch_peak = n
+            if batch:
+                self.packets.put((time.monotonic(), batch))
+
+    def _shed(self, t_recv, batch):
+        """
+        计算降载级别；降载期间合并已排队的后续批次，使标量合并覆盖更长的积压
+        """
+        with self._lock:
+            depth = self._depth
+        level = self.shedder.update(depth, self.queue_max, time.monotonic() - t_recv)
+        taken = len(batch)
+        if level > 0:
+            batch = list(batch)
+            limit = self.recv_batch * 4
+            while len(batch) < limit:
+                try:
+                    _t, more = self.packets.get_nowait()
+                except queue.Empty:
+                    break
+                batch.extend(more)
+            taken = len(batch)
+            batch = self.shedder.apply(batch, level)
+            self._count("shed", taken - len(batch))
+        with self._lock:
+            self._depth -= taken
+        return batch
+
+    def _work_loop(self):
+        while True:
+            try:
+                t_recv, batch = self.packets.get(timeout=0.5)
+            except queue.Empty:
+                if self._stopping.is_set():
+                    return
+                continue
+            if self.shedder is not None:
+                batch = self._shed(t_recv, batch)
+            else:
+                with self._lock:
+                    self._depth -= len(batch)
+            for data, addr in batch:
+                if self.reassembler is not None and is_fragment(data):
+                    data = self.reassembler.feed(data, addr)
+                    if data is None:
+                        continue
+                try:
+                    items = self._handle(data) or ()
+                    self._count("processed")
+                except Exception:
+                    self._count("errors")
+                    continue
+                for item in items:
+                    try:
+                        ok = self._notify(item)
+                    except Exception:
+                        ok = False
+                    self._count("notified" if ok is not False else "notify_dropped")
@@ -0,0 +1,119 @@
+# relay/prepared.py
+#
+# 预编译语句注册表（中转与 Flask 共用）：
+# - 热点语句在导入时登记一次（名称、参数类型、以 $n 为占位符的语句体、普通 %s 版本）
+# - 首次在某个连接上执行时 PREPARE，之后只发送 EXECUTE，服务端不再重复解析与生成计划
+# - 已预编译的语句名按连接对象记录（弱引用），重连得到新连接时自动重新 PREPARE；
+#   服务端报告语句不存在（26000，如会话被重置）时移除该语句的记录，下次执行重新 PREPARE
+# - 非 psycopg2 连接（如 py-opengauss）或 DB_PREPARED=0 时退回普通参数化语句
+# PREPARE 不随事务回滚，写入失败回滚后已预编译的语句仍然有效。
+
+import os
+import threading
+import weakref
+
+from psycopg2.extensions import connection as PsyConnection
+
+
+class Statement:
+    __slots__ = ("name", "argtypes", "body", "plain", "prepare_sql", "execute_sql")
+
+    def __init__(self, name, argtypes, body, plain=None):
+        self.name = name
+        self.argtypes = tuple(argtypes)
+        self.body = body
+        self.plain = plain
+        self.prepare_sql = f"PREPARE {name} ({', '.join(self.argtypes)}) AS {body}" if self.argtypes \
+            else f"PREPARE {name} AS {body}"
+        self.execute_sql = f"EXECUTE {name} ({', '.join(['%s'] * len(self.argtypes))})" if self.argtypes \
+            else f"EXECUTE {name}"
+
+
+class StatementRegistry:
+    """
+    按连接延迟预编译的语句注册表
+
+    :param enabled: 为 False 时一律执行普通语句
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._statements = {}
+        self._prepared = weakref.WeakKeyDictionary()  # 连接 -> 已预编译的语句名集合
+        self._lock = threading.Lock()
+        self.stats = {"prepares": 0, "executes": 0, "plain": 0, "invalidated": 0}
+
+    def register(self, name, argtypes, body, plain=None):
+        """
+        登记语句；同名重复登记时以最后一次为准（已在连接上预编译的旧版本不受影响）
+
+        :param name: 语句名（全进程唯一）
+        :param argtypes: 参数类型列表，如 ("real[]", "varchar[]")
+        :param body: 语句体，参数写作 $1、$2 ...
+        :param plain: 退回普通执行时使用的 %s 版本，为 None 时该语句只能预编译执行
+        """
+        st = Statement(name, argtypes, body, plain)
+        with self._lock:
+            self._statements[name] = st
+        return st
+
+    def usable(self, conn):
+        """
+        该连接是否走预编译路径
+        """
+        return self.enabled and isinstance(conn, PsyConnection)
+
+    def execute(self, cur, name, params=()):
+        """
+        在游标上执行已登记的语句
+
+        :param cur: 游标（其 connection 决定是否预编译）
+        :param name: 语句名
+        :param params: 参数序列
+        """
+        st = self._statements[name]
+        conn = cur.connection
+        if not self.usable(conn):
+            if st.plain is None:
+                raise RuntimeError(f"statement {name} requires prepared execution")
+            self.stats["plain"] += 1
+            return cur.execute(st.plain, params) if params else cur.execute(st.plain)
+        with self._lock:
+            names = self._prepared.get(conn)
+            if names is None:
+                names = self._prepared[conn] = set()
+            fresh = name not in names
+        if fresh:
+            cur.execute(st.prepare_sql)
+            with self._lock:
+                names.add(name)
+                self.stats["prepares"] += 1
+        try:
+            if params:
+                cur.execute(st.execute_sql, params)
+            else:
+                cur.execute(st.execute_sql)
+        except Exception as e:
+            if getattr(e, "pgcode", None) == "26000":
+                # 服务端已丢失该语句（会话被重置等）：只移除这一条记录，调用方回滚后重试时重新 PREPARE；
+                # 同连接上仍然存在的其他语句保留记录，避免重复 PREPARE 报错
+                with self._lock:
+                    names.discard(name)
+                    self.stats["invalidated"] += 1
+            raise
+        self.stats["executes"] += 1
+
+    def forget(self, conn):
+        with self._lock:
+            self._prepared.pop(conn, None)
+
+    def snapshot(self):
+        with self._lock:
+            out = dict(self.stats)
+            out["statements"] = len(self._statements)
+            out["connections"] = len(self._prepared)
+        return out
+
+
+# 进程内共享的注册表：batch_writer、udp_relay 与 app 在导入时登记各自的热点语句
+STATEMENTS = StatementRegistry(enabled=os.getenv("DB_PREPARED", "1") == "1")
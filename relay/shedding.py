@@ -0,0 +1,191 @@
+# relay/shedding.py
+#
+# 中转过载时的降载策略（在处理线程中、解析之前按原始字节分类）：
+#   0 级：正常处理全部数据包
+#   1 级（队列深度或排队时延超过帧阈值）：图像帧降采样，每设备每 frame_keep 帧保留 1 帧，
+#         分片帧按 frame_id 取模整帧保留或整帧丢弃
+#   2 级（超过标量阈值）：丢弃全部图像帧，标量读数（温度/光照 JSON 与二进制遥测包）
+#         在同一批次内按设备只保留最新一个数据包
+# 模型输出任何级别都不丢弃；接收队列已满时模型数据包也越过容量上限入队。
+# 分类只在降载生效时进行，正常负载下不增加开销。
+
+import re
+import threading
+
+from fragments import HEADER as FRAG_HEADER, MAGIC as FRAG_MAGIC
+from telemetry import HEADER as TELEMETRY_HEADER, MAGIC as TELEMETRY_MAGIC
+
+MODEL = "model"
+FRAME = "frame"
+FRAGMENT = "fragment"
+SCALAR = "scalar"
+
+_DEVICE_RE = re.compile(rb'"device_id"\s*:\s*"([^"]{1,64})"')
+_MODEL_MARKERS = (b'"model"', b'"output"', b'"result"')
+
+
+def is_model(data):
+    """
+    粗判模型输出数据包（与 handle_packet 的判定条件对应：type=model 或带 output/result）
+    """
+    if data[:2] in (FRAG_MAGIC, TELEMETRY_MAGIC):
+        return False
+    return any(m in data for m in _MODEL_MARKERS)
+
+
+def classify(data, addr):
+    """
+    按原始字节分类数据包
+
+    :return: (类别, 设备键)；设备键取 device_id，缺失时为发送地址
+    """
+    head = data[:2]
+    if head == FRAG_MAGIC:
+        return FRAGMENT, addr
+    if head == TELEMETRY_MAGIC:
+        id_len = data[3] if len(data) > 3 else 0
+        return SCALAR, bytes(data[TELEMETRY_HEADER.size:TELEMETRY_HEADER.size + id_len]) or addr
+    if any(m in data for m in _MODEL_MARKERS):
+        return MODEL, addr
+    m = _DEVICE_RE.search(data)
+    key = m.group(1) if m else addr
+    if b'"frame"' in data:
+        return FRAME, key
+    return SCALAR, key
+
+
+class LoadShedder:
+    """
+    过载降载策略
+
+    :param frame_depth: 1 级阈值，队列深度占容量的比例
+    :param scalar_depth: 2 级阈值，队列深度占容量的比例
+    :param frame_lag_ms: 1 级阈值，批次排队时延（毫秒）
+    :param scalar_lag_ms: 2 级阈值，批次排队时延（毫秒）
+    :param frame_keep: 1 级时每设备每 frame_keep 帧保留 1 帧
+    """
+
+    def __init__(self, frame_depth=0.5, scalar_depth=0.8, frame_lag_ms=500, scalar_lag_ms=2000, frame_keep=4):
+        self.frame_depth = float(frame_depth)
+        self.scalar_depth = float(scalar_depth)
+        self.frame_lag = float(frame_lag_ms) / 1000.0
+        self.scalar_lag = float(scalar_lag_ms) / 1000.0
+        self.frame_keep = max(1, int(frame_keep))
+        self.level = 0
+        self._frame_seq = {}  # 设备键 -> 1 级时的帧计数
+        self._lock = threading.Lock()
+        self.stats = {
+            "activations": 0,
+            "shed_batches": 0,
+            "frames_dropped": 0,
+            "frames_kept": 0,
+            "fragments_dropped": 0,
+            "scalars_coalesced": 0,
+            "models_overflow": 0,
+            "lag_ms": 0,
+        }
+
+    def _count(self, key, n=1):
+        if n:
+            with self._lock:
+                self.stats[key] += n
+
+    def update(self, depth, queue_max, lag):
+        """
+        按当前队列深度与批次排队时延（秒）计算降载级别
+        """
+        fill = depth / float(max(1, queue_max))
+        if fill >= self.scalar_depth or lag >= self.scalar_lag:
+            level = 2
+        elif fill >= self.frame_depth or lag >= self.frame_lag:
+            level = 1
+        else:
+            level = 0
+        with self._lock:
+            if level and not self.level:
+                self.stats["activations"] += 1
+            self.level = level
+            self.stats["lag_ms"] = int(lag * 1000)
+        return level
+
+    def apply(self, items, level):
+        """
+        按级别筛选一批 (数据报, 发送地址)
+
+        :return: 保留的数据包列表（保持原有顺序）
+        """
+        if level <= 0:
+            return items
+        classes = [classify(data, addr) for data, addr in items]
+        last = {}
+        if level >= 2:
+            for i, (kind, key) in enumerate(classes):
+                if kind == SCALAR:
+                    last[key] = i
+        out = []
+        dropped = kept = frags = coalesced = 0
+        for i, item in enumerate(items):
+            kind, key = classes[i]
+            if kind == MODEL:
+                out.append(item)
+            elif kind == FRAME:
+                if level >= 2 or not self._keep_frame(key):
+                    dropped += 1
+                    continue
+                kept += 1
+                out.append(item)
+            elif kind == FRAGMENT:
+                if level >= 2 or not self._keep_fragment(item[0]):
+                    frags += 1
+                    continue
+                out.append(item)
+            elif level >= 2 and last.get(key) != i:
+                coalesced += 1
+            else:
+                out.append(item)
+        with self._lock:
+            self.stats["shed_batches"] += 1
+            self.stats["frames_dropped"] += dropped
+            self.stats["frames_kept"] += kept
+            self.stats["fragments_dropped"] += frags
+            self.stats["scalars_coalesced"] += coalesced
+        return out
+
+    def _keep_frame(self, key):
+        with self._lock:
+            n = self._frame_seq.get(key, 0)
+            if len(self._frame_seq) > 4096:
+                self._frame_seq.clear()
+            self._frame_seq[key] = n + 1
+        return n % self.frame_keep == 0
+
+    def _keep_fragment(self, data):
+        # 同一帧的所有分片 frame_id 相同，保留或丢弃整帧，避免半帧占用重组缓冲
+        if len(data) < FRAG_HEADER.size:
+            return True
+        return FRAG_HEADER.unpack_from(data)[3] % self.frame_keep == 0
+
+    def overflow(self, batch, room):
+        """
+        接收队列容量不足时的截断：模型数据包全部保留，其余数据包按到达顺序占用剩余容量
+
+        :return: 保留的数据包列表
+        """
+        room = max(room, 0)
+        out = []
+        models = 0
+        for item in batch:
+            if is_model(item[0]):
+                out.append(item)
+                models += 1
+            elif room > 0:
+                out.append(item)
+                room -= 1
+        self._count("models_overflow", models)
+        return out
+
+    def snapshot(self):
+        with self._lock:
+            out = dict(self.stats)
+            out["level"] = self.level
+        return out
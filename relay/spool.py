@@ -0,0 +1,208 @@
+# relay/spool.py
+#
+# 数据库不可用时的磁盘暂存（只追加的分段文件）：
+# - BatchWriter 写库失败或连不上数据库时，把整批行追加到当前段文件（JSON 行：[表名, 是否带时间戳, 行]）
+# - 段文件达到 segment_bytes 后滚动为新段；总大小超过 max_bytes 时丢弃最旧的段并计数
+# - 数据库恢复后由 BatchWriter 按速率上限从最旧段读取、批量写回，写成功后推进读游标，
+#   段读完即删除；读游标以快照保存（tmp + os.replace），重启后从上次位置继续回放
+
+import json
+import os
+import threading
+
+SEGMENT_PREFIX = "spool_"
+SEGMENT_SUFFIX = ".jsonl"
+CURSOR_NAME = "cursor.json"
+
+
+class DiskSpool:
+    """
+    分段 JSONL 暂存区
+
+    :param directory: 暂存目录（每个接收进程独立）
+    :param segment_bytes: 单个段文件的滚动阈值（字节）
+    :param max_bytes: 暂存总大小上限（字节），超出时丢弃最旧的段
+    """
+
+    def __init__(self, directory, segment_bytes=4 * 1024 * 1024, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.segment_bytes = max(1024, int(segment_bytes))
+        self.max_bytes = max(self.segment_bytes, int(max_bytes))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._segments = []  # 按序号排列的段文件名
+        self._sizes = {}
+        self._seq = 0
+        self._fh = None  # 当前追加段的文件句柄（始终是 _segments[-1]）
+        self._read_offset = 0  # _segments[0] 的读游标（字节）
+        self.stats = {"spooled": 0, "replayed": 0, "evicted_segments": 0, "evicted_bytes": 0, "corrupt": 0}
+        self._load()
+
+    # ---------- 查询接口 ----------
+
+    def backlog_bytes(self):
+        with self._lock:
+            return sum(self._sizes.values()) - self._read_offset
+
+    def has_backlog(self):
+        return self.backlog_bytes() > 0
+
+    def segments(self):
+        with self._lock:
+            return len(self._segments)
+
+    # ---------- 写入 ----------
+
+    def append(self, rows):
+        """
+        追加一批行
+
+        :param rows: [(表名, 是否带时间戳, 行元组), ...]
+        :return: 成功写入的行数
+        """
+        if not rows:
+            return 0
+        data = "".join(json.dumps([t, bool(has_ts), list(row)], ensure_ascii=False) + "\n"
+                       for t, has_ts, row in rows).encode("utf-8")
+        with self._lock:
+            if self._fh is None or self._sizes[self._segments[-1]] >= self.segment_bytes:
+                self._roll()
+            self._fh.write(data)
+            self._fh.flush()
+            self._sizes[self._segments[-1]] += len(data)
+            self.stats["spooled"] += len(rows)
+            self._evict()
+        return len(rows)
+
+    # ---------- 回放 ----------
+
+    def read(self, max_rows):
+        """
+        从最旧段的读游标处读取至多 max_rows 行（不推进游标）
+
+        :return: (行列表, 游标)，游标交给 commit() 确认；无数据时行列表为空
+        """
+        with self._lock:
+            if not self._segments:
+                return [], None
+            name = self._segments[0]
+            if self._fh is not None and name == self._segments[-1]:
+                # 只剩正在追加的段：封存后读取，后续写入进入新段
+                self._seal()
+            offset = self._read_offset
+            rows = []
+            try:
+                with open(os.path.join(self.directory, name), "rb") as f:
+                    f.seek(offset)
+                    while len(rows) < max_rows:
+                        line = f.readline()
+                        if not line or not line.endswith(b"\n"):
+                            # 段末尾可能是进程崩溃时写了一半的行，视为段结束
+                            offset = self._sizes.get(name, offset) if not line else f.tell()
+                            break
+                        offset = f.tell()
+                        try:
+                            t, has_ts, row = json.loads(line)
+                            rows.append((t, bool(has_ts), tuple(row)))
+                        except Exception:
+                            self.stats["corrupt"] += 1
+            except FileNotFoundError:
+                offset = self._sizes.get(name, 0)
+            return rows, (name, offset)
+
+    def commit(self, cursor, rows=0):
+        """
+        确认 read() 返回的行已写入数据库，推进游标；段读完时删除该段
+        """
+        if cursor is None:
+            return
+        name, offset = cursor
+        with self._lock:
+            self.stats["replayed"] += rows
+            if not self._segments or self._segments[0] != name:
+                return
+            if offset >= self._sizes.get(name, 0) and not (self._fh is not None and name == self._segments[-1]):
+                self._drop_first()
+            else:
+                self._read_offset = offset
+            self._save_cursor()
+
+    def close(self):
+        with self._lock:
+            self._seal()
+            self._save_cursor()
+
+    # ---------- 内部实现（调用方持有 _lock） ----------
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _roll(self):
+        self._seal()
+        self._seq += 1
+        name = f"{SEGMENT_PREFIX}{self._seq:08d}{SEGMENT_SUFFIX}"
+        self._fh = open(self._path(name), "ab")
+        self._segments.append(name)
+        self._sizes[name] = 0
+
+    def _seal(self):
+        if self._fh is not None:
+            try:
+                self._fh.close()
+            except Exception:
+                pass
+            self._fh = None
+
+    def _drop_first(self):
+        name = self._segments.pop(0)
+        self._sizes.pop(name, None)
+        self._read_offset = 0
+        try:
+            os.remove(self._path(name))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"[SPOOL] 删除段文件失败 {name}: {e}")
+
+    def _evict(self):
+        # 只丢弃已封存的旧段，正在追加的段保留
+        while len(self._segments) > 1 and sum(self._sizes.values()) > self.max_bytes:
+            name = self._segments[0]
+            size = self._sizes.get(name, 0) - self._read_offset
+            self._drop_first()
+            self.stats["evicted_segments"] += 1
+            self.stats["evicted_bytes"] += size
+            print(f"[SPOOL] 暂存超过上限，丢弃最旧段 {name}（{size} 字节）")
+            self._save_cursor()
+
+    def _save_cursor(self):
+        head = self._segments[0] if self._segments else None
+        try:
+            path = self._path(CURSOR_NAME)
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"segment": head, "offset": self._read_offset}, f)
+            os.replace(tmp, path)
+        except Exception:
+            pass
+
+    def _load(self):
+        names = sorted(n for n in os.listdir(self.directory)
+                       if n.startswith(SEGMENT_PREFIX) and n.endswith(SEGMENT_SUFFIX))
+        for name in names:
+            try:
+                self._seq = max(self._seq, int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+                self._sizes[name] = os.path.getsize(self._path(name))
+                self._segments.append(name)
+            except Exception:
+                continue
+        try:
+            with open(self._path(CURSOR_NAME), "r", encoding="utf-8") as f:
+                cur = json.load(f)
+            if self._segments and cur.get("segment") == self._segments[0]:
+                self._read_offset = min(int(cur.get("offset", 0)), self._sizes[self._segments[0]])
+        except Exception:
+            pass
+        if self._segments:
+            print(f"[SPOOL] 发现待回放暂存 {len(self._segments)} 段，"
+                  f"{sum(self._sizes.values()) - self._read_offset} 字节")
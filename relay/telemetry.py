@@ -0,0 +1,85 @@
+# relay/telemetry.py
+#
+# 定长二进制遥测数据包（中转与采集器/模拟器共用），一个数据报携带多个采样：
+#
+#   偏移  长度  字段
+#   0     2     magic      b"KT"
+#   2     1     version    1
+#   3     1     id_len     device_id 的 UTF-8 字节数（1..64）
+#   4     2     count      采样个数（1..MAX_SAMPLES）
+#   6     id_len device_id
+#   之后 count 个 13 字节采样：
+#   +0    8     ts_ms      毫秒时间戳（无符号）
+#   +8    1     channel    通道号，见 CHANNELS
+#   +9    4     value      IEEE754 单精度浮点
+#
+# 全部字段为网络字节序。数据报长度必须与头部声明完全一致，否则整包丢弃。
+# 中转按前两个字节区分：JSON 以 "{" 开头，分片为 b"KF"，遥测为 b"KT"。
+
+import struct
+
+MAGIC = b"KT"
+VERSION = 1
+HEADER = struct.Struct("!2sBBH")
+SAMPLE = struct.Struct("!QBf")
+MAX_ID_LEN = 64
+MAX_SAMPLES = 1024
+
+# 通道号 → sensor_fields 中的逻辑名；采集器与模拟器使用相同编号
+CHANNELS = {
+    1: "temperature",
+    2: "light",
+    3: "humidity",
+}
+CHANNEL_IDS = {name: ch for ch, name in CHANNELS.items()}
+
+
+class TelemetryError(ValueError):
+    pass
+
+
+def is_telemetry(data):
+    return data[:2] == MAGIC
+
+
+def encode(device_id, samples):
+    """
+    打包一个遥测数据报
+
+    :param device_id: 设备标识
+    :param samples: [(ts_ms, channel, value), ...]，channel 可为通道号或逻辑名
+    :return: 数据报字节
+    """
+    dev = str(device_id).encode("utf-8")
+    if not 0 < len(dev) <= MAX_ID_LEN:
+        raise TelemetryError("bad device_id length")
+    if not 0 < len(samples) <= MAX_SAMPLES:
+        raise TelemetryError("bad sample count")
+    parts = [HEADER.pack(MAGIC, VERSION, len(dev), len(samples)), dev]
+    for ts_ms, ch, value in samples:
+        ch = CHANNEL_IDS.get(ch, ch)
+        parts.append(SAMPLE.pack(int(ts_ms), int(ch), float(value)))
+    return b"".join(parts)
+
+
+def decode(data):
+    """
+    解析遥测数据报
+
+    :return: (device_id, [(ts_ms, channel, value), ...])，格式非法时抛出 TelemetryError
+    """
+    if len(data) < HEADER.size:
+        raise TelemetryError("short packet")
+    magic, version, id_len, count = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise TelemetryError("bad magic or version")
+    if not 0 < id_len <= MAX_ID_LEN or not 0 < count <= MAX_SAMPLES:
+        raise TelemetryError("bad header")
+    body = HEADER.size + id_len
+    if len(data) != body + count * SAMPLE.size:
+        raise TelemetryError("length mismatch")
+    try:
+        device_id = bytes(data[HEADER.size:body]).decode("utf-8")
+    except UnicodeDecodeError:
+        raise TelemetryError("bad device_id")
+    return device_id, list(SAMPLE.iter_unpack(memoryview(data)[body:]))
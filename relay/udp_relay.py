@@ -15,11 +15,18 @@
 #         ...
 #       ]
 #     },
+#     # 或紧凑编码（见 frame_codec.py）：
+#     # "frame": {"encoding": "rgb24-base64" | "jpeg-base64" | "png-base64",
+#     #           "width": 32, "height": 24, "data": "<base64>"}
 #     "image_path": "/path/to/image.jpg",  # 图片路径（可选）
 #     "timestamp_ms": 1234567890123,       # 时间戳（毫秒，可选）
 #     "name": "model_name",                # 模型名称（当type为model时）
 #     "output": {...}                      # 模型输出（当type为model时）
 #   }
+#   超过单个数据报上限的数据包（如全分辨率 jpeg-base64 帧）可按 fragments.py 的格式分片发送，
+#   中转重组完整后再按上述结构处理
+#   高频标量传感器可改发 telemetry.py 的定长二进制数据包（b"KT" 头 + device_id + N 个采样），
+#   一个数据报携带多个 (ts_ms, 通道, 值)，免去 JSON 解析与键过滤
 # 
 # UDP数据对应的数据库表结构（分表设计）：
 # 
@@ -73,7 +80,10 @@
 # +-------+---------+------+-----+---------+----------------+
 
 import os
+import sys
 import json
+import argparse
+import signal
 import socket
 import time
 import urllib.request
@@ -82,8 +92,26 @@ import psycopg2
 import numpy as np
 import cv2
 import threading
-import time
-import socket
+
+# 中转脚本以 `python3 relay/udp_relay.py` 方式运行，同目录模块按顶层名导入
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from batch_writer import BatchWriter
+from dead_letter import DeadLetterLog
+from prepared import STATEMENTS
+from frame_codec import FrameError, decode_frame
+from pipeline import RelayPipeline
+from image_reaper import ImageReaper
+from notifier import BackendNotifier
+from capture_service import CaptureService, camera_index
+from spool import DiskSpool
+from metrics import Metrics, udp_socket_stats
+from fragments import Reassembler
+from shedding import LoadShedder
+from telemetry import CHANNELS, TelemetryError, decode as decode_telemetry, is_telemetry
+from dedup import DedupIndex
+from image_pool import ImagePool, encode_rgb, write_bytes
+from image_index import ImageIndex
+import image_profiles
 
 # 从环境变量获取或设置默认值
 LAB_DIR = os.getenv("LAB_DIR", "/home/openEuler/lab_monitor")  # 实验室监控主目录
@@ -91,6 +119,19 @@ IMAGES_DIR = os.path.join(LAB_DIR, "static", "images")  # 存放图片的目录
 os.makedirs(IMAGES_DIR, exist_ok=True)  # 确保图片目录存在
 IMAGE_TTL_SEC = int(os.getenv("IMAGE_TTL_SEC", "60"))  # 图片在本地的生存时间（秒）
 IDLE_IMAGE_SEC = int(os.getenv("IDLE_IMAGE_SEC", "15"))  # 空闲时多久生成一张图片（秒）
+RUNTIME_DIR = os.path.join(LAB_DIR, "runtime")  # 运行期状态文件目录
+os.makedirs(RUNTIME_DIR, exist_ok=True)
+REAPER_STATE_PATH = os.path.join(RUNTIME_DIR, "relay_image_reaper.json")  # 待删图片快照
+REAPER = None  # ImageReaper 实例，首次 schedule_delete 时创建
+# 图片目录内存索引：image_path 存在性检查不再逐包 stat
+RELAY_IMAGE_INDEX = os.getenv("RELAY_IMAGE_INDEX", "1") == "1"
+IMAGE_INDEX_RESCAN_SEC = float(os.getenv("IMAGE_INDEX_RESCAN_SEC", "30"))  # 无 inotify 时的全量扫描间隔
+IMAGE_INDEX = None
+# 图像落盘池：处理线程只预留路径，压缩与写盘在池中完成
+RELAY_IMAGE_WORKERS = int(os.getenv("RELAY_IMAGE_WORKERS", "2"))  # 0 为在处理线程中同步写入
+RELAY_IMAGE_QUEUE_MAX = int(os.getenv("RELAY_IMAGE_QUEUE_MAX", "64"))
+RELAY_IMAGE_POOL_MODE = os.getenv("RELAY_IMAGE_POOL_MODE", "thread")  # thread / process
+IMAGE_POOL = None  # ImagePool 实例，在 run_worker 中创建
 
 # 数据库连接配置
 DB_HOST = os.getenv("DB_HOST", "127.0.0.1")
@@ -99,6 +140,81 @@ DB_NAME = os.getenv("DB_NAME", "lab_monitor")
 DB_USER = os.getenv("DB_USER", "labuser")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "LabUser@12345")
 
+# 批量写入阈值：累计行数或最早一行等待时间，先到先刷
+BATCH_MAX_ROWS = int(os.getenv("RELAY_BATCH_ROWS", "500"))
+BATCH_MAX_MS = int(os.getenv("RELAY_BATCH_MS", "200"))
+WRITER = None  # BatchWriter 实例，在 main() 中创建
+DB_CONNECT_TIMEOUT = int(os.getenv("RELAY_DB_CONNECT_TIMEOUT", "3"))  # 连接超时（秒），避免数据库宕机时长时间阻塞
+
+# 重复数据包抑制：(device_id, timestamp_ms) 在窗口内重复出现时丢弃，先于落图与入库
+RELAY_DEDUP_WINDOW_SEC = float(os.getenv("RELAY_DEDUP_WINDOW_SEC", "300"))  # 0 关闭
+RELAY_DEDUP_MAX = int(os.getenv("RELAY_DEDUP_MAX", "100000"))
+DEDUP = DedupIndex(RELAY_DEDUP_WINDOW_SEC, RELAY_DEDUP_MAX) if RELAY_DEDUP_WINDOW_SEC > 0 else None
+# 库端兜底去重（可选）：需先执行 db_init.sql 中注释掉的唯一索引语句；
+# 开启后按数据包中的 device_id 入库，并在分表 INSERT 上追加冲突子句
+RELAY_DB_UNIQUE = os.getenv("RELAY_DB_UNIQUE", "0") == "1"
+RELAY_DB_CONFLICT = os.getenv("RELAY_DB_CONFLICT", "ON DUPLICATE KEY UPDATE NOTHING")  # PostgreSQL 为 ON CONFLICT DO NOTHING
+
+# 数据库不可用时的磁盘暂存与回放
+RELAY_SPOOL = os.getenv("RELAY_SPOOL", "1") == "1"
+RELAY_SPOOL_SEGMENT_MB = int(os.getenv("RELAY_SPOOL_SEGMENT_MB", "4"))
+RELAY_SPOOL_MAX_MB = int(os.getenv("RELAY_SPOOL_MAX_MB", "256"))
+RELAY_SPOOL_REPLAY_ROWS = int(os.getenv("RELAY_SPOOL_REPLAY_ROWS", "2000"))  # 回放速率上限（行/秒）
+SPOOL_DIR = os.path.join(RUNTIME_DIR, "relay_spool")
+# 被数据库拒收（数据错误）的行：逐行隔离后追加到该文件，超过上限滚动为 .1
+RELAY_DEADLETTER_MAX_MB = int(os.getenv("RELAY_DEADLETTER_MAX_MB", "16"))
+DEADLETTER_PATH = os.path.join(RUNTIME_DIR, "relay_deadletter.jsonl")
+
+# 接收/处理流水线：数据包队列容量、处理线程数、通知队列容量、统计输出间隔
+RELAY_QUEUE_MAX = int(os.getenv("RELAY_QUEUE_MAX", "2048"))
+RELAY_WORKERS = int(os.getenv("RELAY_WORKERS", "2"))
+RELAY_RECV_BATCH = int(os.getenv("RELAY_RECV_BATCH", "256"))  # 单次唤醒最多连续读取的数据报数
+RELAY_RCVBUF = int(os.getenv("RELAY_RCVBUF", str(4 * 1024 * 1024)))  # 套接字接收缓冲（字节），受 net.core.rmem_max 限制
+RELAY_STATS_SEC = int(os.getenv("RELAY_STATS_SEC", "60"))
+PIPELINE = None  # RelayPipeline 实例，在 main() 中创建
+RELAY_FRAG_TIMEOUT_MS = int(os.getenv("RELAY_FRAG_TIMEOUT_MS", "2000"))  # 分片帧到齐的等待时间
+RELAY_FRAG_MAX_MB = int(os.getenv("RELAY_FRAG_MAX_MB", "64"))  # 在途分片帧总字节上限
+REASSEMBLER = None  # 分片重组器（fragments.Reassembler），在 run_worker 中创建
+# 过载降载：队列深度（占 RELAY_QUEUE_MAX 的比例）或批次排队时延超过阈值时，先降采样/丢弃图像帧，再按设备合并标量读数
+RELAY_SHED = os.getenv("RELAY_SHED", "1") == "1"
+RELAY_SHED_FRAME_DEPTH = float(os.getenv("RELAY_SHED_FRAME_DEPTH", "0.5"))
+RELAY_SHED_SCALAR_DEPTH = float(os.getenv("RELAY_SHED_SCALAR_DEPTH", "0.8"))
+RELAY_SHED_FRAME_LAG_MS = int(os.getenv("RELAY_SHED_FRAME_LAG_MS", "500"))
+RELAY_SHED_SCALAR_LAG_MS = int(os.getenv("RELAY_SHED_SCALAR_LAG_MS", "2000"))
+RELAY_SHED_FRAME_KEEP = int(os.getenv("RELAY_SHED_FRAME_KEEP", "4"))  # 1 级降载时每设备每 N 帧保留 1 帧
+SHEDDER = None
+
+# 后端通知：keep-alive 连接 + 合并批量发送（队列容量、单批上限、合并等待毫秒）
+BACKEND_NOTIFY_URL = os.getenv("BACKEND_NOTIFY_URL", "http://127.0.0.1:5000/api/relay_notify")
+BACKEND_MODEL_URL = os.getenv("BACKEND_MODEL_URL", "http://127.0.0.1:5000/api/model_output")
+RELAY_NOTIFY_QUEUE_MAX = int(os.getenv("RELAY_NOTIFY_QUEUE_MAX", "1024"))
+RELAY_NOTIFY_BATCH = int(os.getenv("RELAY_NOTIFY_BATCH", "100"))
+RELAY_NOTIFY_LINGER_MS = int(os.getenv("RELAY_NOTIFY_LINGER_MS", "20"))
+NOTIFIER = None  # BackendNotifier 实例，在 main() 中创建
+
+# 多进程分片：--workers N（或 RELAY_PROCS）派生 N 个接收进程，通过 SO_REUSEPORT 共享端口
+# 常驻摄像头采集（仅 0 号接收进程持有设备）
+CAMERA_DEVICE = os.getenv("CAMERA_DEVICE", "/dev/video0")
+CAMERA_SERVICE = os.getenv("CAMERA_SERVICE", "1") == "1"  # 为 0 时退回每次抓拍单独打开设备
+CAMERA_FPS = float(os.getenv("CAMERA_FPS", "5"))
+CAMERA_RING = int(os.getenv("CAMERA_RING", "4"))
+CAMERA_WARMUP = int(os.getenv("CAMERA_WARMUP", "5"))
+CAMERA_MAX_AGE = float(os.getenv("CAMERA_MAX_AGE", "5"))  # 缓存帧超过该秒数视为不可用
+CAMERA_PUBLISH_SEC = float(os.getenv("CAMERA_PUBLISH_SEC", "1"))  # 共享最新帧文件刷新间隔，0 为不写出
+CAMERA_LATEST_PATH = os.path.join(RUNTIME_DIR, "camera_latest.jpg")  # 供 Flask 直接复制的最新帧
+CAMERA_PROFILE_FALLBACK = "jpeg-q95"  # 摄像头抓拍的缺省存储配置，可在 image_storage.devices 中以 "camera" 覆盖
+CAMERA_PROFILE = None  # 启动时按 image_storage 解析
+CAPTURE = None  # CaptureService 实例，在 run_worker 中为 0 号进程创建
+
+# 运行指标：RELAY_METRICS_PORT 非 0 时提供本地 HTTP 端点（多进程时第 i 号进程使用 端口+i），
+# 同时在每次统计周期写出 runtime/relay_metrics_w<序号>.prom
+RELAY_METRICS_HOST = os.getenv("RELAY_METRICS_HOST", "127.0.0.1")
+RELAY_METRICS_PORT = int(os.getenv("RELAY_METRICS_PORT", "0"))
+METRICS = Metrics("relay")
+
+RELAY_PROCS = int(os.getenv("RELAY_PROCS", "1"))
+WORKER_INDEX = 0  # 当前进程的分片序号（单进程模式为 0）
+
 # 加载可接受的UDP数据键配置
 RELAY_DIR = os.path.join(LAB_DIR, "relay")
 CONFIG_FILE_PATH = os.path.join(RELAY_DIR, "udp_config.json")
@@ -134,6 +250,7 @@ def db_connect():
         "user": DB_USER,
         "password": DB_PASSWORD,
         "sslmode": "disable",
+        "connect_timeout": DB_CONNECT_TIMEOUT,
     }
     conn = psycopg2.connect(**cfg)
     # 设置时区为中国标准时间
@@ -142,92 +259,108 @@ def db_connect():
     return conn
 
 
-def schedule_delete(image_path):
+def on_image_removed(name):
     """
-    计划在指定时间后删除图片文件
+    删除器删掉图片后同步索引（无 inotify 时依赖此登记）
+    """
+    if IMAGE_INDEX is not None:
+        IMAGE_INDEX.discard(name)
+
+def image_exists(image_path):
+    """
+    image_path 对应的图片是否在图片目录中
     
-    :param image_path: 图片路径
+    :return: 存在返回 True
     """
     try:
-        name = os.path.basename(str(image_path or ""))
-        if not name:
-            return
-        fp = os.path.join(IMAGES_DIR, name)
+        name = os.path.basename(str(image_path))
     except Exception:
-        return
-    
-    def job():
-        """
-        延迟执行的删除任务
-        """
-        try:
-            time.sleep(IMAGE_TTL_SEC)
-            try:
-                os.remove(fp)
-            except Exception:
-                pass
-        except Exception:
-            pass
+        return False
+    if IMAGE_INDEX is not None:
+        # 采集器刚写入的文件事件可能晚于数据包到达：未命中时再 stat 确认一次
+        return IMAGE_INDEX.contains(name, verify=True)
+    return os.path.exists(os.path.join(IMAGES_DIR, name))
+
+def get_reaper():
+    """
+    获取（必要时创建并启动）全局图片删除器
+    """
+    global REAPER
+    if REAPER is None:
+        REAPER = ImageReaper(IMAGES_DIR, IMAGE_TTL_SEC, state_path=REAPER_STATE_PATH, on_remove=on_image_removed).start()
+    return REAPER
+
+def schedule_delete(image_path):
+    """
+    计划在指定时间后删除图片文件（由单个删除线程按到期时间统一处理）
     
+    :param image_path: 图片路径
+    """
+    if not image_path:
+        return
     try:
-        threading.Thread(target=job, daemon=True).start()
+        get_reaper().schedule(image_path)
     except Exception:
         pass
 
-def save_image(frame):
+def save_image(frame, profile=None):
     """
-    将帧数据保存为图片文件
+    将帧数据保存为图片文件：先预留路径并返回，编码与写盘交给图像落盘池
     
     :param frame: 包含图像信息的字典，格式如注释中所示
-    :return: 保存后的图片路径（相对于静态资源目录）
+    :param profile: 存储配置（image_profiles.resolve 的结果），为 None 时使用缺省配置
+    :return: 保存后的图片路径（相对于静态资源目录），落盘池已满时返回 None
     """
-    w = int(frame.get("width", 0))
-    h = int(frame.get("height", 0))
-    pixels = frame.get("pixels")
-    if w <= 0 or h <= 0 or not isinstance(pixels, list):
+    try:
+        decoded = decode_frame(frame)
+    except FrameError:
         ts = datetime.now().strftime("%Y%m%d_%H%M%S")
         fp = os.path.join(IMAGES_DIR, f"relay_{ts}.png")
         arr = np.zeros((32, 32, 3), dtype=np.uint8)
         cv2.imwrite(fp, arr)
         return f"/static/images/{os.path.basename(fp)}"
-    
-    arr = np.zeros((h, w, 3), dtype=np.uint8)
-    for y in range(h):
-        row = pixels[y]
-        for x in range(w):
-            p = row[x]
-            r = int(p.get("r", 0)) & 0xFF
-            g = int(p.get("g", 0)) & 0xFF
-            b = int(p.get("b", 0)) & 0xFF
-            arr[y, x, 0] = r
-            arr[y, x, 1] = g
-            arr[y, x, 2] = b
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
     ms = int(time.time() * 1000) % 1000
-    fp = os.path.join(IMAGES_DIR, f"relay_{ts}_{ms:03d}.png")
-    fp = os.path.join(IMAGES_DIR, f"relay_{ts}_{ms:03d}.png")
-    arr_bgr = cv2.cvtColor(arr, cv2.COLOR_RGB2BGR)
-    scale = 10
-    dst = cv2.resize(arr_bgr, (w * scale, h * scale), interpolation=cv2.INTER_NEAREST)
-    cv2.imwrite(fp, dst)
+    if decoded.encoded is not None:
+        # JPEG/PNG 编码帧：原始字节直接落盘，不再解码与重新压缩
+        fp = os.path.join(IMAGES_DIR, f"relay_{ts}_{ms:03d}{decoded.ext}")
+        job = (write_bytes, fp, decoded.encoded)
+    else:
+        # 格式、质量与缩放由存储配置决定；低分辨率帧的放大在读取时完成
+        if profile is None:
+            profile = image_profiles.resolve(None)[1]
+        fp = os.path.join(IMAGES_DIR, f"relay_{ts}_{ms:03d}{profile['ext']}")
+        job = (encode_rgb, fp, decoded.rgb, profile)
+    if IMAGE_POOL is None:
+        job[0](*job[1:])
+    elif not IMAGE_POOL.submit(*job):
+        # 落盘池已满：放弃该帧图片，不阻塞处理线程
+        METRICS.inc("images_rejected")
+        return None
     return f"/static/images/{os.path.basename(fp)}"
 
 def capture_uvc_image():
     """
-    从UVC摄像头设备捕获一张图片
+    从UVC摄像头设备捕获一张图片（常驻采集服务运行时直接取其缓存的最新帧）
     
     :return: 保存的图片路径，失败则返回None
     """
-    dev = os.getenv("CAMERA_DEVICE", "/dev/video0")
-    idx = None
-    try:
-        if str(dev).startswith("/dev/video"):
-            idx = int(str(dev).replace("/dev/video", ""))
-        else:
-            idx = int(str(dev))
-    except Exception:
-        idx = 0
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    ms = int(time.time() * 1000) % 1000
+    profile = CAMERA_PROFILE or image_profiles.resolve(None, fallback=CAMERA_PROFILE_FALLBACK)[1]
+    fp = os.path.join(IMAGES_DIR, f"relay_cam_{ts}_{ms:03d}{profile['ext']}")
+    if CAPTURE is not None:
+        # 设备由采集服务独占，不再重复打开
+        item = CAPTURE.latest(CAMERA_MAX_AGE)
+        if item is None:
+            return None
+        try:
+            write_bytes(fp, image_profiles.encode_bgr(item[1], profile))
+        except Exception:
+            return None
+        return f"/static/images/{os.path.basename(fp)}"
     
+    idx = camera_index(CAMERA_DEVICE)
     try:
         cap = cv2.VideoCapture(idx, apiPreference=getattr(cv2, 'CAP_V4L2', 200))
         if not cap.isOpened():
@@ -240,10 +373,7 @@ def capture_uvc_image():
         if not ret:
             return None
         
-        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-        ms = int(time.time() * 1000) % 1000
-        fp = os.path.join(IMAGES_DIR, f"relay_cam_{ts}_{ms:03d}.jpg")
-        cv2.imwrite(fp, frame)
+        write_bytes(fp, image_profiles.encode_bgr(frame, profile))
         return f"/static/images/{os.path.basename(fp)}"
     except Exception:
         return None
@@ -259,22 +389,66 @@ def ensure_image_uptime():
             if IDLE_IMAGE_SEC > 0 and (now - last_image_at) > IDLE_IMAGE_SEC:
                 p = capture_uvc_image()
                 if p:
-                    try:
-                        conn = db_connect()
-                        insert_image_db(conn, p, bubble=True)
+                    if WRITER is not None:
+                        WRITER.add_image(p, bubble=True)
+                    else:
                         try:
-                            conn.close()
+                            conn = db_connect()
+                            insert_image_db(conn, p, bubble=True)
+                            try:
+                                conn.close()
+                            except Exception:
+                                pass
                         except Exception:
                             pass
-                    except Exception:
-                        pass
                     payload = { "temperature": None, "light": None, "image_path": p }
                     schedule_delete(p)
-                    notify_backend(payload)
+                    if NOTIFIER is not None:
+                        NOTIFIER.submit(("sensor", payload))
+                    else:
+                        notify_backend(payload)
                     last_image_at = now
         except Exception:
             time.sleep(1)
 
+# 单行 INSERT 的预编译语句（非 psycopg2 连接或 DB_PREPARED=0 时执行 plain 版本）
+_TS_ARG = "to_timestamp(${n}/1000.0) AT TIME ZONE 'Asia/Shanghai'"
+STATEMENTS.register(
+    "relay_temperature", ("real", "varchar"),
+    "INSERT INTO temperature_data (value, device_id) VALUES ($1, $2)",
+    "INSERT INTO temperature_data (value, device_id) VALUES (%s, %s)",
+)
+STATEMENTS.register(
+    "relay_temperature_ts", ("real", "varchar", "bigint"),
+    f"INSERT INTO temperature_data (value, device_id, timestamp) VALUES ($1, $2, {_TS_ARG.format(n=3)})",
+    "INSERT INTO temperature_data (value, device_id, timestamp) VALUES (%s, %s, to_timestamp(%s/1000.0) AT TIME ZONE 'Asia/Shanghai')",
+)
+STATEMENTS.register(
+    "relay_image", ("text", "varchar", "boolean"),
+    "INSERT INTO image_data (image_path, device_id, bubble) VALUES ($1, $2, $3)",
+    "INSERT INTO image_data (image_path, device_id, bubble) VALUES (%s, %s, %s)",
+)
+STATEMENTS.register(
+    "relay_image_ts", ("text", "varchar", "boolean", "bigint"),
+    f"INSERT INTO image_data (image_path, device_id, bubble, timestamp) VALUES ($1, $2, $3, {_TS_ARG.format(n=4)})",
+    "INSERT INTO image_data (image_path, device_id, bubble, timestamp) VALUES (%s, %s, %s, to_timestamp(%s/1000.0) AT TIME ZONE 'Asia/Shanghai')",
+)
+STATEMENTS.register(
+    "relay_light", ("integer", "varchar"),
+    "INSERT INTO light_data (value, device_id) VALUES ($1, $2)",
+    "INSERT INTO light_data (value, device_id) VALUES (%s, %s)",
+)
+STATEMENTS.register(
+    "relay_light_ts", ("integer", "varchar", "bigint"),
+    f"INSERT INTO light_data (value, device_id, timestamp) VALUES ($1, $2, {_TS_ARG.format(n=3)})",
+    "INSERT INTO light_data (value, device_id, timestamp) VALUES (%s, %s, to_timestamp(%s/1000.0) AT TIME ZONE 'Asia/Shanghai')",
+)
+STATEMENTS.register(
+    "relay_model", ("text", "text"),
+    "INSERT INTO model_outputs (name, output) VALUES ($1, $2)",
+    "INSERT INTO model_outputs (name, output) VALUES (%s, %s)",
+)
+
 def insert_temperature_db(conn, temp_value, device_id='temp_main', ts_ms=None):
     """
     插入温度数据到分表
@@ -287,14 +461,14 @@ def insert_temperature_db(conn, temp_value, device_id='temp_main', ts_ms=None):
     try:
         if ts_ms is None:
             # 使用当前时间插入温度数据
-            cur.execute(
-                "INSERT INTO temperature_data (value, device_id) VALUES (%s, %s)",
+            STATEMENTS.execute(
+                cur, "relay_temperature",
                 (float(temp_value) if temp_value is not None else 0.0, str(device_id)),
             )
         else:
             # 使用指定时间戳插入温度数据
-            cur.execute(
-                "INSERT INTO temperature_data (value, device_id, timestamp) VALUES (%s, %s, to_timestamp(%s/1000.0) AT TIME ZONE 'Asia/Shanghai')",
+            STATEMENTS.execute(
+                cur, "relay_temperature_ts",
                 (float(temp_value) if temp_value is not None else 0.0, str(device_id), int(ts_ms)),
             )
         conn.commit()
@@ -319,14 +493,14 @@ def insert_image_db(conn, image_path, device_id='camera_main', bubble=False, ts_
     try:
         if ts_ms is None:
             # 使用当前时间插入图像数据
-            cur.execute(
-                "INSERT INTO image_data (image_path, device_id, bubble) VALUES (%s, %s, %s)",
+            STATEMENTS.execute(
+                cur, "relay_image",
                 (str(image_path), str(device_id), bool(bubble)),
             )
         else:
             # 使用指定时间戳插入图像数据
-            cur.execute(
-                "INSERT INTO image_data (image_path, device_id, bubble, timestamp) VALUES (%s, %s, %s, to_timestamp(%s/1000.0) AT TIME ZONE 'Asia/Shanghai')",
+            STATEMENTS.execute(
+                cur, "relay_image_ts",
                 (str(image_path), str(device_id), bool(bubble), int(ts_ms)),
             )
         conn.commit()
@@ -350,14 +524,14 @@ def insert_light_db(conn, light_value, device_id='light_main', ts_ms=None):
     try:
         if ts_ms is None:
             # 使用当前时间插入光敏数据
-            cur.execute(
-                "INSERT INTO light_data (value, device_id) VALUES (%s, %s)",
+            STATEMENTS.execute(
+                cur, "relay_light",
                 (int(light_value) if light_value is not None else 0, str(device_id)),
             )
         else:
             # 使用指定时间戳插入光敏数据
-            cur.execute(
-                "INSERT INTO light_data (value, device_id, timestamp) VALUES (%s, %s, to_timestamp(%s/1000.0) AT TIME ZONE 'Asia/Shanghai')",
+            STATEMENTS.execute(
+                cur, "relay_light_ts",
                 (int(light_value) if light_value is not None else 0, str(device_id), int(ts_ms)),
             )
         conn.commit()
@@ -397,8 +571,8 @@ def insert_db(conn, temp, image_path, light, ts_ms=None, bubble=0):
 def insert_model_db(conn, name, output_text):
     cur = conn.cursor()
     try:
-        cur.execute(
-            "INSERT INTO model_outputs (name, output) VALUES (%s, %s)",
+        STATEMENTS.execute(
+            cur, "relay_model",
             (str(name), str(output_text)),
         )
         conn.commit()
@@ -411,137 +585,504 @@ def insert_model_db(conn, name, output_text):
         cur.close()
 
 def notify_backend(payload):
-    url = os.getenv("BACKEND_NOTIFY_URL", "http://127.0.0.1:5000/api/relay_notify")
+    """
+    同步发送单条通知（主流程使用 NOTIFIER 批量发送，此函数保留作回退）
+    """
+    url = BACKEND_NOTIFY_URL
     data = json.dumps(payload).encode("utf-8")
     req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"}, method="POST")
     try:
         urllib.request.urlopen(req, timeout=5).read()
+        return True
     except Exception:
-        pass
+        return False
 
 def notify_backend_model(name, output_obj):
-    url = os.getenv("BACKEND_MODEL_URL", "http://127.0.0.1:5000/api/model_output")
+    url = BACKEND_MODEL_URL
     payload = { 'name': name, 'output': output_obj }
     data = json.dumps(payload).encode("utf-8")
     req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"}, method="POST")
     try:
         urllib.request.urlopen(req, timeout=5).read()
+        return True
+    except Exception:
+        return False
+
+def worker_stats():
+    """
+    汇总当前进程各组件的统计信息
+    """
+    out = {"worker": WORKER_INDEX, "pid": os.getpid(), "ts": int(time.time())}
+    if PIPELINE is not None:
+        out["pipeline"] = PIPELINE.stats()
+    if WRITER is not None:
+        out["writer"] = dict(WRITER.stats, pending=WRITER.pending())
+        if WRITER.spool is not None:
+            out["spool"] = dict(WRITER.spool.stats, backlog_bytes=WRITER.spool.backlog_bytes(),
+                                segments=WRITER.spool.segments())
+    if NOTIFIER is not None:
+        out["notifier"] = dict(NOTIFIER.stats, depth=NOTIFIER.depth())
+    if REAPER is not None:
+        out["reaper"] = dict(REAPER.stats, backlog=REAPER.backlog())
+    if REASSEMBLER is not None:
+        frames, nbytes = REASSEMBLER.inflight()
+        out["fragments"] = dict(REASSEMBLER.stats, inflight=frames, inflight_bytes=nbytes)
+    if IMAGE_POOL is not None:
+        out["image_pool"] = dict(IMAGE_POOL.stats, depth=IMAGE_POOL.depth())
+    if SHEDDER is not None:
+        out["shedding"] = SHEDDER.snapshot()
+    if IMAGE_INDEX is not None:
+        out["image_index"] = IMAGE_INDEX.snapshot()
+    if DEDUP is not None:
+        out["dedup"] = DEDUP.snapshot()
+    out["prepared"] = STATEMENTS.snapshot()
+    if CAPTURE is not None:
+        out["camera"] = dict(CAPTURE.stats, open=CAPTURE.is_open())
+    return out
+
+def dump_worker_stats():
+    """
+    打印并写出本进程统计（runtime/relay_stats_w<序号>.json）
+    """
+    st = worker_stats()
+    print(f"[RELAY w{WORKER_INDEX}] 统计: {json.dumps(st, ensure_ascii=False)}")
+    try:
+        path = os.path.join(RUNTIME_DIR, f"relay_stats_w{WORKER_INDEX}.json")
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(st, f, ensure_ascii=False)
+        os.replace(tmp, path)
     except Exception:
         pass
+    METRICS.write_file(os.path.join(RUNTIME_DIR, f"relay_metrics_w{WORKER_INDEX}.prom"))
 
-def main():
+def metric_gauges(port):
+    """
+    指标导出回调：把各组件 stats 展开为 gauge，并附带内核 UDP 丢包统计
+    """
+    out = {}
+    for group, st in worker_stats().items():
+        if not isinstance(st, dict):
+            continue
+        for k, v in st.items():
+            if isinstance(v, (bool, int, float)):
+                out[f"{group}_{k}"] = int(v) if isinstance(v, bool) else v
+    out.update(udp_socket_stats(port))
+    return out
+
+def on_writer_flush(rows_by_table, seconds, ok):
+    METRICS.observe("db_insert", seconds)
+    if ok:
+        for table, n in rows_by_table.items():
+            METRICS.inc(f"inserted_{table}", n)
+    else:
+        METRICS.inc("insert_failures")
+
+def on_notify_sent(n, seconds, ok):
+    METRICS.observe("notify", seconds)
+    if not ok:
+        METRICS.inc("notify_failures", n)
+
+def start_handlers(config):
+    """
+    创建 handle_packet 依赖的组件：批量写入器（含磁盘暂存）、图像落盘池、分片重组器与图片目录索引
+    接收进程与 Flask 内嵌接收模式（app.py 的 EMBEDDED_RELAY）共用
+    
+    :param config: load_config() 返回的配置
+    """
+    global WRITER, CAMERA_PROFILE, REASSEMBLER, IMAGE_INDEX, IMAGE_POOL
+    CAMERA_PROFILE = image_profiles.resolve(config.get("image_storage"), "camera", fallback=CAMERA_PROFILE_FALLBACK)[1]
+    # 入库交给批量写入器：接收循环只追加行，连接与提交在后台线程完成
+    # 数据库不可用时批次转存磁盘，恢复后限速回放
+    spool = None
+    if RELAY_SPOOL:
+        spool = DiskSpool(
+            SPOOL_DIR,
+            segment_bytes=RELAY_SPOOL_SEGMENT_MB * 1024 * 1024,
+            max_bytes=RELAY_SPOOL_MAX_MB * 1024 * 1024,
+        )
+    WRITER = BatchWriter(
+        db_connect,
+        max_rows=BATCH_MAX_ROWS,
+        max_delay_ms=BATCH_MAX_MS,
+        spool=spool,
+        replay_rows=RELAY_SPOOL_REPLAY_ROWS,
+        on_flush=on_writer_flush,
+        conflict=RELAY_DB_CONFLICT if RELAY_DB_UNIQUE else None,
+        dead_letter=DeadLetterLog(DEADLETTER_PATH, source=f"relay_w{WORKER_INDEX}",
+                                  max_bytes=RELAY_DEADLETTER_MAX_MB * 1024 * 1024),
+    ).start()
+    if RELAY_IMAGE_WORKERS > 0:
+        IMAGE_POOL = ImagePool(RELAY_IMAGE_WORKERS, RELAY_IMAGE_QUEUE_MAX, RELAY_IMAGE_POOL_MODE).start()
+    # 超过单个数据报上限的数据包由发送端分片，处理线程按发送地址重组
+    REASSEMBLER = Reassembler(
+        timeout_sec=RELAY_FRAG_TIMEOUT_MS / 1000.0,
+        max_bytes=RELAY_FRAG_MAX_MB * 1024 * 1024,
+    )
+    if RELAY_IMAGE_INDEX:
+        IMAGE_INDEX = ImageIndex(IMAGES_DIR, rescan_sec=IMAGE_INDEX_RESCAN_SEC).start()
+    # 启动时恢复上次未完成的待删列表（重启期间已过期的图片立即删除）
+    get_reaper()
+
+def stop_handlers():
+    """
+    按依赖顺序停止 start_handlers 创建的组件：图片先落盘，再刷写批次
     """
-    主函数：创建UDP套接字，接收数据并处理
+    if IMAGE_POOL is not None:
+        IMAGE_POOL.stop()
+    if WRITER is not None:
+        WRITER.stop()
+    if REAPER is not None:
+        REAPER.stop()
+    if IMAGE_INDEX is not None:
+        IMAGE_INDEX.stop()
+
+def run_worker(index=0, total=1):
+    """
+    运行一个接收进程：独立的套接字、数据库连接、批量写入器、通知器与图片删除器
+    
+    :param index: 分片序号，仅 0 号负责空闲保底抓拍
+    :param total: 分片总数，大于 1 时以 SO_REUSEPORT 绑定同一端口
     """
+    global PIPELINE, NOTIFIER, CAPTURE, SHEDDER, WORKER_INDEX, REAPER_STATE_PATH, SPOOL_DIR, DEADLETTER_PATH
+    WORKER_INDEX = index
+    if index > 0:
+        REAPER_STATE_PATH = os.path.join(RUNTIME_DIR, f"relay_image_reaper_w{index}.json")
+        SPOOL_DIR = os.path.join(RUNTIME_DIR, f"relay_spool_w{index}")
+        DEADLETTER_PATH = os.path.join(RUNTIME_DIR, f"relay_deadletter_w{index}.jsonl")
     # 在主函数开始时加载配置
     config = load_config()
-    
-    conn = None
-    while True:
+    start_handlers(config)
+    # pkill 默认发送 SIGTERM，转换为 SystemExit 以便刷写尚未提交的批次
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    if total > 1:
+        # 内核按四元组哈希把数据报分发到各进程的套接字
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    if RELAY_RCVBUF > 0:
+        # 更大的接收缓冲可吸收突发；实际值受 net.core.rmem_max 限制（Linux 返回值为设置值的 2 倍）
         try:
-            conn = db_connect()
-            break
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RELAY_RCVBUF)
+        except OSError as e:
+            print(f"[RELAY w{index}] 设置 SO_RCVBUF 失败: {e}")
+    port = int(os.getenv("RELAY_PORT", "9999"))
+    sock.bind((os.getenv("RELAY_HOST", "0.0.0.0"), port))
+    METRICS.labels["worker"] = str(index)
+    METRICS.add_collector(lambda: metric_gauges(port))
+    if RELAY_METRICS_PORT > 0:
+        try:
+            METRICS.serve(RELAY_METRICS_HOST, RELAY_METRICS_PORT + index)
+            print(f"[RELAY w{index}] 指标端点 http://{RELAY_METRICS_HOST}:{RELAY_METRICS_PORT + index}/metrics")
+        except OSError as e:
+            print(f"[RELAY w{index}] 指标端点启动失败: {e}")
+    NOTIFIER = BackendNotifier(
+        BACKEND_NOTIFY_URL,
+        BACKEND_MODEL_URL,
+        queue_max=RELAY_NOTIFY_QUEUE_MAX,
+        max_batch=RELAY_NOTIFY_BATCH,
+        linger_ms=RELAY_NOTIFY_LINGER_MS,
+        on_send=on_notify_sent,
+    ).start()
+    if RELAY_SHED:
+        SHEDDER = LoadShedder(
+            frame_depth=RELAY_SHED_FRAME_DEPTH,
+            scalar_depth=RELAY_SHED_SCALAR_DEPTH,
+            frame_lag_ms=RELAY_SHED_FRAME_LAG_MS,
+            scalar_lag_ms=RELAY_SHED_SCALAR_LAG_MS,
+            frame_keep=RELAY_SHED_FRAME_KEEP,
+        )
+    PIPELINE = RelayPipeline(
+        lambda data: handle_packet(data, config),
+        NOTIFIER.submit,
+        queue_max=RELAY_QUEUE_MAX,
+        workers=RELAY_WORKERS,
+        recv_batch=RELAY_RECV_BATCH,
+        reassembler=REASSEMBLER,
+        shedder=SHEDDER,
+    ).start(sock)
+    if index == 0:
+        if CAMERA_SERVICE and IDLE_IMAGE_SEC > 0:
+            # 设备常开并持续刷新缓存帧，同时发布最新帧供 Flask 抓拍复用
+            CAPTURE = CaptureService(
+                CAMERA_DEVICE,
+                ring_size=CAMERA_RING,
+                fps=CAMERA_FPS,
+                warmup_frames=CAMERA_WARMUP,
+                publish_path=CAMERA_LATEST_PATH if CAMERA_PUBLISH_SEC > 0 else None,
+                publish_sec=CAMERA_PUBLISH_SEC,
+            ).start()
+        try:
+            threading.Thread(target=ensure_image_uptime, daemon=True).start()
         except Exception:
-            time.sleep(1)
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    sock.bind((os.getenv("RELAY_HOST", "0.0.0.0"), int(os.getenv("RELAY_PORT", "9999"))))
+            pass
+    print(f"[RELAY w{index}] 接收进程已启动 PID {os.getpid()}（共 {total} 个），"
+          f"SO_RCVBUF={sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)}")
     try:
-        threading.Thread(target=ensure_image_uptime, daemon=True).start()
-    except Exception:
+        while True:
+            time.sleep(RELAY_STATS_SEC if RELAY_STATS_SEC > 0 else 3600)
+            if RELAY_STATS_SEC > 0:
+                dump_worker_stats()
+    except (KeyboardInterrupt, SystemExit):
         pass
-    while True:
+    finally:
+        PIPELINE.stop()
+        NOTIFIER.stop()
+        stop_handlers()
+        if CAPTURE is not None:
+            CAPTURE.stop()
         try:
-            data, addr = sock.recvfrom(65507)
-            try:
-                j = json.loads(data.decode("utf-8"))
-            except Exception:
-                continue
-            if j.get("type") == "model" or (j.get("name") and (j.get("output") or j.get("result"))):
-                # 从配置中获取模型数据的允许键
-                valid_model_keys = config.get("valid_keys", {}).get("model", [])
-                # 过滤掉无效的键
-                filtered_j = {k: v for k, v in j.items() if k in valid_model_keys}
-                
-                name = filtered_j.get("name") or filtered_j.get("model_name")
-                out_obj = filtered_j.get("output") if filtered_j.get("output") is not None else filtered_j.get("result")
-                out_text = json.dumps(out_obj, ensure_ascii=False) if isinstance(out_obj, (dict, list)) else str(out_obj)
-                if conn is None:
-                    try:
-                        conn = db_connect()
-                    except Exception:
-                        pass
-                if conn is not None:
-                    insert_model_db(conn, name or "unknown", out_text)
-                notify_backend_model(name or "unknown", out_obj)
-                continue
-            
-            # 从配置中获取传感器数据的允许键
-            valid_sensor_keys = config.get("valid_keys", {}).get("sensor", [])
-            # 过滤掉无效的键
-            j = {k: v for k, v in j.items() if k in valid_sensor_keys}
-            
-            # 从配置中获取传感器字段映射，并动态解析数据
-            sensor_fields = config.get("sensor_fields", {})
-            # 创建一个字典来存储解析后的传感器数据
-            parsed_sensor_data = {}
-            # 遍历配置中的映射关系
-            for logical_name, json_key in sensor_fields.items():
-                # 从接收到的 JSON 数据 j 中获取对应的值
-                parsed_sensor_data[logical_name] = j.get(json_key)
-            
-            # 现在可以从 parsed_sensor_data 字典中获取各个值
-            temp_c = parsed_sensor_data.get("temperature")  # 温度
-            light = parsed_sensor_data.get("light")        # 光照
-            frame = parsed_sensor_data.get("frame")        # 图像帧数据
-            image_path = parsed_sensor_data.get("image_path") # 图像路径
-            ts_ms = parsed_sensor_data.get("timestamp")    # 时间戳（毫秒）
-            
-            if image_path:
-                try:
-                    name = os.path.basename(str(image_path))
-                    fp = os.path.join(IMAGES_DIR, name)
-                    if not os.path.exists(fp):
-                        image_path = None
-                except Exception:
-                    image_path = None
-            else:
-                if frame:
-                    image_path = save_image(frame)
-                else:
-                    image_path = None
-            
-            if conn is None:
-                try:
-                    conn = db_connect()
-                except Exception:
-                    pass
-            
-            if conn is not None:
-                # 分别插入不同类型的数据到对应的分表
-                # 插入温度数据（如果存在）
-                if temp_c is not None:
-                    insert_temperature_db(conn, temp_c, ts_ms=ts_ms)
-                
-                # 插入图像数据（如果存在）
-                if image_path:
-                    bubble = (temp_c is None)  # 如果温度为None，说明这是定时生成的图片
-                    insert_image_db(conn, image_path, bubble=bubble, ts_ms=ts_ms)
-                
-                # 插入光敏数据（如果存在）
-                if light is not None:
-                    insert_light_db(conn, light, ts_ms=ts_ms)
-                
-                
-            
-            payload = {"temperature": temp_c, "light": light, "image_path": image_path, "timestamp_ms": ts_ms}
-            schedule_delete(image_path)
-            notify_backend(payload)
-            try:
-                last_image_at = time.time()
-            except Exception:
-                pass
+            sock.close()
         except Exception:
+            pass
+        dump_worker_stats()
+
+def spawn_worker(index, total):
+    """
+    fork 一个接收进程，子进程运行 run_worker 后直接退出
+    """
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(index, total)
+        except BaseException as e:
+            print(f"[RELAY w{index}] 异常退出: {e}")
+            code = 1
+        finally:
+            sys.stdout.flush()
+            os._exit(code)
+    return pid
+
+def supervise(total):
+    """
+    主进程：派生 total 个接收进程，异常退出时重启；收到 SIGTERM/SIGINT 时
+    转发给全部子进程，等待其刷写完毕，超时后强制结束
+    """
+    children = {}
+    stopping = []
+
+    def on_signal(signum, frame):
+        stopping.append(signum)
+
+    signal.signal(signal.SIGTERM, on_signal)
+    signal.signal(signal.SIGINT, on_signal)
+    for i in range(total):
+        children[spawn_worker(i, total)] = i
+    print(f"[RELAY] 主进程 PID {os.getpid()}，已派生 {total} 个接收进程 (SO_REUSEPORT)")
+    while children and not stopping:
+        # 轮询而非阻塞 waitpid：信号处理函数返回后阻塞调用会被自动重试
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            time.sleep(0.2)
+            continue
+        index = children.pop(pid, None)
+        if index is None or stopping:
+            continue
+        print(f"[RELAY] 接收进程 w{index} (PID {pid}) 退出，状态 {status}，1 秒后重启")
+        time.sleep(1)
+        if not stopping:
+            children[spawn_worker(index, total)] = index
+    for pid in list(children):
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            children.pop(pid, None)
+    deadline = time.monotonic() + 10
+    while children and time.monotonic() < deadline:
+        try:
+            pid, _status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
             time.sleep(0.1)
+            continue
+        children.pop(pid, None)
+    for pid in children:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    print("[RELAY] 全部接收进程已退出")
+
+def main():
+    """
+    主函数：解析参数，单进程直接运行，多进程时由主进程统一管理接收进程
+    """
+    parser = argparse.ArgumentParser(description="UDP中转：入库、图像保存、后端通知")
+    parser.add_argument("--workers", type=int, default=RELAY_PROCS,
+                        help="接收进程数，大于 1 时通过 SO_REUSEPORT 共享端口（默认取 RELAY_PROCS，为 1）")
+    args = parser.parse_args()
+    if args.workers > 1 and hasattr(socket, "SO_REUSEPORT"):
+        supervise(args.workers)
+    else:
+        run_worker(0, 1)
+
+def count_rejected_keys(n):
+    """
+    记录被 valid_keys 过滤掉的字段数与涉及的数据包数
+    """
+    if n > 0:
+        METRICS.inc("rejected_keys", n)
+        METRICS.inc("rejected_packets")
+
+def handle_telemetry(data, config, t0):
+    """
+    处理二进制遥测数据包：按通道追加温度/光照行，同一时间戳的采样一起判重
+    
+    :param t0: 数据包开始处理的时刻（perf_counter），用于解析耗时统计
+    :return: 通知项列表（整包只通知一次，携带各通道最新值）
+    """
+    try:
+        device_id, samples = decode_telemetry(data)
+    except TelemetryError:
+        METRICS.inc("parse_errors")
+        return []
+    METRICS.observe("parse", time.perf_counter() - t0)
+    METRICS.inc("parsed")
+    METRICS.inc("telemetry_packets")
+    METRICS.inc("telemetry_samples", len(samples))
+    
+    # 仅接受 sensor_fields 中配置了逻辑名的通道，与 JSON 路径的字段映射保持一致
+    sensor_fields = config.get("sensor_fields", {})
+    dev_kw = {"device_id": device_id} if RELAY_DB_UNIQUE else {}
+    latest = {}
+    latest_ts = None
+    checked = {}
+    rejected = 0
+    for ts_ms, ch, value in samples:
+        name = CHANNELS.get(ch)
+        if name not in sensor_fields or name not in ("temperature", "light") or value != value:
+            rejected += 1
+            continue
+        if DEDUP is not None:
+            if ts_ms not in checked:
+                checked[ts_ms] = DEDUP.seen(device_id, ts_ms)
+            if checked[ts_ms]:
+                METRICS.inc("duplicates")
+                continue
+        # 单精度浮点还原为采集端的两位小数
+        value = round(value, 2)
+        if name == "temperature":
+            WRITER.add_temperature(value, ts_ms=ts_ms, **dev_kw)
+        else:
+            WRITER.add_light(value, ts_ms=ts_ms, **dev_kw)
+        if latest_ts is None or ts_ms >= latest_ts:
+            latest_ts = ts_ms
+        if name not in latest or ts_ms >= latest[name][0]:
+            latest[name] = (ts_ms, value)
+    count_rejected_keys(rejected)
+    if not latest:
+        return []
+    payload = {
+        "temperature": latest["temperature"][1] if "temperature" in latest else None,
+        "light": latest["light"][1] if "light" in latest else None,
+        "image_path": None,
+        "timestamp_ms": latest_ts,
+    }
+    return [("sensor", payload)]
+
+def handle_packet(data, config):
+    """
+    处理线程回调：解析一个UDP数据包，追加入库缓冲
+    
+    :param data: 数据包字节
+    :param config: load_config() 返回的配置
+    :return: 需要发送给后端的通知项列表
+    """
+    t0 = time.perf_counter()
+    if is_telemetry(data):
+        return handle_telemetry(data, config, t0)
+    try:
+        j = json.loads(data.decode("utf-8"))
+        if not isinstance(j, dict):
+            raise ValueError("packet is not an object")
+    except Exception:
+        METRICS.inc("parse_errors")
+        return []
+    METRICS.observe("parse", time.perf_counter() - t0)
+    METRICS.inc("parsed")
+    if j.get("type") == "model" or (j.get("name") and (j.get("output") or j.get("result"))):
+        # 从配置中获取模型数据的允许键
+        valid_model_keys = config.get("valid_keys", {}).get("model", [])
+        # 过滤掉无效的键
+        filtered_j = {k: v for k, v in j.items() if k in valid_model_keys}
+        count_rejected_keys(len(j) - len(filtered_j))
+        
+        name = filtered_j.get("name") or filtered_j.get("model_name")
+        out_obj = filtered_j.get("output") if filtered_j.get("output") is not None else filtered_j.get("result")
+        out_text = json.dumps(out_obj, ensure_ascii=False) if isinstance(out_obj, (dict, list)) else str(out_obj)
+        WRITER.add_model(name or "unknown", out_text)
+        return [("model", (name or "unknown", out_obj))]
+    
+    # device_id 不在 valid_keys 中，判重前从原始数据包读取
+    device_id = j.get("device_id")
+    
+    # 从配置中获取传感器数据的允许键
+    valid_sensor_keys = config.get("valid_keys", {}).get("sensor", [])
+    # 过滤掉无效的键
+    n_keys = len(j)
+    j = {k: v for k, v in j.items() if k in valid_sensor_keys}
+    count_rejected_keys(n_keys - len(j))
+    
+    # 从配置中获取传感器字段映射，并动态解析数据
+    sensor_fields = config.get("sensor_fields", {})
+    # 创建一个字典来存储解析后的传感器数据
+    parsed_sensor_data = {}
+    # 遍历配置中的映射关系
+    for logical_name, json_key in sensor_fields.items():
+        # 从接收到的 JSON 数据 j 中获取对应的值
+        parsed_sensor_data[logical_name] = j.get(json_key)
+    
+    # 现在可以从 parsed_sensor_data 字典中获取各个值
+    temp_c = parsed_sensor_data.get("temperature")  # 温度
+    light = parsed_sensor_data.get("light")        # 光照
+    frame = parsed_sensor_data.get("frame")        # 图像帧数据
+    image_path = parsed_sensor_data.get("image_path") # 图像路径
+    ts_ms = parsed_sensor_data.get("timestamp")    # 时间戳（毫秒）
+    
+    # 重复数据包（重发或同一时间戳）在落图与入库之前丢弃
+    if DEDUP is not None and DEDUP.seen(device_id, ts_ms):
+        METRICS.inc("duplicates")
+        return []
+    
+    # 开启库端唯一约束时按实际设备入库，否则沿用各表默认设备
+    dev_kw = {"device_id": str(device_id)} if (RELAY_DB_UNIQUE and device_id) else {}
+    
+    if image_path:
+        if not image_exists(image_path):
+            image_path = None
+    else:
+        if frame:
+            _name, profile = image_profiles.resolve(config.get("image_storage"), device_id)
+            with METRICS.timer("image_encode"):
+                image_path = save_image(frame, profile)
+            if image_path is None and DEDUP is not None:
+                # 落盘池已满、图片被放弃：撤销判重登记，发送端重发时仍可补存图片
+                # （本包的标量读数照常入库，重发时再次写入；开启 RELAY_DB_UNIQUE 时由库端冲突子句去重）
+                DEDUP.forget(device_id, ts_ms)
+        else:
+            image_path = None
+    
+    # 分别追加不同类型的数据到对应分表的批量缓冲
+    # 温度数据（如果存在）
+    if temp_c is not None:
+        WRITER.add_temperature(temp_c, ts_ms=ts_ms, **dev_kw)
+    
+    # 图像数据（如果存在）
+    if image_path:
+        bubble = (temp_c is None)  # 如果温度为None，说明这是定时生成的图片
+        WRITER.add_image(image_path, bubble=bubble, ts_ms=ts_ms, **dev_kw)
+    
+    # 光敏数据（如果存在）
+    if light is not None:
+        WRITER.add_light(light, ts_ms=ts_ms, **dev_kw)
+    
+    payload = {"temperature": temp_c, "light": light, "image_path": image_path, "timestamp_ms": ts_ms}
+    schedule_delete(image_path)
+    return [("sensor", payload)]
 
 if __name__ == "__main__":
     main()
@@ -122,6 +122,99 @@ static void downsample_rgb(unsigned char *src, int sw, int sh, unsigned char *ds
     }
 }
 
+static size_t base64_encode(const unsigned char *src, size_t len, char *dst) {
+    static const char tbl[] = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/";
+    size_t o = 0;
+    for (size_t i = 0; i < len; i += 3) {
+        unsigned int v = (unsigned int)src[i] << 16;
+        if (i + 1 < len) v |= (unsigned int)src[i+1] << 8;
+        if (i + 2 < len) v |= (unsigned int)src[i+2];
+        dst[o++] = tbl[(v >> 18) & 0x3F];
+        dst[o++] = tbl[(v >> 12) & 0x3F];
+        dst[o++] = (i + 1 < len) ? tbl[(v >> 6) & 0x3F] : '=';
+        dst[o++] = (i + 2 < len) ? tbl[v & 0x3F] : '=';
+    }
+    dst[o] = '\0';
+    return o;
+}
+
+/* 分片协议见 relay/fragments.py：20 字节网络字节序头 + 载荷，每块带 CRC32 */
+static unsigned int crc32_buf(const unsigned char *p, size_t len) {
+    static unsigned int table[256];
+    static int ready = 0;
+    if (!ready) {
+        for (unsigned int i = 0; i < 256; i++) {
+            unsigned int c = i;
+            for (int k = 0; k < 8; k++) c = (c & 1) ? 0xEDB88320u ^ (c >> 1) : c >> 1;
+            table[i] = c;
+        }
+        ready = 1;
+    }
+    unsigned int c = 0xFFFFFFFFu;
+    for (size_t i = 0; i < len; i++) c = table[(c ^ p[i]) & 0xFF] ^ (c >> 8);
+    return c ^ 0xFFFFFFFFu;
+}
+
+static void put_u16(unsigned char *p, unsigned int v) { p[0] = (v >> 8) & 0xFF; p[1] = v & 0xFF; }
+static void put_u32(unsigned char *p, unsigned int v) { p[0] = (v >> 24) & 0xFF; p[1] = (v >> 16) & 0xFF; p[2] = (v >> 8) & 0xFF; p[3] = v & 0xFF; }
+
+static int send_fragmented(int sock, struct sockaddr_in *addr, const char *payload, size_t len, unsigned int frame_id, size_t chunk) {
+    unsigned char pkt[20 + 65000];
+    if (chunk == 0 || chunk > 65000) chunk = 1400;
+    size_t count = (len + chunk - 1) / chunk;
+    if (count == 0) count = 1;
+    if (count > 0xFFFF) return -1;
+    for (size_t i = 0; i < count; i++) {
+        size_t off = i * chunk;
+        size_t n = (len - off < chunk) ? len - off : chunk;
+        pkt[0] = 'K'; pkt[1] = 'F'; pkt[2] = 1; pkt[3] = 0;
+        put_u32(pkt + 4, frame_id);
+        put_u16(pkt + 8, (unsigned int)i);
+        put_u16(pkt + 10, (unsigned int)count);
+        put_u32(pkt + 12, (unsigned int)len);
+        put_u32(pkt + 16, crc32_buf((const unsigned char*)payload + off, n));
+        memcpy(pkt + 20, payload + off, n);
+        sendto(sock, pkt, 20 + n, 0, (struct sockaddr*)addr, sizeof(*addr));
+    }
+    return 0;
+}
+
+/* 将编码后的帧 JSON 分片发送：raw 为原始字节（JPEG 文件或 RGB24 像素） */
+static int send_frame_fragmented(int sock, struct sockaddr_in *addr, long ts, const char *encoding,
+                                 int w, int h, const unsigned char *raw, size_t raw_len,
+                                 unsigned int frame_id, size_t chunk) {
+    size_t b64_len = ((raw_len + 2) / 3) * 4;
+    size_t cap = b64_len + 256;
+    char *json = (char*)malloc(cap);
+    if (!json) return -1;
+    int n = snprintf(json, cap,
+                     "{\"device_id\":\"c-image-1\",\"timestamp_ms\":%ld,\"frame\":{\"encoding\":\"%s\",\"width\":%d,\"height\":%d,\"data\":\"",
+                     ts, encoding, w, h);
+    if (n <= 0 || (size_t)n >= cap) { free(json); return -1; }
+    size_t used = (size_t)n;
+    used += base64_encode(raw, raw_len, json + used);
+    if (used + 4 > cap) { free(json); return -1; }
+    memcpy(json + used, "\"}}", 3);
+    used += 3;
+    int rc = send_fragmented(sock, addr, json, used, frame_id, chunk);
+    free(json);
+    return rc;
+}
+
+static unsigned char *read_file(const char *path, size_t *out_len) {
+    FILE *f = fopen(path, "rb");
+    if (!f) return NULL;
+    fseek(f, 0, SEEK_END);
+    long sz = ftell(f);
+    fseek(f, 0, SEEK_SET);
+    if (sz <= 0) { fclose(f); return NULL; }
+    unsigned char *data = (unsigned char*)malloc((size_t)sz);
+    if (data && fread(data, 1, (size_t)sz, f) != (size_t)sz) { free(data); data = NULL; }
+    fclose(f);
+    if (data) *out_len = (size_t)sz;
+    return data;
+}
+
 static long now_ms() {
     struct timeval tv;
     gettimeofday(&tv, NULL);
@@ -158,6 +251,17 @@ int main() {
     unsigned char *rgb = NULL, *small = NULL;
     int fs_fail = 0;
     int fmt_rgb24 = 0;
+    /* FRAME_ENCODING=rgb24-base64 时以紧凑编码发送帧，否则保持 pixels 像素矩阵 */
+    const char *enc = getenv("FRAME_ENCODING");
+    int enc_b64 = (enc && strcmp(enc, "rgb24-base64") == 0);
+    char b64[32*24*4 + 4];
+    /* FRAME_FRAGMENT=1 时整幅图像内联发送（fswebcam 为 jpeg-base64，V4L2 为全分辨率 rgb24-base64），
+       超过单个数据报的部分按 relay/fragments.py 协议分片，不再落盘后发送 image_path */
+    const char *frag_s = getenv("FRAME_FRAGMENT");
+    int frag = (frag_s && strcmp(frag_s, "1") == 0);
+    const char *chunk_s = getenv("FRAG_CHUNK");
+    size_t frag_chunk = chunk_s ? (size_t)atoi(chunk_s) : 1400;
+    unsigned int frame_id = (unsigned int)now_ms();
     if (!use_fs) {
         cam = open_cam(dev);
         if (cam >= 0 && set_fmt(cam, sw, sh) != -1 && init_mmap(cam, &mbuf) != -1) {
@@ -190,11 +294,21 @@ int main() {
             char filepath[384];
             snprintf(filepath, sizeof(filepath), "%s/%s", images_dir, filename);
             if (capture_fswebcam(dev, filepath, 640, 480) == 0) {
-                size_t used = 0;
-                int n = snprintf(buf + used, cap - used,
-                                 "{\"device_id\":\"c-image-1\",\"timestamp_ms\":%ld,\"image_path\":\"/static/images/%s\"}",
-                                 ts, filename);
-                if (n > 0) sendto(sock, buf, (size_t)n, 0, (struct sockaddr*)&addr, sizeof(addr));
+                if (frag) {
+                    size_t jpg_len = 0;
+                    unsigned char *jpg = read_file(filepath, &jpg_len);
+                    if (jpg) {
+                        send_frame_fragmented(sock, &addr, ts, "jpeg-base64", 640, 480, jpg, jpg_len, frame_id++, frag_chunk);
+                        free(jpg);
+                    }
+                    unlink(filepath);
+                } else {
+                    size_t used = 0;
+                    int n = snprintf(buf + used, cap - used,
+                                     "{\"device_id\":\"c-image-1\",\"timestamp_ms\":%ld,\"image_path\":\"/static/images/%s\"}",
+                                     ts, filename);
+                    if (n > 0) sendto(sock, buf, (size_t)n, 0, (struct sockaddr*)&addr, sizeof(addr));
+                }
                 fs_fail = 0;
             } else {
                 fs_fail++;
@@ -224,23 +338,36 @@ int main() {
                     if (got >= sw*sh*2) yuyv_to_rgb((unsigned char*)mbuf.start, sw, sh, rgb);
                     else continue;
                 }
+                if (frag) {
+                    send_frame_fragmented(sock, &addr, ts, "rgb24-base64", sw, sh, rgb, (size_t)(sw*sh*3), frame_id++, frag_chunk);
+                    usleep(1000000);
+                    continue;
+                }
                 downsample_rgb(rgb, sw, sh, small, 32, 24);
-                size_t used = 0;
-                int n = snprintf(buf + used, cap - used,
-                                 "{\"device_id\":\"c-image-1\",\"timestamp_ms\":%ld,\"frame\":{\"width\":%d,\"height\":%d,\"pixels\":[",
-                                 ts, 32, 24);
-                if (n <= 0) break; used += (size_t)n;
-                for (int y = 0; y < 24; y++) {
-                    n = snprintf(buf + used, cap - used, y==0?"[":",[" ); if (n <= 0) break; used += (size_t)n;
-                    for (int x = 0; x < 32; x++) {
-                        int di = (y*32 + x) * 3; int r = small[di+0]; int g = small[di+1]; int bb = small[di+2];
-                        n = snprintf(buf + used, cap - used, x==0?"{\"r\":%d,\"g\":%d,\"b\":%d}":",{\"r\":%d,\"g\":%d,\"b\":%d}", r,g,bb);
-                        if (n <= 0) break; used += (size_t)n;
+                if (enc_b64) {
+                    size_t bl = base64_encode(small, 32*24*3, b64);
+                    int n = snprintf(buf, cap,
+                                     "{\"device_id\":\"c-image-1\",\"timestamp_ms\":%ld,\"frame\":{\"encoding\":\"rgb24-base64\",\"width\":%d,\"height\":%d,\"data\":\"%.*s\"}}",
+                                     ts, 32, 24, (int)bl, b64);
+                    if (n > 0 && (size_t)n < cap) sendto(sock, buf, (size_t)n, 0, (struct sockaddr*)&addr, sizeof(addr));
+                } else {
+                    size_t used = 0;
+                    int n = snprintf(buf + used, cap - used,
+                                     "{\"device_id\":\"c-image-1\",\"timestamp_ms\":%ld,\"frame\":{\"width\":%d,\"height\":%d,\"pixels\":[",
+                                     ts, 32, 24);
+                    if (n <= 0) break; used += (size_t)n;
+                    for (int y = 0; y < 24; y++) {
+                        n = snprintf(buf + used, cap - used, y==0?"[":",[" ); if (n <= 0) break; used += (size_t)n;
+                        for (int x = 0; x < 32; x++) {
+                            int di = (y*32 + x) * 3; int r = small[di+0]; int g = small[di+1]; int bb = small[di+2];
+                            n = snprintf(buf + used, cap - used, x==0?"{\"r\":%d,\"g\":%d,\"b\":%d}":",{\"r\":%d,\"g\":%d,\"b\":%d}", r,g,bb);
+                            if (n <= 0) break; used += (size_t)n;
+                        }
+                        n = snprintf(buf + used, cap - used, "]"); if (n <= 0) break; used += (size_t)n;
                     }
-                    n = snprintf(buf + used, cap - used, "]"); if (n <= 0) break; used += (size_t)n;
+                    n = snprintf(buf + used, cap - used, "]}}" ); if (n <= 0) break; used += (size_t)n;
+                    sendto(sock, buf, used, 0, (struct sockaddr*)&addr, sizeof(addr));
                 }
-                n = snprintf(buf + used, cap - used, "]}}" ); if (n <= 0) break; used += (size_t)n;
-                sendto(sock, buf, used, 0, (struct sockaddr*)&addr, sizeof(addr));
             }
         }
         usleep(1000000);
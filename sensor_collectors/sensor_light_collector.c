@@ -10,6 +10,7 @@
 #include <arpa/inet.h>
 #include <sys/time.h>
 #include <errno.h>
+#include "telemetry_packet.h"
 
 // BH1750 I2C 地址 (默认 ADDR 接地时为 0x23)
 #define BH1750_ADDR 0x23
@@ -110,7 +111,20 @@ int main() {
     servaddr.sin_port = htons(relay_port);
     servaddr.sin_addr.s_addr = inet_addr(relay_host);
 
+    // PACKET_FORMAT=binary 时改发定长二进制遥测包，BATCH_SAMPLES 个采样合并为一个数据报
+    // SAMPLE_MS 为采样间隔（毫秒），高频采样时配合批量发送降低包速率
+    const char *fmt_s = getenv("PACKET_FORMAT");
+    const char *batch_s = getenv("BATCH_SAMPLES");
+    const char *sample_ms_s = getenv("SAMPLE_MS");
+    int binary = (fmt_s && strcmp(fmt_s, "binary") == 0);
+    int batch = batch_s ? atoi(batch_s) : 1;
+    int sample_ms = sample_ms_s ? atoi(sample_ms_s) : 1000;
+    if (sample_ms < 200) sample_ms = 200;  // 高分辨率模式单次测量约需 180ms
+    tp_packet tp;
+    tp_init(&tp, "bh1750-i2c-7", batch);
+
     printf("BH1750 (GY-30) Collector started.\n");
+    printf("Packet format: %s, batch: %d\n", binary ? "binary" : "json", tp.batch);
     printf("Target: %s:%d\n", relay_host, relay_port);
     printf("I2C Device: %s, Address: 0x%x\n", i2c_dev, BH1750_ADDR);
 
@@ -137,7 +151,9 @@ int main() {
             bh1750_init(i2c_dev);
         }
 
-        if (success) {
+        if (success && binary) {
+            tp_add(&tp, now_ms(), TP_CH_LIGHT, (float)lux, sockfd, &servaddr);
+        } else if (success) {
             long ts = now_ms();
             // 组装 JSON
             // 格式: {"device_id": "bh1750-i2c", "timestamp_ms": 123, "light": 150.5}
@@ -149,8 +165,8 @@ int main() {
             sendto(sockfd, json, strlen(json), 0, (const struct sockaddr *)&servaddr, sizeof(servaddr));
         }
 
-        // 采样间隔 1秒
-        sleep(1);
+        // 采样间隔（默认 1 秒）
+        usleep((useconds_t)sample_ms * 1000);
     }
 
     if (i2c_fd >= 0) close(i2c_fd);
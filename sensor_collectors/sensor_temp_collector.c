@@ -12,6 +12,7 @@
 #include <arpa/inet.h>
 #include <sys/time.h>
 #include <errno.h>
+#include "telemetry_packet.h"
 
 // AHT10 I2C 地址
 #define AHT10_ADDR 0x38
@@ -125,7 +126,20 @@ int main() {
     servaddr.sin_port = htons(relay_port);
     servaddr.sin_addr.s_addr = inet_addr(relay_host);
 
-    printf("AHT10 Collector started. Target: %s:%d, Device: %s\n", relay_host, relay_port, I2C_DEV_PATH);
+    // PACKET_FORMAT=binary 时改发定长二进制遥测包，BATCH_SAMPLES 个采样合并为一个数据报
+    // SAMPLE_MS 为采样间隔（毫秒），高频采样时配合批量发送降低包速率
+    const char *fmt_s = getenv("PACKET_FORMAT");
+    const char *batch_s = getenv("BATCH_SAMPLES");
+    const char *sample_ms_s = getenv("SAMPLE_MS");
+    int binary = (fmt_s && strcmp(fmt_s, "binary") == 0);
+    int batch = batch_s ? atoi(batch_s) : 1;
+    int sample_ms = sample_ms_s ? atoi(sample_ms_s) : 1000;
+    if (sample_ms < 100) sample_ms = 100;  // 单次测量约需 80ms
+    // 每次读数含温度与湿度两个采样
+    tp_packet tp;
+    tp_init(&tp, "aht10-i2c-7", batch * 2);
+
+    printf("AHT10 Collector started. Target: %s:%d, Device: %s, Format: %s\n", relay_host, relay_port, I2C_DEV_PATH, binary ? "binary" : "json");
 
     // 尝试初始化
     if (aht10_init() < 0) {
@@ -148,7 +162,11 @@ int main() {
             fprintf(stderr, "Failed to read AHT10\n");
         }
 
-        if (success) {
+        if (success && binary) {
+            long ts = now_ms();
+            tp_add(&tp, ts, TP_CH_TEMPERATURE, (float)temp, sockfd, &servaddr);
+            tp_add(&tp, ts, TP_CH_HUMIDITY, (float)hum, sockfd, &servaddr);
+        } else if (success) {
             long ts = now_ms();
             // 组装 JSON
             // 注意：这里我们同时发送温度和湿度，虽然目前的后端主要用温度
@@ -160,8 +178,8 @@ int main() {
             sendto(sockfd, json, strlen(json), 0, (const struct sockaddr *)&servaddr, sizeof(servaddr));
         }
 
-        // 采样间隔 2秒
-        sleep(1);
+        // 采样间隔（默认 1 秒）
+        usleep((useconds_t)sample_ms * 1000);
     }
 
     if (i2c_fd >= 0) close(i2c_fd);
@@ -0,0 +1,79 @@
+// telemetry_packet.h
+//
+// 定长二进制遥测数据包（格式与 relay/telemetry.py 一致，网络字节序）：
+//   "KT" | version(1) | id_len(1) | count(2) | device_id | count × [ts_ms(8) | channel(1) | value(float32, 4)]
+// 一个数据报携带多个采样，中转免去 JSON 解析；攒满 batch 个采样或调用 tp_flush 时发送。
+
+#ifndef TELEMETRY_PACKET_H
+#define TELEMETRY_PACKET_H
+
+#include <stdint.h>
+#include <string.h>
+#include <sys/socket.h>
+#include <netinet/in.h>
+
+#define TP_VERSION 1
+#define TP_HEADER_LEN 6
+#define TP_SAMPLE_LEN 13
+#define TP_MAX_ID_LEN 64
+#define TP_MAX_SAMPLES 100  // 100 个采样约 1.4KB，不超过常见 MTU
+
+#define TP_CH_TEMPERATURE 1
+#define TP_CH_LIGHT 2
+#define TP_CH_HUMIDITY 3
+
+typedef struct {
+    unsigned char buf[TP_HEADER_LEN + TP_MAX_ID_LEN + TP_MAX_SAMPLES * TP_SAMPLE_LEN];
+    size_t id_len;
+    int count;
+    int batch;
+} tp_packet;
+
+static void tp_put_u16(unsigned char *p, uint16_t v) {
+    p[0] = (unsigned char)(v >> 8); p[1] = (unsigned char)v;
+}
+
+static void tp_put_u32(unsigned char *p, uint32_t v) {
+    p[0] = (unsigned char)(v >> 24); p[1] = (unsigned char)(v >> 16);
+    p[2] = (unsigned char)(v >> 8); p[3] = (unsigned char)v;
+}
+
+// batch: 每个数据报的采样数，超出范围时截断到 [1, TP_MAX_SAMPLES]
+static void tp_init(tp_packet *tp, const char *device_id, int batch) {
+    size_t n = strlen(device_id);
+    if (n > TP_MAX_ID_LEN) n = TP_MAX_ID_LEN;
+    if (batch < 1) batch = 1;
+    if (batch > TP_MAX_SAMPLES) batch = TP_MAX_SAMPLES;
+    tp->buf[0] = 'K'; tp->buf[1] = 'T';
+    tp->buf[2] = TP_VERSION;
+    tp->buf[3] = (unsigned char)n;
+    memcpy(tp->buf + TP_HEADER_LEN, device_id, n);
+    tp->id_len = n;
+    tp->count = 0;
+    tp->batch = batch;
+}
+
+// 发送已攒的采样（无采样时不发送），返回 sendto 结果
+static long tp_flush(tp_packet *tp, int sockfd, const struct sockaddr_in *addr) {
+    if (tp->count == 0) return 0;
+    tp_put_u16(tp->buf + 4, (uint16_t)tp->count);
+    size_t len = TP_HEADER_LEN + tp->id_len + (size_t)tp->count * TP_SAMPLE_LEN;
+    tp->count = 0;
+    return (long)sendto(sockfd, tp->buf, len, 0, (const struct sockaddr *)addr, sizeof(*addr));
+}
+
+// 追加一个采样；攒满 batch 个时自动发送
+static void tp_add(tp_packet *tp, long long ts_ms, int channel, float value, int sockfd, const struct sockaddr_in *addr) {
+    unsigned char *p = tp->buf + TP_HEADER_LEN + tp->id_len + (size_t)tp->count * TP_SAMPLE_LEN;
+    uint64_t ts = (uint64_t)ts_ms;
+    uint32_t bits;
+    memcpy(&bits, &value, sizeof(bits));
+    tp_put_u32(p, (uint32_t)(ts >> 32));
+    tp_put_u32(p + 4, (uint32_t)ts);
+    p[8] = (unsigned char)channel;
+    tp_put_u32(p + 9, bits);
+    tp->count++;
+    if (tp->count >= tp->batch) tp_flush(tp, sockfd, addr);
+}
+
+#endif
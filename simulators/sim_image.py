@@ -2,8 +2,10 @@ import json
 import time
 import socket
 import os
+import sys
 import numpy as np
 import cv2
+import base64
 
 HOST = os.getenv("RELAY_HOST", "127.0.0.1")
 PORT = int(os.getenv("RELAY_PORT", "9999"))
@@ -13,6 +15,13 @@ BASE = os.getenv("LAB_DIR", os.path.join(os.path.dirname(__file__), '..'))
 IMAGES_DIR = os.path.join(BASE, "static", "images")
 os.makedirs(IMAGES_DIR, exist_ok=True)
 
+# SIM_IMAGE_MODE=fragment 时以 jpeg-base64 帧内联发送整幅图像，按 relay/fragments.py 分片
+SIM_IMAGE_MODE = os.getenv("SIM_IMAGE_MODE", "path")
+FRAG_CHUNK = int(os.getenv("FRAG_CHUNK", "1400"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'relay'))
+from fragments import split_packet
+frame_seq = 0
+
 def gen_image(w=640, h=480, t=None):
     x = np.linspace(0, 2*np.pi, w)
     y = np.linspace(0, 2*np.pi, h)
@@ -26,8 +35,30 @@ def gen_image(w=640, h=480, t=None):
     img_bgr = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
     return img_bgr
 
+def send_fragmented(ts_ms):
+    global frame_seq
+    img = gen_image(640, 480, t=ts_ms)
+    ok, jpg = cv2.imencode(".jpg", img)
+    if not ok:
+        return
+    payload = {
+        "device_id": "sim-image-1",
+        "timestamp_ms": ts_ms,
+        "frame": {"encoding": "jpeg-base64", "width": 640, "height": 480,
+                  "data": base64.b64encode(jpg.tobytes()).decode("ascii")}
+    }
+    frame_seq += 1
+    for part in split_packet(json.dumps(payload).encode("utf-8"), frame_seq, FRAG_CHUNK):
+        try:
+            sock.sendto(part, (HOST, PORT))
+        except Exception:
+            pass
+
 def send_once():
     ts_ms = int(time.time() * 1000)
+    if SIM_IMAGE_MODE == "fragment":
+        send_fragmented(ts_ms)
+        return
     ts = time.strftime("%Y%m%d_%H%M%S", time.localtime(ts_ms/1000.0))
     ms = ts_ms % 1000
     filename = f"relay_cam_{ts}_{ms:03d}.jpg"
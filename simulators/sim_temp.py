@@ -2,11 +2,32 @@ import json
 import time
 import socket
 import os
+import sys
 
 HOST = os.getenv("RELAY_HOST", "127.0.0.1")
 PORT = int(os.getenv("RELAY_PORT", "9999"))
 sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 
+# SIM_PACKET_FORMAT=binary 时按 relay/telemetry.py 发送二进制遥测包，SIM_BATCH 个采样合并为一个数据报
+# SIM_INTERVAL 为采样间隔（秒）
+SIM_PACKET_FORMAT = os.getenv("SIM_PACKET_FORMAT", "json")
+SIM_BATCH = int(os.getenv("SIM_BATCH", "1"))
+SIM_INTERVAL = float(os.getenv("SIM_INTERVAL", "1"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'relay'))
+from telemetry import encode as encode_telemetry
+pending = []
+
+def send_binary():
+    pending.append((int(time.time() * 1000), "temperature", round(24.5 + (time.time() % 5), 1)))
+    if len(pending) < SIM_BATCH:
+        return
+    data = encode_telemetry("sim-temp-1", pending)
+    del pending[:]
+    try:
+        sock.sendto(data, (HOST, PORT))
+    except Exception:
+        pass
+
 def send_once():
     payload = {
         "device_id": "sim-temp-1",
@@ -22,7 +43,10 @@ def send_once():
 if __name__ == "__main__":
     while True:
         try:
-            send_once()
+            if SIM_PACKET_FORMAT == "binary":
+                send_binary()
+            else:
+                send_once()
         except Exception:
             pass
-        time.sleep(1)
\ No newline at end of file
+        time.sleep(SIM_INTERVAL)
\ No newline at end of file
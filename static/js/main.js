@@ -196,6 +196,8 @@ function updateLatestDisplay(data) {
             imageElement.style.display = 'block';
             noImageElement.style.display = 'none';
             imageElement.onerror = function(){ imageElement.style.display='none'; noImageElement.style.display='block'; };
+            // 低分辨率像素帧不再在写入时放大：浏览器缩放时保持像素边缘清晰
+            imageElement.onload = function(){ imageElement.style.imageRendering = (imageElement.naturalWidth < 160) ? 'pixelated' : ''; };
         } else {
             imageElement.style.display = 'none';
             noImageElement.style.display = 'block';
@@ -265,6 +267,11 @@ function updateSensorStatus(status) {
         const isOnline = status.db === 'online';
         dbValue.textContent = isOnline ? '在线' : '离线';
         dbValue.className = isOnline ? 'status-value online' : 'status-value offline';
+        // 后台探测的往返耗时与探测时间
+        const parts = [];
+        if (typeof status.db_latency_ms === 'number') parts.push(`延迟 ${status.db_latency_ms} ms`);
+        if (status.db_checked_at) parts.push(`检测于 ${status.db_checked_at}`);
+        dbValue.title = parts.join('，');
     }
 }
 